@@ -0,0 +1,22 @@
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+sys.path.append(os.path.dirname(__file__)) # so the tests can import the helpers below
+import numpy as np
+from car import AutonomousVehicle, HumanVehicle
+from road import Road
+
+''' Roads and checks shared by the tests. '''
+
+def mixed_road(engine, **road_kwargs):
+    ''' 40 cars 5 m apart, every other one autonomous. '''
+    road = Road(engine=engine, **road_kwargs)
+    for i in range(40):
+        road.add_car(i * 5, 0, AutonomousVehicle if i % 2 else HumanVehicle)
+    return road
+
+def assert_same_run(road, other):
+    ''' The two roads recorded the same cars doing the same. '''
+    np.testing.assert_array_equal(road.get_history_position_array(),
+                                  other.get_history_position_array())
+    np.testing.assert_array_equal(road.get_history_potential_crashes(),
+                                  other.get_history_potential_crashes())
+    assert road.get_history_car_classes() == other.get_history_car_classes()
@@ -0,0 +1,64 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import random
+import numpy as np
+import pytest
+from adaptive import t_quantile, confidence_interval, run_adaptive_trials
+from cache import ResultCache
+from traffic_jam import simulate_AV_HV_mix_merging, measure_AV_HV_mix_merging
+
+def noisy_trial(scale, seed):
+    ''' A trial whose first metric has standard deviation `scale` and second none. '''
+    return random.Random(seed).gauss(10, scale), 1.
+
+@pytest.mark.parametrize('dof, expected', [(1, 12.706), (2, 4.303), (3, 3.182), (5, 2.571),
+                                           (10, 2.228), (30, 2.042), (1000, 1.962)])
+def test_t_quantile(dof, expected):
+    assert t_quantile(0.975, dof) == pytest.approx(expected, abs=0.005)
+
+def test_confidence_interval():
+    mean, half_width = confidence_interval([[1., 5.], [3., 5.]])
+    np.testing.assert_allclose(mean, [2., 5.])
+    np.testing.assert_allclose(half_width, [t_quantile(0.975, 1) * 1., 0.])
+    assert np.isinf(confidence_interval([[1., 5.]])[1]).all()
+
+def test_noisy_points_get_more_trials():
+    tasks = [dict(scale=scale) for scale in (0., 1., 3.)]
+    points = run_adaptive_trials(noisy_trial, tasks, target_widths=(1.5, 1.), min_trials=4,
+                                 max_trials=200, max_workers=1)
+
+    assert points[0].n_trials == 4
+    assert points[0].n_trials < points[1].n_trials < points[2].n_trials < 200
+    for point in points:
+        assert point.noise((1.5, 1.)) <= 1
+    assert [point.seeds for point in points] == \
+        [point.seeds for point in run_adaptive_trials(noisy_trial, tasks, (1.5, 1.), 4, 200,
+                                                      max_workers=1)]
+
+def test_trials_run_out():
+    tasks = [dict(scale=scale) for scale in (1., 3.)]
+    capped = run_adaptive_trials(noisy_trial, tasks, (0.01, 1.), max_trials=10, max_workers=1)
+    assert [point.n_trials for point in capped] == [10, 10]
+    budgeted = run_adaptive_trials(noisy_trial, tasks, (0.01, 1.), budget=15, max_workers=1)
+    assert sum(point.n_trials for point in budgeted) == 15
+    with pytest.raises(ValueError):
+        run_adaptive_trials(noisy_trial, tasks, (1., 1.), min_trials=1)
+
+def test_pool_runs_the_same_trials_per_seed(tmp_path):
+    ''' On a pool the number of trials may differ, but trial k of a point is the same trial. '''
+    tasks = [dict(scale=scale) for scale in (0.5, 2.)]
+    cache = ResultCache(str(tmp_path))
+    pooled = run_adaptive_trials(noisy_trial, tasks, (1., 1.), max_workers=2, cache=cache)
+    serial = run_adaptive_trials(noisy_trial, tasks, (1., 1.), max_workers=1, cache=cache)
+    for pooled_point, serial_point in zip(pooled, serial):
+        assert pooled_point.noise((1., 1.)) <= 1
+        values = dict(zip(pooled_point.seeds, pooled_point.values))
+        for seed, value in zip(serial_point.seeds, serial_point.values):
+            if seed in values:
+                assert values[seed] == value
+    assert cache.hits > 0
+
+def test_measure_matches_the_recorded_run():
+    starting_positions = np.arange(30) * 5
+    _, _, throughput, crashes = simulate_AV_HV_mix_merging(starting_positions, 0.5, 2, seed=4)
+    assert measure_AV_HV_mix_merging(starting_positions, 0.5, 2, seed=4) == (throughput, crashes)
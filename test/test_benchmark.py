@@ -0,0 +1,31 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+from benchmark import (BenchmarkScenario, compare, default_scenarios, load_results,
+                       run_suite, save_results)
+
+def test_suite_results_round_trip(tmp_path):
+    scenarios = [BenchmarkScenario(engine, 10, 0.5, True, 6) for engine in ('object', 'vectorized')]
+    results = run_suite(scenarios, repeat=1, isolate=False, stream=None)
+    assert [result['ticks'] for result in results['results']] == [30, 30]
+    assert all(result['ticks_per_second'] > 0 and result['peak_rss_bytes'] > 0
+               for result in results['results'])
+    save_results(tmp_path / 'results.json', results)
+    assert load_results(tmp_path / 'results.json') == results
+
+def test_compare_finds_regressions():
+    result = dict(name='a', ticks_per_second=100., car_updates_per_second=1000.,
+                  peak_rss_bytes=1000, export_seconds=1.)
+    baseline = {'results': [result]}
+    slower = {'results': [dict(result, ticks_per_second=80., export_seconds=1.05)]}
+    assert [regression[:2] for regression in compare(slower, baseline, 0.1)] == \
+        [('a', 'ticks_per_second')]
+    assert compare(slower, baseline, 0.25) == []
+    faster = {'results': [dict(result, ticks_per_second=200., peak_rss_bytes=500)]}
+    assert compare(faster, baseline) == []
+    assert compare({'results': [dict(result, name='b', ticks_per_second=1.)]}, baseline) == []
+
+def test_default_scenarios_cover_the_grid():
+    scenarios = default_scenarios()
+    assert {scenario.n_cars for scenario in scenarios} == {10, 100, 1000, 10000, 100000}
+    assert {scenario.AV_percentage for scenario in scenarios} == {0, 0.5, 1}
+    assert {scenario.merging for scenario in scenarios} == {False, True}
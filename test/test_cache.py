@@ -0,0 +1,84 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+import pytest
+from cache import ResultCache
+from sweep import run_sweep
+from traffic_jam import simulate_AV_HV_mix_merging
+
+calls = []
+
+def count_cars(starting_positions, AV_percentage, seed=0):
+    calls.append(AV_percentage)
+    return np.asarray(starting_positions) * AV_percentage, seed
+
+def test_keys_follow_the_scenario(tmp_path):
+    cache = ResultCache(tmp_path, version='1')
+    task = dict(starting_positions=np.arange(5) * 5, AV_percentage=0.5, seed=3)
+    key = cache.key(count_cars, task)
+    assert key == cache.key(count_cars, dict(reversed(list(task.items()))))
+    assert key != cache.key(count_cars, dict(task, seed=4))
+    assert key != cache.key(count_cars, dict(task, starting_positions=np.arange(5) * 6))
+    assert key != cache.key(simulate_AV_HV_mix_merging, task)
+    assert key != ResultCache(tmp_path, version='2').key(count_cars, task)
+
+def test_sweep_only_runs_new_points(tmp_path):
+    cache = ResultCache(tmp_path)
+    tasks = [dict(starting_positions=np.arange(5), AV_percentage=perc, seed=1)
+             for perc in (0.1, 0.2, 0.3)]
+    del calls[:]
+    first = {index: result for index, _, result in
+             run_sweep(count_cars, tasks, max_workers=1, progress=False, cache=cache)}
+    tasks[1]['AV_percentage'] = 0.25
+    second = {index: result for index, _, result in
+              run_sweep(count_cars, tasks, max_workers=1, progress=False, cache=cache)}
+    assert calls == [0.1, 0.2, 0.3, 0.25]
+    np.testing.assert_array_equal(first[0][0], second[0][0])
+    np.testing.assert_array_equal(second[1][0], np.arange(5) * 0.25)
+    assert cache.hits == 2 and len(cache) == 4
+
+def test_unseeded_tasks_always_run(tmp_path):
+    cache = ResultCache(tmp_path)
+    tasks = [dict(starting_positions=[1], AV_percentage=0.5, seed=None)]
+    del calls[:]
+    for _ in range(2):
+        list(run_sweep(count_cars, tasks, max_workers=1, progress=False, cache=cache))
+    assert calls == [0.5, 0.5] and len(cache) == 0
+
+def test_least_recently_used_are_evicted(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=10**9)
+    for i in range(3):
+        cache.put(str(i), np.zeros(1000))
+        os.utime(cache._path(str(i)), (i, i))
+    cache.get('0') # now the most recently used
+    cache.max_bytes = cache.n_bytes * 2 // 3
+    cache.evict()
+    cache.get('0')
+    cache.get('2')
+    with pytest.raises(KeyError):
+        cache.get('1')
+
+def test_put_only_scans_when_full(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path, max_bytes=10**9)
+    scans = []
+    entries = cache._entries
+    monkeypatch.setattr(cache, '_entries', lambda: scans.append(1) or entries())
+    for i in range(20):
+        cache.put(str(i), np.zeros(100))
+    cache.put('0', np.zeros(200))
+    assert not scans
+    cache.max_bytes = cache._n_bytes
+    cache.put('20', np.zeros(100))
+    assert len(scans) == 1
+    assert cache._n_bytes == cache.n_bytes <= cache.max_bytes
+    assert len(cache) == 20
+
+def test_cached_simulation_matches(tmp_path):
+    cache = ResultCache(tmp_path)
+    task = dict(starting_positions=np.arange(20) * 5, AV_percentage=0.5,
+                merging_car_count=2, seed=7)
+    computed = cache.call(simulate_AV_HV_mix_merging, **task)
+    loaded = cache.call(simulate_AV_HV_mix_merging, **task)
+    assert cache.hits == 1
+    for computed_value, loaded_value in zip(computed, loaded):
+        np.testing.assert_array_equal(computed_value, loaded_value)
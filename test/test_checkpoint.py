@@ -0,0 +1,76 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+import pytest
+from car import AutonomousVehicle, HumanVehicle
+from checkpoint import save_checkpoint, load_checkpoint
+from conftest import mixed_road, assert_same_run
+from history import SPARE_ROWS
+from inflow import PoissonArrivals
+from road import Road
+from traffic_jam import peturb_traffic_variants
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_fork_carries_on_the_same(engine):
+    ''' A fork taken in the middle of a merge carries on like the road. '''
+    road = mixed_road(engine)
+    road.add_detector(150, interval=10)
+    road.run_simulation(20.2, merge_position=100, merge_interval=10.0)
+    fork = road.fork()
+    for branch in (road, fork):
+        branch.run_simulation(40, merge_position=100, merge_interval=10.0)
+    assert_same_run(road, fork)
+    assert road.detectors[0].series()['count'].tolist() == fork.detectors[0].series()['count'].tolist()
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_fork_is_independent(engine):
+    road = mixed_road(engine)
+    road.run_simulation(20)
+    reference = road.fork()
+    fork = road.fork()
+    fork.car_list[3].velocity = 0
+    fork.run_simulation(20)
+    road.run_simulation(20)
+    reference.run_simulation(20)
+    assert_same_run(road, reference)
+    assert not np.array_equal(road.get_history_position_array(),
+                              fork.get_history_position_array())
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_checkpoint_round_trip(engine, tmp_path):
+    ''' An open road with inflow, saved and loaded back, carries on the same. '''
+    road = Road(engine=engine, length=600)
+    road.add_multiple_cars(list(np.arange(10) * 30.), 10, car_class=HumanVehicle)
+    road.set_inflow(PoissonArrivals(0.5, AV_percentage=0.5, seed=3))
+    road.run_simulation(60)
+    path = tmp_path / 'road.ckpt'
+    save_checkpoint(path, road)
+    loaded = load_checkpoint(path)
+    assert loaded.history.positions.shape == (loaded.history.n_rows + SPARE_ROWS,
+                                             loaded.history.n_columns)
+    for branch in (road, loaded):
+        branch.run_simulation(60)
+    assert_same_run(road, loaded)
+    assert road.exited_count == loaded.exited_count > 0
+
+def test_not_a_checkpoint(tmp_path):
+    path = tmp_path / 'road.ckpt'
+    path.write_bytes(b'hello')
+    with pytest.raises(ValueError):
+        load_checkpoint(path)
+
+def test_perturbation_variants_share_the_warm_up():
+    starting_positions = np.arange(10) * 80
+    variants = peturb_traffic_variants(starting_positions, [10, 8, 20], [2, 5])
+    for slow_car_num, (positions, crashes) in zip([2, 5], variants):
+        road = Road()
+        road.add_multiple_cars(starting_positions, 0, car_class=AutonomousVehicle)
+        road.run_simulation(10)
+        road.car_list[slow_car_num].max_velocity = 20
+        road.car_list[slow_car_num].velocity = 20
+        road.run_simulation(8)
+        road.car_list[slow_car_num].max_velocity = 60
+        road.run_simulation(20)
+        np.testing.assert_array_equal(positions, road.get_history_position_array())
+        np.testing.assert_array_equal(crashes, road.get_history_potential_crashes())
+    assert not np.array_equal(variants[0][0], variants[1][0])
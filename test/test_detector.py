@@ -0,0 +1,43 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+import pytest
+from conftest import mixed_road
+from detector import LoopDetector
+from road import Road
+
+def test_detector_counts_crossings():
+    ''' One car passing at 10 m/s, then nothing. '''
+    detector = LoopDetector(5, interval=2)
+    lengths = np.array([4.])
+    for step in range(20):
+        old = np.array([step * 2. - 8])
+        detector.update(old, old + 2, np.array([10.]), lengths, 0.2)
+    np.testing.assert_array_equal(detector.time, [2, 4])
+    np.testing.assert_array_equal(detector.count, [1, 0])
+    np.testing.assert_array_equal(detector.flow, [1800, 0])
+    assert detector.speed[0] == 10 and np.isnan(detector.speed[1])
+    np.testing.assert_allclose(detector.occupancy, [0.2, 0])
+    np.testing.assert_allclose(detector.density, [50, 0])
+
+def test_detectors_match_through_count():
+    ''' Both engines feed the detectors the same, and they agree with the final positions. '''
+    series = []
+    for engine in Road.engines:
+        road = mixed_road(engine)
+        detector = road.add_detector(600, interval=10)
+        road.run_simulation(60, merge_position=200, merge_interval=18.0)
+        assert sum(detector.count) == road.get_through_vehicle_count(600 - 4)
+        assert road.potential_crash_count == road.get_history_potential_crashes()[-1]
+        series.append(detector.series())
+    for name in series[0]:
+        np.testing.assert_array_equal(series[0][name], series[1][name])
+
+def test_ring_detector_counts_laps():
+    ''' On a ring every car passes the detector once a lap. '''
+    road = mixed_road('vectorized', circumference=400)
+    detector = road.add_detector(100, interval=30)
+    road.run_simulation(60)
+    laps = (road.platoon.position[:40] + 4 - 100) // 400 - (np.arange(40) * 5 + 4 - 100) // 400
+    assert sum(detector.count) == laps.sum()
+    assert len(detector.time) == 2
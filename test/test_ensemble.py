@@ -0,0 +1,32 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+from car import AutonomousVehicle, HumanVehicle
+from ensemble import AV_car_indices, make_scenarios, merge_interval_for, run_ensemble
+from road import Road
+
+def run_road(scenario, n_cars, total_time, merge_position=200):
+    ''' One scenario on its own Road, like ``simulate_AV_HV_mix_merging``. '''
+    AV_cars = AV_car_indices(scenario.seed, n_cars, scenario.AV_percentage)
+    road = Road()
+    for i in range(n_cars):
+        car_class = AutonomousVehicle if i in AV_cars else HumanVehicle
+        road.add_car(i * scenario.starting_space, 0, car_class)
+    merge_interval = merge_interval_for(scenario.merging_car_count, total_time, merge_position)
+    road.run_simulation(total_time, merge_position=merge_position, merge_interval=merge_interval)
+    return road.get_through_vehicle_count(1000), road.get_history_potential_crashes()[-1]
+
+def test_make_scenarios():
+    scenarios = make_scenarios(range(3), [0, 0.5], [5])
+    assert len(scenarios) == 6
+    assert scenarios[1] == (0, 0.5, 5, 0)
+
+def test_ensemble_matches_single_roads():
+    ''' Every road of the ensemble gives what it gives when run on its own. '''
+    n_cars, total_time = 40, 60
+    scenarios = make_scenarios(range(2), [0, 0.4, 0.8], [5, 30], [0, 3])
+    throughputs, hard_stops = run_ensemble(scenarios, n_cars=n_cars, total_time=total_time)
+
+    expected = np.array([run_road(scenario, n_cars, total_time) for scenario in scenarios])
+    np.testing.assert_array_equal(throughputs, expected[:, 0])
+    np.testing.assert_array_equal(hard_stops, expected[:, 1])
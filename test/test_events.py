@@ -0,0 +1,60 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+import pytest
+from car import HumanVehicle
+from conftest import mixed_road
+from events import DEBUG, EventLog, load_events, CRASH, ENTER, EXIT, PREPARE_MERGE
+from inflow import FixedHeadway
+from road import Road
+
+def test_engines_log_the_same_events(capsys):
+    logs = []
+    for engine in Road.engines:
+        road = mixed_road(engine)
+        road.run_simulation(60, merge_position=100, merge_interval=6.0)
+        assert road.events.count('crash') == road.potential_crash_count
+        events = road.events.select()
+        # Within a time step the engines go through the cars in their own order.
+        order = np.lexsort((events['car'], events['event'], events['time_index']))
+        logs.append({name: column[order] for name, column in events.items()})
+    assert capsys.readouterr().out == ''
+    assert logs[0]['event'].size > 0
+    assert {PREPARE_MERGE, CRASH} <= set(logs[0]['event'].tolist())
+    for name in ('time_index', 'car', 'event', 'severity'):
+        np.testing.assert_array_equal(logs[0][name], logs[1][name])
+    for name in ('gap', 'velocity', 'lead_velocity'):
+        np.testing.assert_allclose(logs[0][name], logs[1][name])
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_debug_events_only_when_asked(engine):
+    counts = []
+    for min_severity in (None, DEBUG):
+        road = Road(engine=engine, length=500)
+        road.add_multiple_cars(list(np.arange(10) * 30.), 10, car_class=HumanVehicle)
+        road.set_inflow(FixedHeadway(2.0, AV_percentage=0.5, seed=0))
+        if min_severity is not None:
+            road.events = EventLog(min_severity=min_severity)
+        road.run_simulation(60)
+        counts.append((road.events.count(ENTER), road.events.count(EXIT)))
+    assert counts[0] == (0, 0)
+    assert counts[1][0] > 0 and counts[1][1] > 0
+
+def test_log_grows_and_round_trips(tmp_path):
+    events = EventLog(capacity=2, chunk_size=3)
+    for i in range(10):
+        events.record(i, i % 4, CRASH, gap=-0.5, velocity=3., lead_velocity=1.)
+    events.record_many(10, np.arange(5), PREPARE_MERGE, velocities=np.arange(5.))
+    events.record(11, 0, ENTER) # less severe than INFO
+    assert len(events) == 15
+
+    path = str(tmp_path / 'events.npz')
+    events.save(path)
+    loaded = load_events(path)
+    for name, _ in EventLog.columns:
+        np.testing.assert_array_equal(getattr(loaded, name)[:15],
+                                      getattr(events, name)[:15])
+    frame = loaded.to_dataframe(event='prepare_merge')
+    assert list(frame['event']) == ['prepare_merge'] * 5
+    assert list(frame['velocity']) == list(range(5))
+    assert 'gap=-0.500' in events.format().splitlines()[0]
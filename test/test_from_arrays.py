@@ -0,0 +1,75 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+import pytest
+from car import Car, AutonomousVehicle, HumanVehicle
+from conftest import assert_same_run
+from inflow import PoissonArrivals
+from road import Road, sample_AV_types
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_same_road_as_adding_cars(engine):
+    positions = np.arange(40)[::-1] * 5.
+    types = sample_AV_types(40, 0.4, seed=2)
+    road = Road.from_arrays(positions, 1., types, engine=engine)
+    other = Road(engine=engine)
+    for position, kind in zip(positions, types):
+        other.add_car(position, 1., AutonomousVehicle if kind else HumanVehicle)
+
+    for branch in (road, other):
+        branch.run_simulation(40, merge_position=100, merge_interval=6)
+    assert_same_run(road, other)
+
+def test_engines_agree_on_car_parameters():
+    n = 30
+    positions = np.arange(n)[::-1] * 8.
+    parameters = dict(max_velocity=np.linspace(15, 30, n), braking_rate=5.)
+    roads = [Road.from_arrays(positions, np.linspace(0, 10, n), sample_AV_types(n, 0.5, seed=1),
+                              parameters=parameters, engine=engine)
+             for engine in Road.engines]
+    car = roads[0].car_list[3]
+    assert (car.max_velocity, car.braking_rate) == (parameters['max_velocity'][3], 5.)
+    np.testing.assert_array_equal(roads[1].platoon.max_velocity[:n], parameters['max_velocity'])
+
+    for road in roads:
+        road.run_simulation(30)
+    assert_same_run(*roads)
+
+def test_bulk_cars_leave_an_open_road():
+    ''' The cars added in bulk keep working as handles while others take their slots. '''
+    road = Road.from_arrays(np.arange(20)[::-1] * 20., 10., sample_AV_types(20, 0.5, seed=0),
+                            engine='vectorized', length=500)
+    road.set_inflow(PoissonArrivals(0.5, AV_percentage=0.5, seed=3))
+    road.run_simulation(120)
+
+    assert road.exited_count > 20
+    positions, velocities = road.get_car_state()
+    np.testing.assert_array_equal([car.position for car in road.car_list], positions)
+    assert road.platoon.slot_of(0) == -1
+
+def test_sample_AV_types():
+    types = sample_AV_types(1000, 0.3, seed=5)
+    assert types.sum() == 300
+    np.testing.assert_array_equal(types, sample_AV_types(1000, 0.3, seed=5))
+    assert not np.array_equal(types, sample_AV_types(1000, 0.3, seed=6))
+    with pytest.raises(ValueError):
+        sample_AV_types(10, 1.5)
+
+def test_checks_its_arguments():
+    with pytest.raises(ValueError):
+        Road.from_arrays([1., 2.], types=[0])
+    with pytest.raises(ValueError):
+        Road.from_arrays([1., 2.], types=[0, 2])
+    with pytest.raises(ValueError):
+        Road.from_arrays([1., 2.], parameters=dict(colour=1))
+    road = Road.from_arrays([5., 0.], classes=(Car,))
+    assert [type(car) for car in road.car_list] == [Car, Car]
+    road = Road.from_arrays([5., 0.], types=np.array([True, False]))
+    assert [type(car) for car in road.car_list] == [AutonomousVehicle, HumanVehicle]
+
+def test_many_cars():
+    road = Road.from_arrays(np.arange(10**5)[::-1] * 5., 0, sample_AV_types(10**5, 0.5, seed=0),
+                            engine='vectorized')
+    assert len(road.platoon) == 10**5
+    road.run_simulation(0.4)
+    assert road.get_history_position_array().shape == (10**5, 3)
@@ -0,0 +1,148 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+import pytest
+from car import AutonomousVehicle, HumanVehicle
+from history import HistoryBuffer, HistorySink, RecordingPolicy, DISCARD_ROW, load_history
+from inflow import PoissonArrivals
+from road import Road
+
+def test_rows_are_padded_before_joining():
+    history = HistoryBuffer()
+    history.add_rows([10., 20.])
+    history.advance()
+    row = history.add_row([30.])
+    np.testing.assert_array_equal(history.get_positions()[:, 0], [10., 20., -100 - 2 * 10])
+    np.testing.assert_array_equal(history.get_row(row), [30.])
+
+def test_grows_in_chunks():
+    history = HistoryBuffer(n_rows=1, n_columns=2, chunk_size=8)
+    history.add_rows([0.])
+    for column in range(1, 20):
+        history.advance()
+        history.positions[0, history.column] = column
+    assert history.positions.shape[1] == 26
+    np.testing.assert_array_equal(history.get_positions()[0], np.arange(20))
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_history_is_a_view(engine):
+    ''' The arrays handed out share memory with the buffer the cars write into. '''
+    road = Road(engine=engine)
+    road.add_multiple_cars(np.arange(5) * 20, 0, car_class=AutonomousVehicle)
+    road.run_simulation(10)
+
+    positions = road.get_history_position_array()
+    assert positions.shape == (5, road.position_update_count)
+    assert np.shares_memory(positions, road.history.positions)
+    assert np.shares_memory(road.get_history_potential_crashes(), road.history.crashes)
+    np.testing.assert_array_equal(positions[:, -1], [car.position for car in road.car_list])
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_sink_streams_the_whole_history(engine, tmp_path):
+    ''' A streamed run reads back the same as a run kept in memory. '''
+    roads = []
+    for _ in range(2):
+        road = Road(engine=engine)
+        road.add_multiple_cars(np.arange(30) * 5, 0, car_class=AutonomousVehicle)
+        roads.append(road)
+    roads[0].run_simulation(40, merge_position=100, merge_interval=7)
+
+    path = str(tmp_path / 'history.npy')
+    with HistorySink(path, roads[1].time_precision, flush_interval=13, dtype=float) as sink:
+        roads[1].run_simulation(40, merge_position=100, merge_interval=7, history_sink=sink)
+    positions, crashes, time_precision = load_history(path)
+
+    assert roads[1].history.positions.shape[1] < positions.shape[1]
+    assert time_precision == roads[1].time_precision
+    np.testing.assert_array_equal(positions, roads[0].get_history_position_array())
+    np.testing.assert_array_equal(crashes, roads[0].get_history_potential_crashes())
+
+def merging_road(engine, recording=None):
+    road = Road(engine=engine)
+    road.add_multiple_cars(np.arange(30) * 5, 0, car_class=HumanVehicle)
+    road.run_simulation(40, merge_position=100, merge_interval=6, recording=recording)
+    return road
+
+@pytest.mark.parametrize('engine', Road.engines)
+@pytest.mark.parametrize('stride', [5, 7])
+def test_stride_keeps_every_few_time_steps(engine, stride):
+    full = merging_road(engine)
+    strided = merging_road(engine, RecordingPolicy(stride=stride))
+
+    n_ticks = full.position_update_count - 1
+    ticks = np.minimum(np.arange(-(-n_ticks // stride) + 1) * stride, n_ticks)
+    assert strided.history.positions.shape[1] == len(ticks)
+    assert strided.history_time_precision == full.time_precision * stride
+    np.testing.assert_array_equal(strided.get_history_position_array(),
+                                  full.get_history_position_array()[:, ticks])
+    np.testing.assert_array_equal(strided.get_history_potential_crashes(),
+                                  full.get_history_potential_crashes()[ticks])
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_selected_vehicles(engine):
+    ''' Only the chosen cars get rows, the first merging car being number 30. '''
+    full = merging_road(engine)
+    selected = merging_road(engine, RecordingPolicy(vehicles=[0, 3, 30]))
+
+    positions = selected.get_history_position_array()
+    full_positions = full.get_history_position_array()
+    assert positions.shape == (3, full_positions.shape[1])
+    np.testing.assert_array_equal(positions[:2], full_positions[[0, 3]])
+    joined = full.history.first_column[30]
+    assert selected.history.first_column[2] == joined
+    np.testing.assert_array_equal(positions[2, joined:], full_positions[30, joined:])
+    assert selected.get_history_car_classes() == full.get_history_car_classes()[:1] * 2 + ['AutonomousVehicle']
+    assert set(selected.events.to_dataframe()['car']) <= {0, 1, 2, DISCARD_ROW}
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_recording_off(engine):
+    full = merging_road(engine)
+    off = merging_road(engine, RecordingPolicy.off())
+
+    assert off.get_history_position_array().shape == (0, 1)
+    assert off.history.positions.size <= 8
+    assert off.potential_crash_count == full.potential_crash_count > 0
+    with pytest.raises(ValueError):
+        off.get_history_potential_crashes()
+    with pytest.raises(ValueError):
+        off.get_history_velocity_array()
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_velocities(engine):
+    road = merging_road(engine, RecordingPolicy(fields=('positions', 'velocities', 'crashes')))
+    velocities = road.get_history_velocity_array()
+    positions = road.get_history_position_array()
+    assert velocities.shape == positions.shape
+    assert np.shares_memory(velocities, road.history.velocities)
+    np.testing.assert_array_equal(np.sort(velocities[:, -1]),
+                                  np.sort([car.velocity for car in road.car_list]))
+    # Between time points a car moves by its new velocity, but for the crashes.
+    moved = np.isclose(np.diff(positions, axis=1), velocities[:, 1:] * road.time_precision)
+    assert moved.mean() > 0.99
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_open_road_with_selected_vehicles(engine):
+    roads = []
+    for recording in (None, RecordingPolicy(vehicles=range(0, 1000, 3))):
+        road = Road(engine=engine, length=500)
+        road.add_multiple_cars(list(np.arange(10) * 30.), 10, car_class=HumanVehicle)
+        road.set_inflow(PoissonArrivals(0.5, AV_percentage=0.5, seed=3))
+        road.run_simulation(120, recording=recording)
+        roads.append(road)
+    full, selected = roads
+
+    assert selected.exited_count == full.exited_count > 0
+    assert selected.history.n_rows < full.history.n_rows
+    assert len(selected.get_history_car_classes()) == selected.history.n_rows
+
+def test_policy_checks_its_arguments():
+    with pytest.raises(ValueError):
+        RecordingPolicy(stride=0)
+    with pytest.raises(ValueError):
+        RecordingPolicy(fields=('velocities',))
+    with pytest.raises(ValueError):
+        RecordingPolicy(fields=('accelerations',))
+    road = Road()
+    with pytest.raises(ValueError):
+        road.run_simulation(1, history_sink=HistorySink(os.devnull, road.time_precision),
+                            recording=RecordingPolicy(fields=('positions', 'velocities')))
@@ -0,0 +1,67 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+import pandas as pd
+from car import AutonomousVehicle, HumanVehicle
+from history import RecordingPolicy
+from history_file import convert_csv, open_history, write_road_history
+from road import Road
+
+def mixed_road():
+    road = Road()
+    for i in range(20):
+        road.add_car(i * 5, 0, AutonomousVehicle if i % 2 else HumanVehicle)
+    road.run_simulation(20, merge_position=50, merge_interval=5)
+    return road
+
+def test_round_trip(tmp_path):
+    road = mixed_road()
+    path = str(tmp_path / 'history.tjh')
+    write_road_history(path, road, dtype=np.float64, chunk_size=7)
+    history = open_history(path)
+
+    positions = road.get_history_position_array()
+    assert isinstance(history.positions.base, np.memmap)
+    np.testing.assert_array_equal(history.positions, positions)
+    np.testing.assert_array_equal(history.crashes, road.get_history_potential_crashes())
+    on_road = (positions[:, 1:] > -100) & (positions[:, :-1] > -100)
+    np.testing.assert_allclose(history.velocities[:, 1:][on_road],
+                               (np.diff(positions, axis=1) / road.time_precision)[on_road])
+    np.testing.assert_array_equal(history.velocities[:, 1:][~on_road], 0)
+    assert not on_road.all()
+    assert history.car_classes == road.get_history_car_classes()
+    assert history.car_classes.count('AutonomousVehicle') == 10 + 4
+    assert history.time_precision == road.time_precision
+    assert history.max_position == positions.max()
+
+def test_convert_csv(tmp_path):
+    road = mixed_road()
+    positions_csv, crashes_csv = str(tmp_path / 'positions.csv'), str(tmp_path / 'crashes.csv')
+    pd.DataFrame(road.get_history_position_array()).to_csv(positions_csv)
+    pd.DataFrame(road.get_history_potential_crashes()).to_csv(crashes_csv)
+
+    path = str(tmp_path / 'history.tjh')
+    convert_csv(positions_csv, crashes_csv, path)
+    history = open_history(path)
+    assert history.positions.dtype == np.float32
+    np.testing.assert_allclose(history.positions, road.get_history_position_array(), rtol=1e-6)
+    np.testing.assert_array_equal(history.crashes, road.get_history_potential_crashes())
+
+def test_velocities_do_not_jump(tmp_path):
+    ''' The velocities keep to what the cars did at the wrap of a ring and
+    where merging cars join, and are the recorded ones when there are any. '''
+    ring = Road(circumference=300)
+    for i in range(10):
+        ring.add_car(i * 30, 20, AutonomousVehicle if i % 2 else HumanVehicle)
+    ring.run_simulation(30)
+    recorded = Road(engine='vectorized')
+    for i in range(20):
+        recorded.add_car(i * 5, 0, AutonomousVehicle if i % 2 else HumanVehicle)
+    recorded.run_simulation(20, merge_position=50, merge_interval=5,
+                            recording=RecordingPolicy(fields=('positions', 'velocities', 'crashes')))
+    for name, road in (('ring', ring), ('recorded', recorded)):
+        path = str(tmp_path / (name + '.tjh'))
+        write_road_history(path, road, dtype=np.float64)
+        velocities = open_history(path).velocities
+        assert velocities.min() >= 0 and velocities.max() < 27
+    np.testing.assert_array_equal(velocities, recorded.get_history_velocity_array())
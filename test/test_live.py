@@ -0,0 +1,83 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pytest
+from car import AutonomousVehicle, HumanVehicle
+from live import LiveFeed, start_live
+from road import Road
+import plotting
+
+def make_road(engine='object'):
+    road = Road(engine=engine)
+    for i in range(20):
+        road.add_car(i * 10, 0, AutonomousVehicle if i % 2 else HumanVehicle)
+    return road
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_snapshots_follow_the_history(engine):
+    road = make_road(engine)
+    feed = LiveFeed(maxsize=1000, every=3)
+    road.run_simulation(20, live_feed=feed)
+    feed.close()
+
+    snapshots = list(iter(feed.queue.get_nowait, None))
+    positions = road.get_history_position_array()
+    assert [snapshot.time_index for snapshot in snapshots] == list(range(3, positions.shape[1], 3))
+    for snapshot in snapshots:
+        np.testing.assert_array_equal(snapshot.positions, positions[:, snapshot.time_index])
+    np.testing.assert_array_equal(snapshots[-1].velocities, [car.velocity for car in road.car_list])
+
+def test_full_queue_drops_snapshots():
+    ''' Nobody drawing never holds the simulation up, the newest snapshots are dropped. '''
+    road = make_road()
+    feed = LiveFeed(maxsize=2)
+    road.run_simulation(20, live_feed=feed)
+    assert feed.published == 2
+    assert feed.dropped == road.position_update_count - 1 - 2
+    feed.close()
+
+    snapshot = feed.latest()
+    assert snapshot.time_index == 2 and snapshot.dropped == 0
+    assert feed.skipped == 0 and feed.finished
+    assert feed.latest() is None
+
+@pytest.mark.parametrize('process', [False, True])
+def test_background_run(process):
+    road = make_road('vectorized')
+    feed, worker = start_live(road, 30, maxsize=4, process=process)
+    time_indexes = [snapshot.time_index for snapshot in feed]
+    worker.join(timeout=60)
+
+    assert not worker.is_alive()
+    assert time_indexes and time_indexes == sorted(set(time_indexes))
+    assert time_indexes[-1] <= int(30 / road.time_precision)
+    if not process:
+        assert road.history.n_rows == 0 and road.history.n_columns == 1
+
+def test_plot_live_draws_the_newest_snapshot():
+    road = make_road()
+    feed = LiveFeed(maxsize=4)
+    road.run_simulation(10, live_feed=feed)
+    feed.close() # drops snapshot 1 to make room
+
+    anim = plotting.plot_live(feed, (0, 400), window=50)
+    frames = list(anim.new_frame_seq())
+    assert [snapshot.time_index for snapshot in frames] == [4]
+    assert feed.skipped == 2
+
+    # The first snapshot was drawn when the animation was set up.
+    points, cars, vlines, text = anim._func(frames[0]._replace(time_index=6))
+    assert len(points.get_offsets()) == 2 * len(road.car_list)
+    np.testing.assert_array_equal(np.unique(points.get_offsets()[:, 1]), [-2, 0])
+    np.testing.assert_allclose([path.vertices[0, 0] for path in cars.get_paths()],
+                               frames[0].positions)
+    assert text.get_text().startswith('Crashes: 0')
+    anim._fig.canvas.draw()
+
+def test_live_phase_is_profiled():
+    road = make_road()
+    road.profile = True
+    road.run_simulation(5, live_feed=LiveFeed())
+    assert road.stats.calls['live'] == road.stats.ticks
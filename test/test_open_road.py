@@ -0,0 +1,70 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+import pytest
+from car import Car, HumanVehicle
+from inflow import PoissonArrivals, FixedHeadway
+from road import Road
+
+def open_road(engine, arrivals, length=1000):
+    road = Road(engine=engine, length=length)
+    road.add_multiple_cars(list(np.arange(20) * 30.), 10, car_class=HumanVehicle)
+    road.set_inflow(arrivals)
+    return road
+
+def test_open_road_engines_match():
+    ''' Both engines let the same cars on and off the road. '''
+    roads = [open_road(engine, PoissonArrivals(0.5, AV_percentage=0.3, seed=1))
+             for engine in Road.engines]
+    for road in roads:
+        road.run_simulation(300)
+    object_road, vectorized_road = roads
+    np.testing.assert_array_equal(object_road.get_history_position_array(),
+                                  vectorized_road.get_history_position_array())
+    np.testing.assert_array_equal(object_road.get_history_potential_crashes(),
+                                  vectorized_road.get_history_potential_crashes())
+    assert object_road.get_history_car_classes() == vectorized_road.get_history_car_classes()
+    assert object_road.exited_count == vectorized_road.exited_count > 0
+
+def test_cars_leaving_together_free_their_rows_alike():
+    ''' Cars leaving on the same time step go front to back in both engines. '''
+    roads = [Road(engine=engine, length=100) for engine in Road.engines]
+    for road in roads:
+        road.add_multiple_cars([0., 50., 97., 98.], 20, car_class=Car, safe_dist=1)
+        road.set_inflow(FixedHeadway(0.2))
+        road.run_simulation(2)
+    object_road, vectorized_road = roads
+    np.testing.assert_array_equal(object_road.get_history_position_array(),
+                                  vectorized_road.get_history_position_array())
+    assert object_road.exited_count == vectorized_road.exited_count >= 2
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_cars_and_rows_are_reused(engine):
+    ''' The road holds about as many cars as fit on it however long it runs. '''
+    road = open_road(engine, FixedHeadway(2.0))
+    road.run_simulation(600)
+    on_road = len(road.car_list)
+    assert 20 + road.entered_count == road.exited_count + on_road
+    assert road.exited_count > 200
+    assert road.history.n_rows < 60
+    assert road.get_through_vehicle_count(1000) == road.exited_count
+    assert road.get_through_vehicle_count(0) == road.exited_count + on_road
+    positions = road.get_history_position_array()[:, -1]
+    assert positions.max() < 1000 + 30
+
+def test_fixed_headway():
+    arrivals = FixedHeadway(1.0)
+    counts = [arrivals.count(0.2) for _ in range(25)]
+    assert sum(counts) == 6 # at 0, 1, ..., 5 seconds
+    assert counts[0] == 1 and counts[4] == 1 and counts[5] == 0
+
+def test_poisson_rate():
+    arrivals = PoissonArrivals(2.0, seed=0)
+    total = sum(arrivals.count(0.2) for _ in range(5000))
+    assert abs(total / 1000 - 2.0) < 0.1
+
+def test_inflow_needs_open_road():
+    with pytest.raises(ValueError):
+        Road().set_inflow(FixedHeadway(1.0))
+    with pytest.raises(ValueError):
+        Road(circumference=100, length=100)
@@ -0,0 +1,63 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import random
+import numpy as np
+import pytest
+from car import Car, AutonomousVehicle, HumanVehicle
+from road import Road
+
+def sampled_road(engine, n_cars=40, AV_percentage=0.5, seed=0, starting_space=5):
+    ''' A road of AVs and HVs like ``simulate_AV_HV_mix``. '''
+    AV_car_indices = random.Random(seed).sample(range(n_cars), int(AV_percentage * n_cars))
+    road = Road(engine=engine)
+    for i in range(n_cars):
+        car_class = AutonomousVehicle if i in AV_car_indices else HumanVehicle
+        road.add_car(i * starting_space, 0, car_class)
+    return road
+
+@pytest.mark.parametrize('AV_percentage', [0, 0.5, 1])
+@pytest.mark.parametrize('merge_interval', [0, 18.0])
+def test_vectorized_matches_object_engine(AV_percentage, merge_interval):
+    ''' Both engines give exactly the same positions and crashes. '''
+    roads = [sampled_road(engine, AV_percentage=AV_percentage, seed=1) for engine in Road.engines]
+    for road in roads:
+        road.run_simulation(60, merge_position=200, merge_interval=merge_interval)
+
+    object_road, vectorized_road = roads
+    np.testing.assert_array_equal(object_road.get_history_position_array(),
+                                  vectorized_road.get_history_position_array())
+    np.testing.assert_array_equal(object_road.get_history_potential_crashes(),
+                                  vectorized_road.get_history_potential_crashes())
+    assert object_road.get_through_vehicle_count(1000) == \
+        vectorized_road.get_through_vehicle_count(1000)
+
+def test_vectorized_simple_cars():
+    ''' Plain cars keep their safe distance the same way in both engines. '''
+    roads = []
+    for engine in Road.engines:
+        road = Road(engine=engine)
+        road.add_multiple_cars(np.arange(20) * 60, 0, car_class=Car)
+        road.run_simulation(50)
+        roads.append(road)
+    np.testing.assert_array_equal(roads[0].get_history_position_array(),
+                                  roads[1].get_history_position_array())
+
+def test_vehicle_handle_changes_platoon():
+    ''' Slowing a car through ``car_list`` works like with Car objects. '''
+    roads = [sampled_road(engine, AV_percentage=1) for engine in Road.engines]
+    for road in roads:
+        road.run_simulation(10)
+        road.car_list[3].velocity = 5
+        road.car_list[3].max_velocity = 5
+        road.run_simulation(10)
+    np.testing.assert_array_equal(roads[0].get_history_position_array(),
+                                  roads[1].get_history_position_array())
+
+def test_vectorized_rejects_custom_cars():
+    class OtherCar(Car):
+        def update_position(self, next_car, ghost=False, debug=False):
+            return False
+
+    road = Road(engine='vectorized')
+    with pytest.raises(ValueError):
+        road.add_car(0, 0, OtherCar)
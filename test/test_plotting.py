@@ -0,0 +1,63 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.animation as animation
+import numpy as np
+import pytest
+from car import AutonomousVehicle, HumanVehicle
+from road import Road
+import plotting
+
+def test_frames_show_the_history():
+    road = Road(engine='vectorized')
+    for i in range(20):
+        road.add_car(i * 5, 0, AutonomousVehicle if i % 2 else HumanVehicle)
+    road.run_simulation(20, merge_position=50, merge_interval=5.0)
+    positions = road.get_history_position_array()
+    figure, draw_frame = plotting.plot_frames(positions, road.get_history_potential_crashes())
+
+    curtain, cars, vlines, text = draw_frame(60)[:4]
+    assert (curtain.get_y(), curtain.get_height()) == (60, positions.shape[1] - 60)
+    np.testing.assert_allclose([path.vertices[0, 0] for path in cars.get_paths()],
+                               positions[:, 60])
+    velocities = (positions[:, 60] - positions[:, 59]) / road.time_precision
+    tops = [path.vertices[2, 1] for path in vlines.get_paths()]
+    np.testing.assert_allclose(tops, np.maximum(velocities, 10) - 10)
+    assert text.get_text() == 'Crashes: ' + str(road.get_history_potential_crashes()[60])
+    vlines = draw_frame(0)[2]
+    assert all(path.vertices[2, 1] == 0 for path in vlines.get_paths())
+    figure.canvas.draw()
+    assert isinstance(plotting.plot(positions, road.get_history_potential_crashes()),
+                      animation.FuncAnimation)
+
+def test_space_time_grid_streams_the_history():
+    road = Road(engine='vectorized')
+    for i in range(30):
+        road.add_car(i * 6, 0, AutonomousVehicle if i % 2 else HumanVehicle)
+    road.run_simulation(40, merge_position=100, merge_interval=6.0)
+    positions = road.get_history_position_array()
+    n_time = positions.shape[1]
+
+    grids = [plotting.space_time_grid(positions, shape=(50, 40), chunk_size=chunk_size)
+             for chunk_size in (7, n_time)]
+    np.testing.assert_allclose(grids[0][0], grids[1][0])
+    np.testing.assert_allclose(grids[0][1], grids[1][1])
+
+    density, velocity, time_edges, space_edges = grids[0]
+    assert density.shape == velocity.shape == (50, 40)
+    assert time_edges[-1] == n_time * road.time_precision
+    assert space_edges[-1] == positions.max()
+    time_points = np.bincount(np.arange(n_time) * 50 // n_time)
+    cell_width = space_edges[1] - space_edges[0]
+    on_road = (positions >= 0).sum()
+    assert (density * time_points[:, None] * cell_width / 1000).sum() == pytest.approx(on_road)
+    assert np.nanmax(velocity) <= 26.8 + 1e-9
+
+def test_space_time_grid_of_one_car():
+    positions = np.arange(100.)[None, :] * 2 # 10 m/s
+    density, velocity, _, _ = plotting.space_time_grid(positions, time_precision=0.2,
+                                                       shape=(10, 10))
+    assert np.nanmax(np.abs(velocity - 10)) < 1e-9
+    assert np.count_nonzero(density) == 10 # along the diagonal
+    assert np.isnan(velocity).sum() == 90
@@ -0,0 +1,37 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import copy
+import pickle
+import pytest
+from car import Car, AutonomousVehicle, HumanVehicle, FollowingPolicy, AV_POLICY, HV_POLICY
+
+@pytest.mark.parametrize('car_class', [Car, AutonomousVehicle, HumanVehicle])
+def test_cars_are_compact(car_class):
+    car = car_class(0, 0, 0.2)
+    assert not hasattr(car, '__dict__')
+    assert car.dist_history is None
+    car.update_position(None)
+    assert len(car.dist_history) == (1 if car_class is HumanVehicle else 0)
+
+def test_policies_are_shared():
+    cars = [AutonomousVehicle(0, 0, 0.2), AutonomousVehicle(10, 0, 0.2), HumanVehicle(20, 0, 0.2)]
+    assert cars[0].policy is cars[1].policy is AV_POLICY
+    assert cars[2].policy is HV_POLICY
+    for other in (copy.deepcopy(cars), pickle.loads(pickle.dumps(cars))):
+        assert other[0].policy is AV_POLICY and other[2].policy is HV_POLICY
+    custom = FollowingPolicy(2., 0.5)
+    other = pickle.loads(pickle.dumps(custom))
+    assert (other.d0, other.autonomous_factor) == (2., 0.5)
+
+def test_autonomous_vehicles_follow_each_other_closer():
+    follower = AutonomousVehicle(0, 20, 0.2)
+    dist = 3.048 * 0.5 # half the following distance at equal velocities
+    assert AV_POLICY.can_speed_up(follower, dist, AutonomousVehicle(20, 20, 0.2))
+    assert not AV_POLICY.can_speed_up(follower, dist, Car(20, 20, 0.2))
+    assert not AV_POLICY.can_speed_up(follower, 0, None)
+    assert HV_POLICY.can_speed_up(follower, 1, None)
+
+def test_custom_rule_takes_the_place_of_the_policy():
+    car = Car(0, 10, 0.2, can_speed_up_func=lambda dist, next_car: False)
+    car.update_position(None)
+    assert car.velocity == 10 - 4.5 * 0.2
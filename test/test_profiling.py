@@ -0,0 +1,52 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+import pytest
+from car import HumanVehicle
+from conftest import mixed_road
+from inflow import FixedHeadway
+from road import Road
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_profiling_leaves_the_run_alone(engine):
+    roads = [mixed_road(engine), mixed_road(engine)]
+    roads[1].profile = True
+    for road in roads:
+        road.run_simulation(60, merge_position=100, merge_interval=18.0)
+    np.testing.assert_array_equal(roads[0].get_history_position_array(),
+                                  roads[1].get_history_position_array())
+    assert roads[0].stats is None
+
+    stats = roads[1].stats
+    assert stats.ticks == 300
+    assert stats.merges == roads[1].history.n_rows - 40 > 0
+    assert stats.crashes == roads[1].potential_crash_count
+    assert 40 * 300 < stats.car_updates <= (40 + stats.merges) * 300
+    assert stats.policy_evaluations > 0
+    assert sum(stats.seconds.values()) == pytest.approx(stats.total_seconds, rel=1e-3)
+    assert set(stats.as_dict()) >= {'ticks', 'car_updates', 'policy_evaluations', 'merges',
+                                    'crashes', 'total_seconds', 'history_seconds'}
+    assert 'total' in stats.report()
+
+def test_object_engine_phases():
+    ''' Every car, also the ones joining during the run, has its rule timed,
+    and gets its own rule back afterwards. '''
+    road = Road(engine='object', length=500)
+    road.add_multiple_cars(list(np.arange(10) * 30.), 10, car_class=HumanVehicle)
+    road.set_inflow(FixedHeadway(2.0, AV_percentage=0.5, seed=0))
+    road.profile = True
+    road.run_simulation(60)
+    stats = road.stats
+    assert {'cars', 'policy', 'history', 'ends'} <= set(stats.seconds)
+    assert stats.calls['policy'] == stats.policy_evaluations
+    assert stats.policy_evaluations > 10 * 300
+    for car in road.car_list + [car for pool in road._car_pool.values() for car in pool]:
+        assert car.can_speed_up_func is None
+    road.fork() # nothing left behind that cannot be copied
+
+def test_vectorized_engine_phases():
+    road = mixed_road('vectorized')
+    road.profile = True
+    road.run_simulation(20)
+    assert {'gap', 'advance', 'queue', 'history', 'merge'} <= set(road.stats.seconds)
+    assert road.stats.calls['advance'] >= road.stats.ticks
@@ -0,0 +1,131 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+import pytest
+from car import AutonomousVehicle, HumanVehicle
+from history import RecordingPolicy
+from inflow import FixedHeadway
+from road import Road
+from vehicles import VehicleType, TRUCK, sample_vehicles
+
+def free_ring(n_cars=50, spacing=400):
+    road = Road(engine='vectorized', circumference=n_cars * spacing)
+    for i in range(n_cars):
+        road.add_car(i * spacing, 26.8 if i % 3 else 10, AutonomousVehicle if i % 2 else HumanVehicle)
+    return road
+
+def open_road():
+    road = Road(engine='vectorized', length=3000)
+    road.add_multiple_cars(list(np.arange(20) * 150.), 20, car_class=HumanVehicle)
+    road.set_inflow(FixedHeadway(6.0, AV_percentage=0.5, seed=2))
+    return road
+
+def merging_road():
+    road = Road(engine='vectorized')
+    for i in range(40):
+        road.add_car(i * 60, 20, AutonomousVehicle if i % 2 else HumanVehicle)
+    road.add_on_ramp(1500, 12.0)
+    return road
+
+def highway(n_cars=300, spacing=250):
+    ''' Cars and slower trucks cruising, with cars merging in now and then. '''
+    types, classes, parameters = sample_vehicles(
+        n_cars, [VehicleType(AutonomousVehicle, 0.4), VehicleType(HumanVehicle, 0.4),
+                 VehicleType(HumanVehicle, 0.2, **TRUCK)], seed=5)
+    positions = (n_cars - 1 - np.arange(n_cars)) * float(spacing)
+    road = Road.from_arrays(positions, parameters['max_velocity'], types, classes, parameters,
+                            engine='vectorized')
+    road.add_on_ramp(positions[0] / 2, 7.0)
+    return road
+
+def random_road(seed, ring=False):
+    ''' Up to 40 cars of both classes, close together at random velocities. '''
+    rng = np.random.default_rng(seed)
+    n_cars, spacing = rng.integers(5, 40), rng.uniform(8, 60)
+    road = Road(engine='vectorized', circumference=n_cars * spacing + 50 if ring else None)
+    for i in range(n_cars):
+        road.add_car(i * spacing, rng.uniform(0, 26.8),
+                     AutonomousVehicle if rng.random() < 0.5 else HumanVehicle)
+    return road
+
+def queue(platoon, slot):
+    ''' The distances waiting in the reaction queue of `slot`, oldest first. '''
+    width = platoon.dist_buffer.shape[1]
+    return [platoon.dist_buffer[slot, (platoon.dist_head[slot] + i) % width]
+            for i in range(platoon.dist_count[slot])]
+
+def run_both(make_road, total_time, **kwargs):
+    roads = [make_road(), make_road()]
+    roads[1].platoon.quiet_horizon = 0
+    for road in roads:
+        road.run_simulation(total_time, **kwargs)
+    return roads
+
+@pytest.mark.parametrize('make_road', [free_ring, open_road, merging_road])
+def test_quiet_cars_move_the_same(make_road):
+    ''' Skipping the quiet cars changes nothing in the trajectories. '''
+    fast, slow = run_both(make_road, 120)
+    np.testing.assert_array_equal(fast.get_history_position_array(),
+                                  slow.get_history_position_array())
+    np.testing.assert_array_equal(fast.get_history_potential_crashes(),
+                                  slow.get_history_potential_crashes())
+    slots = fast.platoon.active_slots()
+    for name in ('velocity', 'is_reacting', 'dist_count'):
+        np.testing.assert_array_equal(getattr(fast.platoon, name)[slots],
+                                      getattr(slow.platoon, name)[slots])
+    assert [queue(fast.platoon, slot) for slot in slots] == \
+        [queue(slow.platoon, slot) for slot in slots]
+
+@pytest.mark.parametrize('recording', [None, RecordingPolicy(
+    stride=3, fields=('positions', 'velocities', 'crashes'))])
+def test_cruise_moves_the_same(recording):
+    ''' Cruising with some cars still moving on their own changes nothing either. '''
+    roads = [highway(), highway()]
+    roads[1].platoon.quiet_horizon = 0
+    for road in roads:
+        road.profile = True
+        road.run_simulation(90, recording=recording)
+    fast, slow = roads
+    np.testing.assert_array_equal(fast.get_history_position_array(),
+                                  slow.get_history_position_array())
+    if recording is not None:
+        np.testing.assert_array_equal(fast.history.velocities, slow.history.velocities)
+    np.testing.assert_array_equal(fast.platoon.velocity, slow.platoon.velocity)
+    assert fast.stats.policy_evaluations < slow.stats.policy_evaluations / 4
+
+def test_waking_a_car_wakes_only_the_ones_behind():
+    road = highway()
+    road.run_simulation(30)
+    platoon = road.platoon
+    order = platoon.lane_order()
+    quiet = order[platoon.quiet_until[order] > platoon.tick]
+    middle = len(quiet) // 2
+    woken = platoon._wake_slots([quiet[middle]])
+    assert (platoon.quiet_until[quiet[:middle]] > platoon.tick).all()
+    assert len(woken) and (platoon.position[woken] < platoon.position[quiet[middle]]).all()
+
+@pytest.mark.parametrize('seed', range(12))
+@pytest.mark.parametrize('kind', ['plain', 'merge', 'ring'])
+def test_random_roads_move_the_same(seed, kind):
+    ''' Crashes and cars going back wake exactly the cars that need it. '''
+    kwargs = dict(merge_position=300, merge_interval=7) if kind == 'merge' else {}
+    fast, slow = run_both(lambda: random_road(seed, kind == 'ring'), 120, **kwargs)
+    np.testing.assert_array_equal(fast.get_history_position_array(),
+                                  slow.get_history_position_array())
+
+def test_cruising_cars_are_quiet():
+    road = free_ring()
+    road.run_simulation(120)
+    platoon = road.platoon
+    # The ones quiet until now are proven again on the next time step.
+    assert (platoon.quiet_until[platoon.active_slots()] >= platoon.tick).all()
+
+def test_handle_edit_wakes_the_platoon():
+    roads = [free_ring(), free_ring()]
+    roads[1].platoon.quiet_horizon = 0
+    for road in roads:
+        road.run_simulation(60)
+        road.car_list[10].velocity = 2
+        road.run_simulation(60)
+    np.testing.assert_array_equal(roads[0].get_history_position_array(),
+                                  roads[1].get_history_position_array())
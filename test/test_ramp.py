@@ -0,0 +1,82 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+import pytest
+from car import Car, AutonomousVehicle, HumanVehicle
+from platoon import Platoon
+from ramp import OnRamp
+from road import Road
+
+def mixed_road(n_cars=40, starting_space=8):
+    road = Road(engine='vectorized')
+    for i in range(n_cars):
+        road.add_car(i * starting_space, 10, AutonomousVehicle if i % 3 else HumanVehicle)
+    return road
+
+def test_platoon_insert_and_remove():
+    ''' Cars merge in and leave by relinking their neighbours; slots are reused. '''
+    platoon = Platoon(0.2)
+    for position in [30, 20, 10]:
+        platoon.add_car(Car(position, 0, 0.2))
+    middle = platoon.insert_car(2, Car(15, 0, 0.2))
+    np.testing.assert_array_equal(platoon.position[platoon.lane_order()], [30, 20, 15, 10])
+
+    slot = platoon.slot_of(middle)
+    platoon.remove_car(0)
+    assert len(platoon) == 3
+    assert platoon.head == 1
+    np.testing.assert_array_equal(platoon.position[platoon.lane_order()], [20, 15, 10])
+
+    platoon.insert_car(-1, Car(5, 0, 0.2))
+    assert platoon.size == 4 # took the slot of the car that left
+    np.testing.assert_array_equal(platoon.position[platoon.lane_order()], [20, 15, 10, 5])
+    assert platoon.lane_index(slot) == 1
+
+def test_on_ramp_matches_merge_arguments():
+    ''' One on-ramp merges exactly like the merge arguments of run_simulation. '''
+    with_arguments, with_ramp = mixed_road(), mixed_road()
+    with_arguments.run_simulation(60, merge_position=200, merge_interval=18.0)
+    with_ramp.add_on_ramp(200, 18.0)
+    with_ramp.run_simulation(60)
+
+    np.testing.assert_array_equal(with_arguments.get_history_position_array(),
+                                  with_ramp.get_history_position_array())
+    np.testing.assert_array_equal(with_arguments.get_history_potential_crashes(),
+                                  with_ramp.get_history_potential_crashes())
+    assert with_ramp.on_ramps[0].merge_count > 0
+
+def test_several_on_ramps():
+    ''' Every ramp merges on its own schedule, each car in front of the car that made room. '''
+    road = mixed_road(n_cars=60)
+    ramps = [road.add_on_ramp(position, 5.0, offset=offset)
+             for position, offset in [(100, 0), (250, 1.0), (400, 2.4)]]
+    road.run_simulation(40)
+
+    assert all(ramp.merge_count > 0 for ramp in ramps)
+    assert len(road.platoon) == 60 + sum(ramp.merge_count for ramp in ramps)
+    assert len(road.get_history_car_classes()) == len(road.platoon)
+    positions = [car.position for car in road.car_list]
+    assert positions == sorted(positions, reverse=True)
+
+def test_on_ramps_need_vectorized_engine():
+    with pytest.raises(ValueError):
+        Road().add_on_ramp(200, 18.0)
+
+@pytest.mark.parametrize('merge_interval, offset, n_prepared', [
+    (7.3, 0, 17), (3.3, 0.6, 38), (2.2, 0, 55), (6, 1.4, 20)])
+def test_schedule_in_time_steps(merge_interval, offset, n_prepared):
+    ''' Intervals and offsets that are not whole seconds still fire on schedule. '''
+    ramp = OnRamp(200, merge_interval, offset=offset, time_precision=0.2)
+    prepared = [time_index for time_index in range(600) if ramp.tick(time_index) == 'prepare']
+    assert prepared == list(range(ramp.offset_ticks, 600, ramp.merge_ticks))
+    assert len(prepared) == n_prepared
+
+def test_engines_agree_on_a_merge_interval_in_tenths():
+    roads = [Road(engine=engine) for engine in Road.engines]
+    for road in roads:
+        for i in range(40):
+            road.add_car(i * 8, 10, AutonomousVehicle if i % 3 else HumanVehicle)
+        road.run_simulation(60, merge_position=200, merge_interval=3.3)
+    np.testing.assert_array_equal(roads[0].get_history_position_array(),
+                                  roads[1].get_history_position_array())
+    assert len(roads[1].car_list) > 42
@@ -0,0 +1,45 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+import pytest
+from car import Car, AutonomousVehicle, HumanVehicle
+from road import Road
+from traffic_jam import simulate_ring_road
+
+def ring_road(engine, n_cars=30, circumference=400):
+    road = Road(engine=engine, circumference=circumference)
+    for i in range(n_cars):
+        road.add_car(i * circumference / n_cars, 5, AutonomousVehicle if i % 4 == 0 else HumanVehicle)
+    return road
+
+def test_ring_engines_match():
+    ''' Both engines run the ring the same, with the positions wrapped. '''
+    roads = [ring_road(engine) for engine in Road.engines]
+    for road in roads:
+        road.run_simulation(200)
+    positions = [road.get_history_position_array() for road in roads]
+    np.testing.assert_array_equal(*positions)
+    np.testing.assert_array_equal(*[road.get_history_potential_crashes() for road in roads])
+    assert positions[0].min() >= 0 and positions[0].max() < 400
+
+def test_lead_car_follows_last_car():
+    ''' On a crowded ring the lead car cannot run away from the pack. '''
+    road = Road(engine='vectorized', circumference=100)
+    road.add_multiple_cars([0, 50], 20, car_class=Car, safe_dist=45)
+    road.run_simulation(30)
+    lead, last = road.car_list
+    assert lead.position - last.position < 100 - 45
+    assert road.get_through_vehicle_count(1000) == 0
+
+def test_ring_rejects_merging():
+    road = ring_road('vectorized')
+    with pytest.raises(ValueError):
+        road.run_simulation(10, merge_position=100, merge_interval=5)
+    with pytest.raises(ValueError):
+        road.add_on_ramp(100, 5)
+
+def test_simulate_ring_road_is_seeded():
+    first = simulate_ring_road(20, 300, 0.5, 20, seed=4)
+    second = simulate_ring_road(20, 300, 0.5, 20, seed=4, engine='object')
+    np.testing.assert_array_equal(first[0], second[0])
+    np.testing.assert_array_equal(first[1], second[1])
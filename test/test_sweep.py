@@ -0,0 +1,27 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+from sweep import run_sweep, spawn_seeds
+from traffic_jam import simulate_AV_HV_mix_merging
+
+def test_spawn_seeds_are_reproducible():
+    assert spawn_seeds(1, 4) == spawn_seeds(1, 4)
+    assert len(set(spawn_seeds(1, 4))) == 4
+    assert spawn_seeds(1, 4) != spawn_seeds(2, 4)
+
+def test_pool_matches_serial_run():
+    ''' Seeded tasks give the same results on a process pool as one by one. '''
+    starting_positions = np.arange(30) * 5
+    tasks = [dict(starting_positions=starting_positions, AV_percentage=perc,
+                  merging_car_count=2, seed=seed)
+             for perc, seed in zip([0.2, 0.5, 0.8], spawn_seeds(0, 3))]
+
+    serial = {index: result for index, _, result in
+              run_sweep(simulate_AV_HV_mix_merging, tasks, max_workers=1, progress=False)}
+    pooled = {index: result for index, _, result in
+              run_sweep(simulate_AV_HV_mix_merging, tasks, max_workers=2, progress=False)}
+
+    assert sorted(pooled) == [0, 1, 2]
+    for index in serial:
+        for serial_value, pooled_value in zip(serial[index], pooled[index]):
+            np.testing.assert_array_equal(serial_value, pooled_value)
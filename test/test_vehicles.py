@@ -0,0 +1,86 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import numpy as np
+import pytest
+from car import AutonomousVehicle, HumanVehicle
+from road import Road, CAR_PARAMETERS
+from vehicles import Normal, Uniform, VehicleType, TRUCK, sample_vehicles
+
+MIX = [VehicleType(HumanVehicle, 0.5, reaction_time=Uniform(0.5, 1.5),
+                   gap_factor=Normal(1., 0.2, 0.7, 1.5)),
+       VehicleType(AutonomousVehicle, 0.3, length=Normal(4.5, 0.5, 3.5, 5.5)),
+       VehicleType(HumanVehicle, 0.2, **TRUCK)]
+
+def queue(lengths, space=5.):
+    ''' Positions of a queue of vehicles, front to back, `space` apart. '''
+    fronts = np.cumsum(np.asarray(lengths) + space)
+    return fronts[-1] - fronts
+
+def test_sample_vehicles():
+    types, classes, parameters = sample_vehicles(1000, MIX, seed=3)
+    assert classes == (HumanVehicle, AutonomousVehicle, HumanVehicle)
+    np.testing.assert_array_equal(np.bincount(types), [500, 300, 200])
+    assert set(parameters) == set(CAR_PARAMETERS)
+
+    humans, trucks = parameters['reaction_time'][types == 0], parameters['length'][types == 2]
+    assert humans.min() >= 0.5 and humans.max() < 1.5
+    assert trucks.min() >= 12 and trucks.max() <= 18.75 and trucks.std() > 1
+    np.testing.assert_array_equal(parameters['braking_rate'][types == 2], 3.)
+    np.testing.assert_array_equal(parameters['reaction_time'][types == 1], 0.)
+    np.testing.assert_array_equal(parameters['length'][types == 0], 4.)
+
+    again = sample_vehicles(1000, MIX, seed=3)
+    np.testing.assert_array_equal(types, again[0])
+    np.testing.assert_array_equal(parameters['gap_factor'], again[2]['gap_factor'])
+    assert not np.array_equal(types, sample_vehicles(1000, MIX, seed=4)[0])
+
+def test_checks_its_arguments():
+    with pytest.raises(ValueError):
+        VehicleType(HumanVehicle, colour=1)
+    with pytest.raises(ValueError):
+        VehicleType(HumanVehicle, -1.)
+    with pytest.raises(ValueError):
+        Normal(0., 1., 2., 1.)
+    with pytest.raises(ValueError):
+        sample_vehicles(10, [])
+
+def test_engines_agree_on_a_truck_mix():
+    types, classes, parameters = sample_vehicles(40, MIX, seed=1)
+    positions = queue(parameters['length'])
+    roads = [Road.from_arrays(positions, 10., types, classes, parameters, engine=engine)
+             for engine in Road.engines]
+    for road in roads:
+        road.run_simulation(60, merge_position=300, merge_interval=8)
+    for road in roads[1:]:
+        np.testing.assert_array_equal(road.get_history_position_array(),
+                                      roads[0].get_history_position_array())
+        np.testing.assert_array_equal(road.get_history_potential_crashes(),
+                                      roads[0].get_history_potential_crashes())
+
+@pytest.mark.parametrize('engine', Road.engines)
+def test_long_vehicles_keep_clear_of_the_car_in_front(engine):
+    ''' The gap is measured from the front of each vehicle, however long it is. '''
+    types, classes, parameters = sample_vehicles(30, [VehicleType(HumanVehicle),
+                                                      VehicleType(HumanVehicle, **TRUCK)], seed=2)
+    road = Road.from_arrays(queue(parameters['length'], 2.), 0., types, classes, parameters,
+                            engine=engine)
+    road.run_simulation(60)
+
+    positions, _ = road.get_car_state()
+    assert (positions[:-1] - positions[1:] >= parameters['length'][1:]).all()
+    assert road.get_history_potential_crashes().sum() == 0
+
+def test_gap_factor_and_acceleration_curve():
+    def distance(**parameters):
+        road = Road.from_arrays(queue(np.full(20, 4.)), 0., parameters=parameters)
+        road.run_simulation(30)
+        return road.car_list[0].position - road.car_list[-1].position
+
+    assert distance(gap_factor=2.) > distance() > distance(gap_factor=0.5)
+
+    road = Road.from_arrays([10., 0.], 0., parameters=dict(launch_acceleration=[3., 1.5]),
+                            engine='vectorized')
+    road.run_simulation(2)
+    car, truck = road.car_list
+    assert car.velocity > truck.velocity > 0
+    assert truck.launch_acceleration == 1.5
@@ -0,0 +1,50 @@
+#!/usr/bin/env pytest
+import os, sys; sys.path.append(os.path.join(os.path.dirname(__file__), '../trafficjam/'))
+import shutil
+import pytest
+from car import AutonomousVehicle, HumanVehicle
+from history_file import write_road_history
+from road import Road
+import video
+
+def write_history(path, n_cars=20):
+    road = Road(engine='vectorized')
+    for i in range(n_cars):
+        road.add_car(i * 5, 0, AutonomousVehicle if i % 2 else HumanVehicle)
+    road.run_simulation(10, merge_position=50, merge_interval=5.0)
+    write_road_history(path, road)
+    return road.position_update_count
+
+def test_frame_chunks():
+    assert video.frame_chunks(7, 3) == [(0, 3), (3, 6), (6, 7)]
+    assert video.frame_chunks(6, 3) == [(0, 3), (3, 6)]
+    assert video.frame_chunks(0, 3) == []
+
+def test_frames_do_not_depend_on_the_chunks(tmp_path):
+    ''' A worker drawing a chunk after another gives the same frames as one starting afresh. '''
+    path = str(tmp_path / 'history.tjh')
+    write_history(path)
+    renderer = video._get_renderer(path)
+    in_order = [renderer.render(i) for i in range(0, 20)]
+    assert video._get_renderer(path) is renderer
+    video._renderer = (None, None)
+    fresh = video._get_renderer(path)
+    assert fresh is not renderer
+    assert [fresh.render(i) for i in range(10, 20)] == in_order[10:]
+    assert len(in_order[0]) == renderer.size[0] * renderer.size[1] * 4
+    assert in_order[0] != in_order[19]
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='needs ffmpeg')
+def test_export_videos(tmp_path):
+    histories = [str(tmp_path / 'a.tjh'), str(tmp_path / 'b.tjh')]
+    for n_cars, path in zip((10, 20), histories):
+        write_history(path, n_cars)
+    outputs = video.export_videos(histories, processes=2, chunk_size=16)
+    assert outputs == [str(tmp_path / 'a.mp4'), str(tmp_path / 'b.mp4')]
+    for output in outputs:
+        assert os.path.getsize(output) > 0
+    assert sorted(os.listdir(str(tmp_path))) == ['a.mp4', 'a.tjh', 'b.mp4', 'b.tjh']
+
+def test_needs_ffmpeg(tmp_path):
+    with pytest.raises(ValueError):
+        video.export_videos([], ffmpeg=str(tmp_path / 'no-ffmpeg'))
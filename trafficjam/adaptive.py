@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from statistics import NormalDist
+import numpy as np
+
+''' Monte Carlo trials run until their confidence intervals are narrow enough. '''
+
+def t_quantile(p, dof):
+    ''' Quantile `p` of Student's t distribution with `dof` degrees of freedom.
+
+    Exact for 1 and 2 degrees of freedom, and from the normal quantile with
+    the Cornish-Fisher expansion beyond, which is within 0.01 from 3 on.
+    '''
+    if dof == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if dof == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    return z + (z**3 + z) / (4 * dof) \
+        + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * dof**2) \
+        + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * dof**3) \
+        + (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / (92160 * dof**4)
+
+def confidence_interval(values, confidence=0.95):
+    ''' Mean of `values` and half the width of its `confidence` interval,
+    infinite with fewer than two values. '''
+    values = np.asarray(values, dtype=float)
+    mean = values.mean(axis=0) if len(values) else np.nan
+    if len(values) < 2:
+        return mean, np.full(np.shape(mean), np.inf)
+    standard_error = values.std(axis=0, ddof=1) / math.sqrt(len(values))
+    return mean, t_quantile(0.5 + confidence / 2, len(values) - 1) * standard_error
+
+def trial_seed(seed, point, trial):
+    ''' Random seed of trial `trial` of sweep point `point`, which does not
+    depend on how many trials the other points ran. '''
+    return int(np.random.SeedSequence(seed, spawn_key=(point, trial)).generate_state(1)[0])
+
+
+class PointTrials:
+    '''The results of the trials of one sweep point, see `run_adaptive_trials`.
+
+    Args:
+        task (`dict`): Keyword arguments of the point, without the seed
+
+    Attributes:
+        values (`list`): Metrics returned by each trial, in the order they finished
+        seeds (`list`): Seed of each trial, in the same order
+    '''
+
+    def __init__(self, task):
+        self.task = task
+        self.values = []
+        self.seeds = []
+
+    @property
+    def n_trials(self):
+        return len(self.values)
+
+    def interval(self, confidence=0.95):
+        ''' Mean of each metric and half the width of its confidence interval. '''
+        return confidence_interval(self.values, confidence)
+
+    def noise(self, target_widths, confidence=0.95):
+        ''' Largest ratio of the width of a confidence interval to its target,
+        the point being settled at 1 or less. '''
+        _, half_widths = self.interval(confidence)
+        return float(np.max(2 * half_widths / np.asarray(target_widths, dtype=float)))
+
+
+def run_adaptive_trials(function, tasks, target_widths, min_trials=3, max_trials=100,
+                        budget=None, confidence=0.95, max_workers=None, seed=0, cache=None):
+    ''' Run seeded trials of every sweep point until the confidence intervals
+    of their metrics are narrower than `target_widths`, or the trials run out.
+
+    Every point first gets `min_trials` trials. After that each free process
+    goes to the point whose intervals are the furthest from their targets,
+    counting the trials still running as already narrowing them, so noisy
+    points get most of the compute and settled points none. Trial ``k`` of
+    point ``p`` is always seeded with ``trial_seed(seed, p, k)``; with one
+    process the trials run, and so the results, are the same every time.
+
+    Args:
+        function: Top level (picklable) function running one trial,
+            ``function(seed=..., **task)``, returning the metrics as a sequence
+        tasks: List of keyword-argument dictionaries, one per sweep point
+        target_widths: Full width of the confidence interval wanted for each metric
+        min_trials (`int`): Trials of each point before its intervals are looked at
+        max_trials (`int`): Most trials of one point
+        budget (`int`): Most trials of the whole sweep, no limit if None
+        confidence (`float`): Confidence level of the intervals
+        max_workers: Number of processes, defaults to the number of cores.
+            With 1 the trials run one after another in this process.
+        seed: Seed the seeds of every trial are derived from
+        cache: `cache.ResultCache` to load the trials run before from, and
+            store the others in
+
+    Returns:
+        The `PointTrials` of every point.
+    '''
+    if min_trials < 2:
+        raise ValueError('A confidence interval needs at least 2 trials, not ' + str(min_trials))
+    points = [PointTrials(task) for task in tasks]
+    started = [0] * len(points)
+    workers = os.cpu_count() if max_workers is None else max_workers
+
+    def next_point():
+        ''' The point the next trial is best spent on, None if none needs one. '''
+        best, best_priority = None, 1.
+        for index, point in enumerate(points):
+            if started[index] >= max_trials:
+                continue
+            if started[index] < min_trials:
+                return index
+            if point.n_trials < min_trials:
+                continue # wait for its first trials
+            priority = point.noise(target_widths, confidence) * \
+                math.sqrt(point.n_trials / started[index])
+            if priority > best_priority:
+                best, best_priority = index, priority
+        return best
+
+    def finished(index, trial, key, result):
+        if key is not None:
+            cache.put(key, result)
+        points[index].values.append(tuple(result))
+        points[index].seeds.append(trial['seed'])
+
+    def start(index, submit):
+        ''' Start the next trial of point `index`, from the cache if it ran before. '''
+        trial = dict(points[index].task, seed=trial_seed(seed, index, started[index]))
+        started[index] += 1
+        key = None
+        if cache is not None:
+            key = cache.key(function, trial)
+            try:
+                result = cache.get(key)
+            except KeyError:
+                pass
+            else:
+                finished(index, trial, None, result)
+                return
+        submit(index, trial, key)
+
+    def out_of_budget():
+        return budget is not None and sum(started) >= budget
+
+    if workers == 1:
+        def run_now(index, trial, key):
+            finished(index, trial, key, function(**trial))
+        while not out_of_budget():
+            index = next_point()
+            if index is None:
+                break
+            start(index, run_now)
+        return points
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+
+        def submit(index, trial, key):
+            futures[executor.submit(function, **trial)] = (index, trial, key)
+
+        while True:
+            while len(futures) < workers and not out_of_budget():
+                index = next_point()
+                if index is None:
+                    break
+                start(index, submit)
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished(*futures.pop(future), future.result())
+    return points
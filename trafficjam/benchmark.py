@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from collections import namedtuple
+import numpy as np
+from history_file import write_road_history
+from road import Road
+
+''' Benchmarks of the simulation core, and comparing them against a baseline. '''
+
+RESULTS_FORMAT_VERSION = 1
+DEFAULT_THRESHOLD = 0.1
+
+BenchmarkScenario = namedtuple('BenchmarkScenario', ['engine', 'n_cars', 'AV_percentage',
+                                                     'merging', 'total_time'])
+BenchmarkScenario.__doc__ = ''' One benchmark: ``n_cars`` cars 5 m apart, a
+``AV_percentage`` fraction of them autonomous (reaction time 0 s, the others
+human with 1 s), run for ``total_time`` seconds on the ``engine`` of `Road`,
+with a car merging in every 5 s at 200 m if ``merging``. '''
+
+STARTING_SPACE = 5
+MERGE_POSITION = 200
+MERGE_INTERVAL = 5.0
+
+# Metrics that get worse when they go up rather than down.
+LOWER_IS_BETTER = ('peak_rss_bytes', 'export_seconds')
+COMPARED_METRICS = ('ticks_per_second', 'car_updates_per_second') + LOWER_IS_BETTER
+# Differences too small to be anything but noise.
+ABSOLUTE_TOLERANCE = {'export_seconds': 0.005}
+
+def scenario_name(scenario):
+    return '{}-{}cars-{:.0f}pctAV-{}'.format(scenario.engine, scenario.n_cars,
+                                             scenario.AV_percentage * 100,
+                                             'merging' if scenario.merging else 'nomerge')
+
+def default_scenarios(quick=False):
+    ''' The benchmark suite: 10 to 100k cars, all human, mixed and all
+    autonomous, with and without merging. The object engine stops at 1000
+    cars, which it takes minutes to go past.
+
+    Args:
+        quick: Stop at 1000 cars and simulate less time, for a quick check
+    '''
+    total_time = 10 if quick else 40
+    sizes = {'object': [10, 100, 1000],
+             'vectorized': [10, 100, 1000] if quick else [10, 100, 1000, 10000, 100000]}
+    return [BenchmarkScenario(engine, n_cars, AV_percentage, merging, total_time)
+            for engine in Road.engines for n_cars in sizes[engine]
+            for AV_percentage in (0, 0.5, 1) for merging in (False, True)]
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # kilobytes on Linux
+
+def _make_road(scenario, seed):
+    is_AV = np.random.default_rng(seed).random(scenario.n_cars) < scenario.AV_percentage
+    return Road.from_arrays(np.arange(scenario.n_cars) * STARTING_SPACE, 0, is_AV,
+                            engine=scenario.engine)
+
+def run_benchmark(scenario, repeat=3, seed=0):
+    ''' Run one `BenchmarkScenario`, leaving out the time taken to set it up.
+
+    The run and the export are repeated `repeat` times and the fastest
+    kept, which is the least disturbed by whatever else the machine is doing.
+
+    Returns:
+        A dictionary of the scenario and its measurements: ``ticks``,
+        ``seconds``, ``ticks_per_second``, ``car_updates_per_second`` (cars
+        moved per second), ``peak_rss_bytes`` (peak memory of the process) and
+        ``export_seconds`` (writing the history to a binary history file).
+    '''
+    merge_kwargs = dict(merge_position=MERGE_POSITION, merge_interval=MERGE_INTERVAL) \
+        if scenario.merging else {}
+    seconds = np.inf
+    for _ in range(repeat):
+        road = _make_road(scenario, seed)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            road.run_simulation(scenario.total_time, **merge_kwargs)
+            seconds = min(seconds, time.perf_counter() - start)
+
+    export_seconds = np.inf
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            write_road_history(os.path.join(directory, 'history.tjh'), road)
+            export_seconds = min(export_seconds, time.perf_counter() - start)
+
+    ticks = road.position_update_count - 1
+    result = dict(scenario._asdict(), name=scenario_name(scenario))
+    result.update(ticks=ticks, seconds=seconds, ticks_per_second=ticks / seconds,
+                  car_updates_per_second=ticks * len(road.car_list) / seconds,
+                  peak_rss_bytes=_peak_rss_bytes(), export_seconds=export_seconds)
+    return result
+
+def run_suite(scenarios, repeat=3, isolate=True, stream=sys.stderr):
+    ''' Run every scenario and gather the results with a description of the machine.
+
+    Args:
+        scenarios: The `BenchmarkScenario` to run
+        repeat (`int`): Runs of each scenario, the fastest is kept
+        isolate: Run each scenario in a fresh process, so the peak memory is
+            its own and not the largest so far
+        stream: Where the progress is written, None for nowhere
+
+    Returns:
+        The results, ready for `save_results`.
+    '''
+    results = []
+    pool = multiprocessing.Pool(1, maxtasksperchild=1) if isolate else None
+    try:
+        for scenario in scenarios:
+            if pool is not None:
+                result = pool.apply(run_benchmark, (scenario, repeat))
+            else:
+                result = run_benchmark(scenario, repeat)
+            if stream is not None:
+                print('{name}: {ticks_per_second:.1f} ticks/s, {car_updates_per_second:.3g} '
+                      'car updates/s, {peak_rss_bytes:.3g} B peak, {export_seconds:.3f} s export'
+                      .format(**result), file=stream)
+            results.append(result)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return {'version': RESULTS_FORMAT_VERSION,
+            'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                        'numpy': np.__version__, 'cpu_count': os.cpu_count()},
+            'results': results}
+
+def save_results(path, results):
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=1)
+
+def load_results(path):
+    with open(path) as results_file:
+        results = json.load(results_file)
+    if results.get('version') != RESULTS_FORMAT_VERSION:
+        raise ValueError('Unknown benchmark results version ' + str(results.get('version')))
+    return results
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    ''' Find the measurements that got worse than the baseline by more than `threshold`.
+
+    Only the scenarios in both are compared, and differences within
+    ``ABSOLUTE_TOLERANCE`` are left out.
+
+    Args:
+        results: Results of `run_suite`
+        baseline: Results to compare against, usually from `load_results`
+        threshold (`float`): Fraction a measurement may get worse by
+
+    Returns:
+        A list of ``(name, metric, baseline value, value, relative change)``,
+        the change being positive when it got worse.
+    '''
+    baseline_results = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in results['results']:
+        old = baseline_results.get(result['name'])
+        if old is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if not old[metric]:
+                continue
+            change = (result[metric] - old[metric]) / old[metric]
+            if metric not in LOWER_IS_BETTER:
+                change = -change
+            if abs(result[metric] - old[metric]) <= ABSOLUTE_TOLERANCE.get(metric, 0):
+                continue
+            if change > threshold:
+                regressions.append((result['name'], metric, old[metric], result[metric], change))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the simulation core.')
+    parser.add_argument('--quick', action='store_true', help='small suite for a quick check')
+    parser.add_argument('--filter', default='', help='only run the scenarios whose name has this')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each scenario, the fastest is kept')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='fraction a measurement may get worse by (default %(default)s)')
+    args = parser.parse_args(argv)
+
+    scenarios = [scenario for scenario in default_scenarios(args.quick)
+                 if args.filter in scenario_name(scenario)]
+    results = run_suite(scenarios, args.repeat)
+    if args.output:
+        save_results(args.output, results)
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.threshold)
+        for name, metric, old, new, change in regressions:
+            print('REGRESSION {}: {} {:.4g} -> {:.4g} ({:+.1%})'.format(
+                name, metric, old, new, change))
+        if regressions:
+            return 1
+        print('No regression over {:.0%}'.format(args.threshold))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
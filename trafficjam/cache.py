@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+import hashlib
+import os
+import pickle
+import numpy as np
+
+''' Disk cache of the results of scenario runs, keyed by what the run depends on. '''
+
+DEFAULT_MAX_BYTES = 1 << 30
+_code_version = None
+
+def code_version():
+    ''' Hash of the source of the simulation, so results of older code are not reused. '''
+    global _code_version
+    if _code_version is None:
+        hasher = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.py'):
+                hasher.update(name.encode())
+                with open(os.path.join(directory, name), 'rb') as source:
+                    hasher.update(source.read())
+        _code_version = hasher.hexdigest()
+    return _code_version
+
+def _digest(hasher, value):
+    ''' Feed `value` to `hasher` so that equal scenarios give equal hashes,
+    whatever the types of their containers and numbers. '''
+    if isinstance(value, dict):
+        hasher.update(b'd%d:' % len(value))
+        for key in sorted(value, key=str):
+            _digest(hasher, str(key))
+            _digest(hasher, value[key])
+    elif isinstance(value, (list, tuple)):
+        hasher.update(b'l%d:' % len(value))
+        for item in value:
+            _digest(hasher, item)
+    elif isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        hasher.update(b'a' + value.dtype.str.encode() + str(value.shape).encode())
+        hasher.update(value.tobytes())
+    elif isinstance(value, type) or callable(value):
+        hasher.update(b'c' + (value.__module__ + '.' + value.__qualname__).encode())
+    else:
+        if isinstance(value, np.generic):
+            value = value.item()
+        hasher.update(b'v' + type(value).__name__.encode() + repr(value).encode() + b';')
+
+
+class ResultCache:
+    '''Results of scenario runs stored on disk, one file per scenario.
+
+    A scenario is identified by a hash of the function run, its keyword
+    arguments (car classes, starting positions, AV fraction, merge settings,
+    seed, ...) and the `code_version`, which covers the car parameters and
+    the ``time_precision`` set in the code. Running the same scenario again
+    loads the result instead; changing one point of a sweep only reruns that
+    point.
+
+    When the files add up to more than `max_bytes` the least recently used
+    ones are deleted. The cache keeps a running total of their size, so the
+    directory is only looked through when that total goes over.
+
+    Only cache functions that always give the same result for the same
+    arguments, and only open caches you wrote yourself: the results are
+    pickled.
+
+    Args:
+        directory: Where the results are stored, created if needed
+        max_bytes (`int`): Most bytes the results may take up
+        version: Code version mixed into the keys, `code_version` by default
+
+    Attributes:
+        hits (`int`): Results loaded from the cache
+        misses (`int`): Results not found in the cache
+    '''
+
+    suffix = '.result'
+
+    def __init__(self, directory='../data/cache', max_bytes=DEFAULT_MAX_BYTES, version=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = code_version() if version is None else version
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._n_bytes = self.n_bytes # running total, see `put`
+
+    def key(self, function, task):
+        ''' The hash identifying ``function(**task)``. '''
+        hasher = hashlib.sha256()
+        _digest(hasher, [self.version, function, task])
+        return hasher.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key):
+        ''' The result stored under `key`, marking it as just used.
+
+        Raises:
+            KeyError: when there is no (readable) result for `key`.
+        '''
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as result_file:
+                result = pickle.load(result_file)
+        except FileNotFoundError:
+            self.misses += 1
+            raise KeyError(key)
+        except (pickle.UnpicklingError, EOFError):
+            # Left over from an interrupted run, compute it again.
+            os.remove(path)
+            self.misses += 1
+            raise KeyError(key)
+        os.utime(path)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        ''' Store `result` under `key`, then make room if the cache is too big. '''
+        path = self._path(key)
+        temporary = path + '.' + str(os.getpid())
+        with open(temporary, 'wb') as result_file:
+            pickle.dump(result, result_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._n_bytes += os.path.getsize(temporary)
+        try:
+            self._n_bytes -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        os.replace(temporary, path)
+        if self._n_bytes > self.max_bytes:
+            self.evict()
+
+    def call(self, function, **task):
+        ''' ``function(**task)``, from the cache if it was run before. '''
+        key = self.key(function, task)
+        try:
+            return self.get(key)
+        except KeyError:
+            result = function(**task)
+            self.put(key, result)
+            return result
+
+    def _entries(self):
+        ''' ``(last use, size, path)`` of every stored result. '''
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    @property
+    def n_bytes(self):
+        ''' Bytes taken up by the stored results. '''
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        ''' Delete the least recently used results until they fit in `max_bytes`. '''
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._n_bytes = total
+
+    def clear(self):
+        ''' Delete every stored result. '''
+        for _, _, path in self._entries():
+            os.remove(path)
+        self._n_bytes = 0
+
+    def __len__(self):
+        return len(self._entries())
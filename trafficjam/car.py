@@ -19,15 +19,40 @@ class Car:
         length (`float`): Length of a car
         stop_space (`float`): Space that the car must have between the car in the front before colliding
         save_dist (`float`): A safe distance the car wants to have with the car in front
+        launch_acceleration (`float`): Acceleration of the car from standstill
+        acceleration_falloff (`float`): Velocity by which the car's acceleration
+            drops by 1 m/s^2, so it gains speed ever slower as it goes faster
+        gap_factor (`float`): Multiplies the following distance its `policy` keeps,
+            above 1 for a cautious driver or a heavy vehicle
 
     Attributes:
-        position_history (`list`): History of all position that this car has traveled
+        position_history (`list`): History of all position that this car has traveled,
+            until the car joins a road and records into its `history.HistoryBuffer`
+        history (`history.HistoryBuffer`): Where the car records its positions, if any
+        history_row (`int`): The row of this car in `history`, negative if
+            its `history.RecordingPolicy` does not record it
+        potential_crashes (`int`): Number of potential crashes of this car
+        last_crash (`tuple`): Distance to the car in front, velocity and
+            velocity of the car in front at the last crash, None before any
+        policy (`FollowingPolicy`): Rule deciding when the car speeds up, shared
+            by every car of the class; a ``can_speed_up_func`` takes its place,
+            and without either the car keeps `safe_dist`
 
     """
+    __slots__ = ('position_history', 'history', 'history_row', 'position', 'velocity',
+                 'braking_rate', 'acceleration_rate', 'max_velocity', 'length', 'safe_dist',
+                 'can_speed_up_func', 'time_precision', 'dist_history', 'reaction_time',
+                 'is_reacting', 'potential_crashes', 'last_crash', 'launch_acceleration',
+                 'acceleration_falloff', 'gap_factor')
+    policy = None
+
     def __init__(self, starting_position, starting_velocity, time_precision, braking_rate = 4.5, 
                 acceleration_rate = 0.7, max_velocity = 26.8, length = 4,
-                safe_dist = 100, can_speed_up_func = None, reaction_time = 0):
+                safe_dist = 100, can_speed_up_func = None, reaction_time = 0,
+                launch_acceleration = 3.0, acceleration_falloff = 26.8/2.3, gap_factor = 1.):
         self.position_history   = [starting_position]
+        self.history            = None
+        self.history_row        = None
         self.position           = starting_position
         self.velocity           = starting_velocity
         self.braking_rate       = braking_rate # m/s^2
@@ -37,18 +62,21 @@ class Car:
         self.safe_dist          = safe_dist # meters
         self.can_speed_up_func   = can_speed_up_func
         self.time_precision     = time_precision
-        self.dist_history       = deque()
+        self.dist_history       = None # made on the first update, as queues are large
         self.reaction_time      = reaction_time
         self.is_reacting        = False
-        self.potential_crashes_history = [0]
+        self.potential_crashes  = 0
+        self.last_crash         = None
+        self.launch_acceleration = launch_acceleration # m/s^2
+        self.acceleration_falloff = acceleration_falloff # s
+        self.gap_factor         = gap_factor
 
     def increase_speed(self):
 
-        # self.velocity / (-26.8/2.3) + 3.0
+        # With the defaults:
         # 0 => 3.0
         # 26.8 => 0.7
-        
-        accel = self.velocity / (-26.8/2.3) + 3.0
+        accel = self.velocity / -self.acceleration_falloff + self.launch_acceleration
         self.velocity += accel * self.time_precision
         if self.velocity > self.max_velocity:
             self.velocity = self.max_velocity
@@ -75,40 +103,44 @@ class Car:
 
         position_of_next_car = next_car.position if next_car else 1e6
         
-        # FIXME this is bad practice based on the assumption that every car
-        # has the same length, and also it is hardcoding not object oriented.
+        # A position is the back of a car, which covers [position, position + length),
+        # so the gap from its front to the back of the next car holds whatever
+        # the length of either.
         dist = position_of_next_car - self.position - self.length
-        assert(len(self.dist_history) <= self.reaction_time / self.time_precision)
-        self.dist_history.append(dist)
-        if not self.is_reacting and len(self.dist_history) > self.reaction_time / self.time_precision:
+        dist_history = self.dist_history
+        if dist_history is None:
+            dist_history = self.dist_history = deque()
+        assert(len(dist_history) <= self.reaction_time / self.time_precision)
+        dist_history.append(dist)
+        if not self.is_reacting and len(dist_history) > self.reaction_time / self.time_precision:
             self.is_reacting = True
 
         # Notes down potential crashes, and automatically stops the car.
-        self.potential_crashes_history.append(self.potential_crashes_history[-1])
-        self.stopped = True
         if dist < 0:
 
             # This is an abrupt stop, otherwise it is just waiting
             if not ghost and self.velocity != 0:
-                self.potential_crashes_history[-1] += 1
-                print('crashed at dist', dist, 'velocity', self.velocity, 'next_car.velocity', next_car.velocity)
-                print('dist = ...', position_of_next_car, self.position, self.length)
+                self.potential_crashes += 1
+                if self.history is not None:
+                    self.history.crashes[self.history.column] += 1
+                self.last_crash = (dist, self.velocity, next_car.velocity)
                 self.velocity = 0
-                # FIXME this is bad practice based on the assumption that every car
-                # has the same length, and also it is hardcoding not object oriented.
+                # Stops with its front against the back of the next car.
                 self.position = position_of_next_car - self.length
                 crashed = True
 
-            self.dist_history.popleft()
+            dist_history.popleft()
             
 
         elif self.is_reacting:
 
             # Reacts to the distance with a delay.
-            dist = self.dist_history.popleft()
+            dist = dist_history.popleft()
             speed_up = None
             if self.can_speed_up_func:
                 speed_up = self.can_speed_up_func(dist, next_car)
+            elif self.policy is not None:
+                speed_up = self.policy.can_speed_up(self, dist, next_car)
             else:
                 speed_up = dist > self.safe_dist
 
@@ -120,63 +152,100 @@ class Car:
                 if debug: print('increasing')
 
         self.position += self.velocity * self.time_precision
-        self.position_history.append(self.position)
+        if self.history is None:
+            self.position_history.append(self.position)
+        else:
+            self.history.positions[self.history_row, self.history.column] = self.position
+            if self.history.velocities is not None:
+                self.history.velocities[self.history_row, self.history.column] = self.velocity
         return crashed
 
+    def attach_history(self, history, column=None, row=None):
+        ''' Record the positions of the car into `history` from now on.
+
+        Args:
+            history: `history.HistoryBuffer` to record into
+            column: time point of the current position, defaults to the current one
+            row: row of a car that left the road to reuse, a new row if None
+        '''
+        self.history_row = history.add_row(self.position_history, column, row, self.velocity)
+        self.history = history
+        self.position_history = None
+
     def return_position_array(self):
         ''' Give history of the array for plotting.
 
         Returns:
             Return an array of positions for each time point in the simulation.
         '''
+        if self.history is not None:
+            return self.history.get_row(self.history_row)
         return self.position_history
 
-    def return_potential_crashes_history(self):
-        return self.potential_crashes_history
-
-class AutonomousVehicle(Car):
-    def __init__(self, starting_position, starting_velocity, time_precision):
+class FollowingPolicy:
+    '''Rule deciding whether a car may speed up, keeping a following distance
+    that grows with how much faster it goes than the car in front.
 
-        def can_speed_up_func(dist, next_car):
+    A policy holds no state of its own, so one object is shared by every car
+    following the rule (see `Car.policy`) rather than each car carrying its
+    own function.
 
-            if dist <= 0:
-                return False
+    Args:
+        d0 (`float`): Following distance when going as fast as the car in front
+        autonomous_factor (`float`): Fraction of the following distance kept
+            behind an `AutonomousVehicle`
+
+    The following distance is further multiplied by the `Car.gap_factor` of
+    each car, so one policy serves drivers and vehicles keeping more or less room.
+    '''
+    __slots__ = ('d0', 'autonomous_factor')
+
+    def __init__(self, d0, autonomous_factor=1.):
+        self.d0 = d0
+        self.autonomous_factor = autonomous_factor
+
+    def __reduce__(self):
+        # The shared policies stay shared in copies and checkpoints.
+        for name, policy in SHARED_POLICIES.items():
+            if policy is self:
+                return name
+        return FollowingPolicy, (self.d0, self.autonomous_factor)
+
+    def can_speed_up(self, car, dist, next_car):
+        ''' Whether `car`, `dist` behind `next_car` (None for none), may speed up. '''
+        if dist <= 0:
+            return False
+
+        if not next_car:
+            return True
+        relative_velocity = car.velocity - next_car.velocity + \
+            next_car.braking_rate * next_car.reaction_time
+        following_distance = (self.d0 + relative_velocity * car.reaction_time + \
+            relative_velocity / 2 * (relative_velocity / car.braking_rate)) * car.gap_factor
+        if self.autonomous_factor != 1. and isinstance(next_car, AutonomousVehicle):
+            return dist > following_distance * self.autonomous_factor
+
+        return dist > following_distance
+
+AV_POLICY = FollowingPolicy(3.048, autonomous_factor=0.3)
+HV_POLICY = FollowingPolicy(1.524)
+SHARED_POLICIES = {'AV_POLICY': AV_POLICY, 'HV_POLICY': HV_POLICY}
 
-            if not next_car:
-                return True
-            d0 = 3.048
-            relative_velocity = self.velocity - next_car.velocity + \
-                next_car.braking_rate * next_car.reaction_time
-            following_distance = d0 + relative_velocity * self.reaction_time + \
-                relative_velocity / 2 * (relative_velocity / self.braking_rate)
-            if isinstance(next_car, AutonomousVehicle):
-                return dist > following_distance * 0.3
-            
-            return dist > following_distance
+class AutonomousVehicle(Car):
+    __slots__ = ()
+    policy = AV_POLICY
 
+    def __init__(self, starting_position, starting_velocity, time_precision):
         super().__init__(starting_position, starting_velocity, time_precision,
-                    can_speed_up_func=can_speed_up_func, reaction_time = 0) #FIXME
+                    reaction_time = 0) #FIXME
 
 class HumanVehicle(Car):
+    __slots__ = ()
+    policy = HV_POLICY
     
     def __init__(self, starting_position, starting_velocity, time_precision):
-        def can_speed_up_func(dist, next_car):
-            if dist <= 0:
-                return False
-
-            if not next_car:
-                return True
-
-            d0 = 1.524
-            relative_velocity = self.velocity - next_car.velocity + \
-                next_car.braking_rate * next_car.reaction_time
-            following_distance = d0 + relative_velocity * self.reaction_time + \
-                relative_velocity / 2 * (relative_velocity / self.braking_rate)
-
-            return dist > following_distance
-
         super().__init__(starting_position, starting_velocity, time_precision,
-                    can_speed_up_func=can_speed_up_func, reaction_time = 1)
+                    reaction_time = 1)
 
 # eng
 # - 2 second headsup on merging
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+import pickle
+
+''' Checkpoints of the whole state of a road, to carry on simulating it later. '''
+
+MAGIC = b'TJCKPT\x00'
+FORMAT_VERSION = 7 # 2: cars with __slots__ and shared policies, 3: recording policies,
+                   # 4: cars added in bulk, 5: acceleration curve and gap factor per car,
+                   # 6: merge schedules in time steps, 7: quiet cars leaning on the car in front
+
+def save_checkpoint(path, road):
+    ''' Write the state of `road` to a checkpoint file.
+
+    Everything needed to carry on is kept: the cars with their velocities
+    and reaction-delay queues, the merges being prepared, the open road
+    inflow, the detectors and the history so far (without its reserved
+    room). A road loaded back with `load_checkpoint` carries on exactly as
+    `road` would.
+
+    The file starts with ``MAGIC`` and a format version byte, followed by
+    the road pickled with the highest protocol, so NumPy arrays are stored
+    as raw bytes.
+
+    Args:
+        path: File to write
+        road: `road.Road` to save
+    '''
+    with open(path, 'wb') as checkpoint_file:
+        checkpoint_file.write(MAGIC + bytes([FORMAT_VERSION]))
+        pickle.dump(road, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_checkpoint(path):
+    ''' Read back a road written by `save_checkpoint`.
+
+    Only load checkpoints you wrote yourself: like any pickle, a checkpoint
+    can run code when it is loaded.
+
+    Returns:
+        The `road.Road`, ready for ``run_simulation``.
+    '''
+    with open(path, 'rb') as checkpoint_file:
+        start = checkpoint_file.read(len(MAGIC) + 1)
+        if start[:len(MAGIC)] != MAGIC:
+            raise ValueError(str(path) + ' is not a checkpoint file')
+        if start[len(MAGIC)] != FORMAT_VERSION:
+            raise ValueError('Unknown checkpoint version ' + str(start[len(MAGIC)]))
+        return pickle.load(checkpoint_file)
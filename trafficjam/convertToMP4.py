@@ -1,11 +1,7 @@
 #!/usr/bin/env python
-from subprocess import call
-from pathlib import Path
+import sys
+from video import main
 
-data_files = Path('../data/').glob('starting_space_*.csv')
-
-for data_file in data_files:
-    save_name = data_file.with_suffix('.mp4')
-    data_name =  data_file
-    # print(save_name, data_name)
-    call(['./plotting.py', data_name, save_name])
+# Turns every history in the data directory into a video, on all the cores.
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:] or ['../data/']))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+import numpy as np
+
+''' Virtual loop detectors measuring the traffic while the simulation runs. '''
+
+class LoopDetector:
+    '''A loop detector at `position` on the road, see `Road.add_detector`.
+
+    Every time step it counts the cars whose front crossed it, adds up their
+    speeds and notes whether a car is over it. Every `interval` seconds these
+    are turned into one point of each time series, so the memory used does
+    not depend on the number of cars or time steps.
+
+    A car at ``position`` covers ``[position, position + length)``, as in
+    `Car.update_position`.
+
+    Args:
+        position (`float`): Where the detector is
+        interval (`float`): Seconds aggregated into each point of the series
+
+    Attributes:
+        time (`list`): End of each interval, in seconds since the detector was added
+        count (`list`): Cars that crossed the detector in each interval
+        flow (`list`): Cars per hour
+        speed (`list`): Time-mean speed of the cars that crossed, in m/s
+            (NaN if none did)
+        occupancy (`list`): Fraction of the time a car was over the detector
+        density (`list`): Cars per kilometer, estimated from the occupancy
+    '''
+
+    def __init__(self, position, interval=60):
+        self.position = position
+        self.interval = interval
+        self.time = []
+        self.count = []
+        self.flow = []
+        self.speed = []
+        self.occupancy = []
+        self.density = []
+        self._n_steps = 0
+        self._reset()
+
+    def _reset(self):
+        self._steps = 0
+        self._count = 0
+        self._speed_sum = 0.
+        self._occupied_steps = 0
+        self._occupied_length = 0.
+
+    def update(self, old_positions, positions, velocities, lengths, time_precision,
+               circumference=None):
+        ''' Take in one time step of the cars on the road.
+
+        Args:
+            old_positions: Positions of the cars before the time step
+            positions: Positions of the cars after it
+            velocities: Velocities of the cars after it
+            lengths: Lengths of the cars
+            time_precision: Seconds in the time step
+            circumference: Length of the road if it is a ring
+        '''
+        front = positions + lengths
+        old_front = old_positions + lengths
+        if circumference is None:
+            crossings = (old_front < self.position) & (front >= self.position)
+            behind = self.position - positions
+        else:
+            crossings = np.floor((front - self.position) / circumference) - \
+                np.floor((old_front - self.position) / circumference)
+            crossings = np.maximum(crossings, 0).astype(np.int64)
+            behind = (self.position - positions) % circumference
+        occupied = (behind >= 0) & (behind < lengths)
+
+        self._count += int(np.sum(crossings))
+        self._speed_sum += float(np.sum(velocities * crossings))
+        if occupied.any():
+            self._occupied_steps += 1
+            self._occupied_length += float(np.mean(lengths[occupied]))
+        self._steps += 1
+        self._n_steps += 1
+        if self._steps >= round(self.interval / time_precision):
+            self.close_interval(time_precision)
+
+    def close_interval(self, time_precision):
+        ''' Add the point of the current interval to the series and start a new one. '''
+        if not self._steps:
+            return
+        seconds = self._steps * time_precision
+        occupancy = self._occupied_steps / self._steps
+        self.time.append(self._n_steps * time_precision)
+        self.count.append(self._count)
+        self.flow.append(self._count / seconds * 3600)
+        self.speed.append(self._speed_sum / self._count if self._count else np.nan)
+        self.occupancy.append(occupancy)
+        self.density.append(occupancy / (self._occupied_length / self._occupied_steps) * 1000
+                            if self._occupied_steps else 0.)
+        self._reset()
+
+    def series(self):
+        ''' The time series as a dictionary of arrays, ready for a ``pd.DataFrame``. '''
+        return {name: np.array(getattr(self, name))
+                for name in ('time', 'count', 'flow', 'speed', 'occupancy', 'density')}
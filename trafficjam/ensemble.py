@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+import random
+from collections import namedtuple
+from itertools import product
+import numpy as np
+from car import Car, AutonomousVehicle, HumanVehicle
+from platoon import Platoon, car_kind, KIND_CAR
+from ramp import interval_ticks
+
+''' Many independent roads stepped together as one (scenario x car) array. '''
+
+Scenario = namedtuple('Scenario', ['seed', 'AV_percentage', 'starting_space',
+                                   'merging_car_count'])
+Scenario.__doc__ = ''' One road of a sweep: the cars are ``starting_space`` apart, a
+``AV_percentage`` fraction of them (chosen with ``seed``) are autonomous and
+``merging_car_count`` cars merge in during the run. '''
+
+PARKED_POSITION = -1e9 # where the spare room at the back of each road waits
+
+def make_scenarios(seeds, AV_percentages, starting_spaces, merging_car_counts=(0,)):
+    ''' Every combination of the given trial seeds, AV fractions, spacings
+    and merging car counts as a list of `Scenario`. '''
+    return [Scenario(*point) for point in
+            product(seeds, AV_percentages, starting_spaces, merging_car_counts)]
+
+def merge_interval_for(merging_car_count, total_time, merge_position):
+    ''' Seconds between merges so that `merging_car_count` cars merge in during
+    `total_time`, 0 for no merging. '''
+    if merging_car_count <= 0:
+        return 0
+    return (total_time - merge_position / Car(1, 2, 3).max_velocity) // merging_car_count
+
+def AV_car_indices(seed, n_cars, AV_percentage):
+    ''' Indexes of the cars that are autonomous, drawn with their own seeded generator. '''
+    return random.Random(seed).sample(range(n_cars), int(AV_percentage * n_cars))
+
+
+class Ensemble(Platoon):
+    '''Independent roads, one per `Scenario`, stepped together by the
+    vectorized engine.
+
+    Row ``s`` of the (scenario x car) arrays holds the road of scenario ``s``,
+    front to back, exactly as `road.Road` would order it. The room at the
+    back of each row that merging cars will use up is filled with parked cars
+    that never move. Each road follows the merging steps of `Road.run_simulation`,
+    so a scenario gives the same result as `simulate_AV_HV_mix_merging` with
+    the same AV cars.
+
+    Args:
+        scenarios (`list`): The `Scenario` of every road
+        n_cars (`int`): Number of cars on each road at the start
+        total_time (`float`): Seconds to simulate
+        merge_position (`float`): Where the merging cars join the road
+        starting_velocity (`float`): Starting velocity of all the cars
+        time_precision (`float`): Seconds advanced every time step
+        preparation_time (`float`): Time allowed for the car behind to prepare
+            for the merging car
+    '''
+
+    def __init__(self, scenarios, n_cars, total_time, merge_position=200,
+                 starting_velocity=0, time_precision=0.2, preparation_time=0.4):
+        self.scenarios = list(scenarios)
+        self.n_cars = n_cars
+        self.total_time = total_time
+        self.merge_position = merge_position
+        self.preparation_time = preparation_time
+        self.position_update_count = int(total_time / time_precision) + 1
+        self.merge_intervals = np.array([merge_interval_for(
+            scenario.merging_car_count, total_time, merge_position)
+            for scenario in self.scenarios], dtype=float)
+
+        # Leave room for one merge per preparation.
+        self.merge_ticks = np.array([interval_ticks(interval, time_precision)
+                                     for interval in self.merge_intervals], dtype=np.int64)
+        n_merges = [len(range(0, self.position_update_count - 1, ticks))
+                    for ticks in set(self.merge_ticks.tolist()) if ticks > 0]
+        self.n_scenarios = len(self.scenarios)
+        self.row_size = n_cars + max(n_merges, default=0)
+        super().__init__(time_precision, capacity=self.n_scenarios * self.row_size)
+        self.size = self.n_scenarios * self.row_size
+
+        self.merging_car = AutonomousVehicle(merge_position, 0, time_precision)
+        av = AutonomousVehicle(0, 0, time_precision)
+        hv = HumanVehicle(0, 0, time_precision)
+        self._reserve_reaction(max(av.reaction_time, hv.reaction_time))
+
+        is_av = np.zeros((self.n_scenarios, self.row_size), dtype=bool)
+        for s, scenario in enumerate(self.scenarios):
+            # Cars are added back to front, so car i ends up in column n_cars - 1 - i.
+            indices = AV_car_indices(scenario.seed, n_cars, scenario.AV_percentage)
+            is_av[s, n_cars - 1 - np.array(indices, dtype=int)] = True
+        on_road = np.arange(self.row_size) < n_cars
+        spaces = np.array([scenario.starting_space for scenario in self.scenarios], dtype=float)
+
+        self.rows('position')[:] = np.where(
+            on_road, np.arange(self.row_size)[::-1] - (self.row_size - n_cars), 0) * spaces[:, None]
+        self.rows('position')[:, ~on_road] = PARKED_POSITION
+        self.rows('velocity')[:] = np.where(on_road, starting_velocity, 0)
+        for field in self._float_fields[2:]:
+            self.rows(field)[:] = np.where(is_av, getattr(av, field), getattr(hv, field))
+        self.rows('kind')[:] = np.where(is_av, car_kind(av), car_kind(hv))
+        self.rows('kind')[:, ~on_road] = KIND_CAR
+        self.rows('max_velocity')[:, ~on_road] = 0
+        self.vehicle_id[:self.size] = np.arange(self.size)
+        self._n_vehicles = self.size
+
+        self.car_count = np.full(self.n_scenarios, n_cars)
+        self.hard_stops = np.zeros(self.n_scenarios, dtype=np.int64)
+
+        column = np.arange(self.size) % self.row_size
+        self.leader[:self.size] = np.where(column == 0, -1, np.arange(self.size) - 1)
+        self.follower[:self.size] = np.where(column == self.row_size - 1, -1,
+                                             np.arange(self.size) + 1)
+        self.active[:self.size] = True
+
+    def rows(self, field):
+        ''' (scenario x car) view of one of the per-car arrays. '''
+        return getattr(self, field)[:self.size].reshape(self.n_scenarios, self.row_size)
+
+    def lane_order(self):
+        ''' Slots of the cars front to back, one road after the other. '''
+        return np.arange(self.size)
+
+    def _insert_merging_car(self, scenario, column, position, velocity):
+        ''' Merge the merging car in front of the car at `column` of a road. '''
+        for field in self._fields:
+            row = self.rows(field)[scenario]
+            row[column + 1:] = row[column:-1].copy()
+        buffer = self.dist_buffer[:self.size].reshape(self.n_scenarios, self.row_size, -1)[scenario]
+        buffer[column + 1:] = buffer[column:-1].copy()
+
+        for field in self._float_fields:
+            self.rows(field)[scenario, column] = getattr(self.merging_car, field)
+        self.rows('position')[scenario, column] = position
+        self.rows('velocity')[scenario, column] = velocity
+        self.rows('kind')[scenario, column] = car_kind(self.merging_car)
+        self.rows('is_reacting')[scenario, column] = False
+        self.rows('dist_head')[scenario, column] = 0
+        self.rows('dist_count')[scenario, column] = 0
+        self.car_count[scenario] += 1
+        self.wake()
+
+    def run(self):
+        ''' Run all the roads for `total_time`.
+
+        Returns:
+            The number of cars past 1000 m and the number of hard stops
+            (potential crashes) on each road.
+        '''
+        dt = self.time_precision
+        mp = self.merge_position
+        countdown = np.full(self.n_scenarios, -999)
+        merge_ahead_of = np.full(self.n_scenarios, -1) # column of the car getting merged in front
+        merging_position = np.zeros(self.n_scenarios)
+        merging_velocity = np.zeros(self.n_scenarios)
+        merges = self.merge_ticks > 0
+        merge_ticks = np.where(merges, self.merge_ticks, 1)
+        row_start = np.arange(self.n_scenarios) * self.row_size
+
+        for time_index in range(self.position_update_count - 1):
+            prepare = merges & (time_index % merge_ticks == 0)
+            commence = merges & ~prepare & (countdown == 0)
+            countdown[prepare] = round(self.preparation_time / dt)
+            countdown[commence] = -999
+
+            for s in np.flatnonzero(commence & (merge_ahead_of >= 0)):
+                self._insert_merging_car(s, merge_ahead_of[s], merging_position[s], merging_velocity[s])
+                merge_ahead_of[s] = -1
+
+            ghosts = np.flatnonzero(merge_ahead_of >= 0)
+            ghost_index = row_start[ghosts] + merge_ahead_of[ghosts]
+            old_positions = self.rows('position').copy()
+            crashed = self.step(ghost_index=ghost_index if ghosts.size else None,
+                                ghost_car=self.merging_car)
+            self.hard_stops += np.bincount(crashed // self.row_size, minlength=self.n_scenarios)
+            if ghosts.size:
+                merging_position[ghosts] = self.ghost_position
+                merging_velocity[ghosts] = self.ghost_velocity
+                old_positions[ghosts, merge_ahead_of[ghosts]] = np.inf
+
+            # Find the car about to pass the merge position on each road preparing to merge.
+            if mp and prepare.any():
+                positions = self.rows('position')
+                straddles = (positions[:, :-1] > mp) & (old_positions[:, 1:] <= mp) & \
+                    (np.arange(1, self.row_size) < self.car_count[:, None])
+                straddles &= prepare[:, None]
+                found = np.flatnonzero(straddles.any(axis=1))
+                column = self.row_size - 1 - np.argmax(straddles[found, ::-1], axis=1)
+                merge_ahead_of[found] = column
+                merging_position[found] = mp
+                merging_velocity[found] = self.rows('velocity')[found, column - 1] * 0.9
+
+            countdown[countdown != -999] -= 1
+
+        throughput = np.count_nonzero(self.rows('position') >= 1000, axis=1)
+        return throughput, self.hard_stops.copy()
+
+
+def run_ensemble(scenarios, n_cars=70, total_time=100, merge_position=200,
+                 starting_velocity=0):
+    ''' Run every `Scenario` in one `Ensemble`.
+
+    Returns:
+        The throughput (cars past 1000 m) and hard stops of each scenario.
+    '''
+    return Ensemble(scenarios, n_cars, total_time, merge_position,
+                    starting_velocity).run()
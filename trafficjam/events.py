@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+import numpy as np
+import pandas as pd
+
+''' Columnar log of what happens on the road, kept in memory while it runs. '''
+
+EVENTS_FORMAT_VERSION = 1
+
+# Severities, as in the logging module.
+DEBUG = 10
+INFO = 20
+WARNING = 30
+SEVERITY_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING'}
+
+# Event types.
+CRASH = 0          # a car ran into the car in front and stopped
+PREPARE_MERGE = 1  # a car was picked to make room for a merging car
+COMMENCE_MERGE = 2 # the merging car joined the road
+ENTER = 3          # a car came in at the entrance of an open road
+EXIT = 4           # a car left at the end of an open road
+EVENT_NAMES = {CRASH: 'crash', PREPARE_MERGE: 'prepare_merge',
+               COMMENCE_MERGE: 'commence_merge', ENTER: 'enter', EXIT: 'exit'}
+EVENT_SEVERITY = {CRASH: WARNING, PREPARE_MERGE: INFO, COMMENCE_MERGE: INFO,
+                  ENTER: DEBUG, EXIT: DEBUG}
+
+class EventLog:
+    '''Events of a simulation, one preallocated array per column, see `Road.events`.
+
+    Recording an event only writes into the arrays, so nothing is printed
+    or written to disk while the simulation runs. The arrays grow in chunks
+    when they run out of room. Events less severe than `min_severity` are
+    not recorded at all.
+
+    The columns are
+
+    - ``time_index``: Time step of the event
+    - ``car``: History row of the car (see `Road.get_history_position_array`);
+      for ``prepare_merge`` the car making room, as the merging car has no
+      row yet. Negative for a car the `history.RecordingPolicy` does not record.
+    - ``event``: One of ``EVENT_NAMES``
+    - ``severity``: ``WARNING`` for crashes, ``INFO`` for merges and
+      ``DEBUG`` for cars entering or leaving an open road
+    - ``gap``: For crashes, the distance to the car in front (negative)
+    - ``velocity``: Velocity of the car before the event; for merges, of the merging car
+    - ``lead_velocity``: For crashes, velocity of the car in front
+
+    Columns that do not apply to an event are NaN.
+
+    Args:
+        min_severity (`int`): Least severe events recorded, ``INFO`` by default
+        capacity (`int`): Number of events to reserve room for
+        chunk_size (`int`): Number of events to add when growing
+    '''
+
+    columns = (('time_index', np.int64), ('car', np.int64), ('event', np.int8),
+               ('severity', np.int8), ('gap', float), ('velocity', float),
+               ('lead_velocity', float))
+
+    def __init__(self, min_severity=INFO, capacity=256, chunk_size=1024):
+        self.min_severity = min_severity
+        self.chunk_size = chunk_size
+        self.n_events = 0
+        for name, dtype in self.columns:
+            setattr(self, name, np.zeros(max(capacity, 1), dtype=dtype))
+
+    def __len__(self):
+        return self.n_events
+
+    def __getstate__(self):
+        # Leave the reserved room out of copies and checkpoints.
+        state = self.__dict__.copy()
+        for name, _ in self.columns:
+            state[name] = getattr(self, name)[:self.n_events].copy()
+        return state
+
+    def _reserve(self, n_events):
+        capacity = len(self.time_index)
+        if n_events <= capacity:
+            return
+        capacity = max(n_events, capacity + self.chunk_size)
+        for name, dtype in self.columns:
+            column = np.zeros(capacity, dtype=dtype)
+            column[:self.n_events] = getattr(self, name)[:self.n_events]
+            setattr(self, name, column)
+
+    def record(self, time_index, car, event, gap=np.nan, velocity=np.nan,
+               lead_velocity=np.nan):
+        ''' Add one event, unless it is less severe than `min_severity`. '''
+        severity = EVENT_SEVERITY[event]
+        if severity < self.min_severity:
+            return
+        self._reserve(self.n_events + 1)
+        i = self.n_events
+        self.time_index[i] = time_index
+        self.car[i] = car
+        self.event[i] = event
+        self.severity[i] = severity
+        self.gap[i] = gap
+        self.velocity[i] = velocity
+        self.lead_velocity[i] = lead_velocity
+        self.n_events += 1
+
+    def record_many(self, time_index, cars, event, gaps=np.nan, velocities=np.nan,
+                    lead_velocities=np.nan):
+        ''' Add one event of the same type for each of several cars, as `record`. '''
+        severity = EVENT_SEVERITY[event]
+        n = len(cars)
+        if severity < self.min_severity or not n:
+            return
+        self._reserve(self.n_events + n)
+        rows = slice(self.n_events, self.n_events + n)
+        self.time_index[rows] = time_index
+        self.car[rows] = cars
+        self.event[rows] = event
+        self.severity[rows] = severity
+        self.gap[rows] = gaps
+        self.velocity[rows] = velocities
+        self.lead_velocity[rows] = lead_velocities
+        self.n_events += n
+
+    def select(self, min_severity=None, event=None):
+        ''' The recorded events as a dictionary of column arrays (copies).
+
+        Args:
+            min_severity: Only the events at least this severe
+            event: Only the events of this type (a code or a name)
+        '''
+        keep = np.ones(self.n_events, dtype=bool)
+        if min_severity is not None:
+            keep &= self.severity[:self.n_events] >= min_severity
+        if event is not None:
+            if isinstance(event, str):
+                event = {name: code for code, name in EVENT_NAMES.items()}[event]
+            keep &= self.event[:self.n_events] == event
+        return {name: getattr(self, name)[:self.n_events][keep] for name, _ in self.columns}
+
+    def count(self, event):
+        ''' Number of recorded events of a type (a code or a name). '''
+        return len(self.select(event=event)['time_index'])
+
+    def to_dataframe(self, min_severity=None, event=None):
+        ''' The events as a ``pd.DataFrame``, with the event types and
+        severities as names. Takes the arguments of `select`. '''
+        frame = pd.DataFrame(self.select(min_severity, event))
+        frame['event'] = pd.Categorical(frame['event'].map(EVENT_NAMES),
+                                        categories=list(EVENT_NAMES.values()))
+        frame['severity'] = pd.Categorical(frame['severity'].map(SEVERITY_NAMES),
+                                           categories=list(SEVERITY_NAMES.values()))
+        return frame
+
+    def save(self, path, min_severity=None):
+        ''' Write the events to `path`.
+
+        A ``.parquet`` path is written with ``pd.DataFrame.to_parquet``, which
+        needs pyarrow or fastparquet. Any other path gets a ``.npz`` archive of
+        the column arrays, read back with `load_events`.
+        '''
+        if str(path).endswith('.parquet'):
+            self.to_dataframe(min_severity).to_parquet(path)
+            return
+        np.savez(path, version=EVENTS_FORMAT_VERSION, min_severity=self.min_severity,
+                 **self.select(min_severity))
+
+    def format(self, min_severity=None):
+        ''' The events as lines of text, for reading through them. '''
+        columns = self.select(min_severity)
+        lines = []
+        for i in range(len(columns['time_index'])):
+            line = '{} t={} car={} {}'.format(
+                SEVERITY_NAMES[columns['severity'][i]], columns['time_index'][i],
+                columns['car'][i], EVENT_NAMES[columns['event'][i]])
+            for name in ('gap', 'velocity', 'lead_velocity'):
+                if not np.isnan(columns[name][i]):
+                    line += ' {}={:.3f}'.format(name, columns[name][i])
+            lines.append(line)
+        return '\n'.join(lines)
+
+def load_events(path):
+    ''' Read back an `EventLog` written by `EventLog.save` to a ``.npz`` file. '''
+    with np.load(path) as archive:
+        if int(archive['version']) != EVENTS_FORMAT_VERSION:
+            raise ValueError('Unknown event log version ' + str(archive['version']))
+        events = EventLog(int(archive['min_severity']), capacity=len(archive['time_index']))
+        n_events = len(archive['time_index'])
+        for name, _ in EventLog.columns:
+            getattr(events, name)[:n_events] = archive[name]
+        events.n_events = n_events
+    return events
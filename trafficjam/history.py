@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+import numpy as np
+
+''' Preallocated storage for the history of the simulation, and streaming it to disk. '''
+
+SINK_FORMAT_VERSION = 1
+FIELDS = ('positions', 'velocities', 'crashes')
+DISCARD_ROW = -2 # the row of a car that is not recorded
+SPARE_ROWS = 2 # rows at the end of the arrays never given out, see `HistoryBuffer`
+
+def padding(rows):
+    ''' Position the rows of cars not on the road are padded with, see `HistoryBuffer`. '''
+    return -100 - np.asarray(rows) * 10
+
+class RecordingPolicy:
+    '''What the history of a run keeps, see `Road.run_simulation`.
+
+    Cars not recorded and time steps not kept take up no room in the
+    history, so throughput sweeps can record nothing at all and videos every
+    few time steps.
+
+    Args:
+        stride (`int`): Keep every `stride`-th time step. A time point of the
+            history is then ``stride * time_precision`` seconds after the one
+            before; the last one is always the latest time step.
+        vehicles: Numbers of the cars to record, counting the cars in the order
+            they get a row (front to back at the start of the first run, then
+            in the order they merge or enter), every car if None
+        fields: Which of ``FIELDS`` to keep: the positions and velocities of
+            the recorded cars, and the total of the potential crashes at each
+            time point. ``'velocities'`` needs ``'positions'``. Without any
+            field the history stays a single time point, and the crashes are
+            only counted in `Road.potential_crash_count`.
+    '''
+
+    def __init__(self, stride=1, vehicles=None, fields=('positions', 'crashes')):
+        if int(stride) != stride or stride < 1:
+            raise ValueError('The stride must be a positive integer, not ' + str(stride))
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError('Unknown fields ' + str(sorted(unknown)) + ', use some of ' + str(FIELDS))
+        if 'velocities' in fields and 'positions' not in fields:
+            raise ValueError('Recording the velocities needs the positions')
+        self.stride = int(stride)
+        self.vehicles = None if vehicles is None else frozenset(int(vehicle) for vehicle in vehicles)
+        self.fields = tuple(field for field in FIELDS if field in fields)
+
+    @classmethod
+    def off(cls):
+        ''' Record nothing, for runs that only need the counts. '''
+        return cls(vehicles=(), fields=())
+
+    def records(self, vehicle):
+        ''' Whether the car numbered `vehicle` gets a row. '''
+        return 'positions' in self.fields and (self.vehicles is None or vehicle in self.vehicles)
+
+    def records_many(self, first, n):
+        ''' Whether each of the `n` cars numbered from `first` on gets a row. '''
+        if 'positions' not in self.fields:
+            return np.zeros(n, dtype=bool)
+        if self.vehicles is None:
+            return np.ones(n, dtype=bool)
+        return np.isin(np.arange(first, first + n), np.fromiter(self.vehicles, dtype=np.int64))
+
+    def __repr__(self):
+        return 'RecordingPolicy(stride={}, vehicles={}, fields={})'.format(
+            self.stride, None if self.vehicles is None else sorted(self.vehicles), self.fields)
+
+EVERYTHING = RecordingPolicy()
+
+class HistoryBuffer:
+    '''Positions of every car (rows) at every time point (columns) in one
+    preallocated NumPy array, plus the running total of potential crashes.
+
+    Cars write straight into their row, so nothing is copied when the history
+    is read back. The array grows in chunks when it runs out of room.
+
+    Rows are given out in the order the cars join the road. Before a car joins
+    its row is padded with ``-100 - row * 10``, which keeps it off the road in
+    the plots. On an open road the row of a car that left is padded the same
+    way until it is given to the next car joining.
+
+    When the history is streamed to a `HistorySink` only the time points not
+    yet flushed are kept; ``column_offset`` is then the number of time points
+    before column 0.
+
+    The `policy` decides which cars get a row and how often a new time point
+    is started; until then every time step overwrites the current one. Cars
+    without a row have ``DISCARD_ROW`` and write into one of the last
+    ``SPARE_ROWS`` rows of the arrays, which are never given out or read.
+
+    Args:
+        n_rows (`int`): Number of cars to reserve room for
+        n_columns (`int`): Number of time points to reserve room for
+        chunk_size (`int`): Number of time points to add when growing
+
+    Attributes:
+        positions (`np.ndarray`): The (cars x time points) position array,
+            including the unused reserved room
+        velocities (`np.ndarray`): Velocities in the same layout, None unless
+            the policy records them
+        crashes (`np.ndarray`): Total potential crashes at each time point
+        first_column (`np.ndarray`): Time point where each car joined the road
+        column (`int`): The column being written at the moment
+        column_offset (`int`): Time points before column 0
+        tick (`int`): Time steps taken
+        n_vehicles (`int`): Cars that joined, recorded or not
+        policy (`RecordingPolicy`): What is recorded, see `set_policy`
+    '''
+
+    def __init__(self, n_rows=0, n_columns=1, chunk_size=1024):
+        self.chunk_size = chunk_size
+        self.positions = np.zeros((max(n_rows, 0) + SPARE_ROWS, max(n_columns, 1)))
+        self.velocities = None
+        self.crashes = np.zeros(self.positions.shape[1], dtype=np.int64)
+        self.first_column = np.zeros(self.positions.shape[0], dtype=np.int64)
+        self.n_rows = 0
+        self.column = 0
+        self.column_offset = 0
+        self.tick = 0
+        self.n_vehicles = 0
+        self.policy = EVERYTHING
+        self._ticks_left = 0 # time steps still going into the current column
+        self._new_column = False # whether this time step started the current column
+        self._unwritten_column = 0
+
+    def set_policy(self, policy):
+        ''' Record following `policy` from the next time step on. The cars
+        already recorded keep their rows. '''
+        self.policy = policy
+        if 'velocities' in policy.fields and self.velocities is None:
+            self.velocities = np.zeros(self.positions.shape)
+
+    @property
+    def n_columns(self):
+        ''' Number of time points held in memory. '''
+        return self.column + 1
+
+    @property
+    def time_index(self):
+        ''' Time step being written. '''
+        return self.tick
+
+    @property
+    def previous_column(self):
+        ''' The column holding the time step before the one being written. '''
+        return self.column - 1 if self._new_column else self.column
+
+    def columns_for(self, n_ticks):
+        ''' Number of new time points `n_ticks` more time steps take up. '''
+        if not self.policy.fields:
+            return 0
+        return -(-max(n_ticks - self._ticks_left, 0) // self.policy.stride)
+
+    def ticks_for(self, n_columns):
+        ''' Most time steps that start no more than `n_columns` new time points. '''
+        if not self.policy.fields:
+            return np.inf
+        return self._ticks_left + n_columns * self.policy.stride
+
+    def reserve(self, n_rows=0, n_columns=0):
+        ''' Make sure there is room for `n_rows` cars and `n_columns` time points. '''
+        rows, columns = self.positions.shape
+        if n_rows + SPARE_ROWS <= rows and n_columns <= columns:
+            return
+        if n_rows + SPARE_ROWS > rows:
+            rows = max(n_rows + SPARE_ROWS, 2 * rows)
+        columns = max(n_columns, columns)
+
+        positions = np.zeros((rows, columns))
+        positions[:self.n_rows, :self.n_columns] = self.positions[:self.n_rows, :self.n_columns]
+        self.positions = positions
+        if self.velocities is not None:
+            velocities = np.zeros((rows, columns))
+            velocities[:self.n_rows, :self.n_columns] = self.velocities[:self.n_rows, :self.n_columns]
+            self.velocities = velocities
+        crashes = np.zeros(columns, dtype=np.int64)
+        crashes[:self.n_columns] = self.crashes[:self.n_columns]
+        self.crashes = crashes
+        first_column = np.zeros(rows, dtype=np.int64)
+        first_column[:self.n_rows] = self.first_column[:self.n_rows]
+        self.first_column = first_column
+
+    def __getstate__(self):
+        # Leave the reserved room out of copies and checkpoints.
+        state = self.__dict__.copy()
+        rows, columns = self.n_rows + SPARE_ROWS, self.n_columns
+        state['positions'] = self.positions[:rows, :columns].copy()
+        if self.velocities is not None:
+            state['velocities'] = self.velocities[:rows, :columns].copy()
+        state['crashes'] = self.crashes[:columns].copy()
+        state['first_column'] = self.first_column[:rows].copy()
+        return state
+
+    def add_rows(self, positions, column=None, velocities=0.):
+        ''' Give a row to each of several cars joining the road, or
+        ``DISCARD_ROW`` to the cars the policy does not record.
+
+        Args:
+            positions: Position of each car at `column`
+            column: Time point the cars join at, defaults to the current one
+            velocities: Velocity of each car at `column`
+
+        Returns:
+            The rows given to the cars.
+        '''
+        if column is None:
+            column = self.column
+        positions = np.asarray(positions, dtype=float)
+        recorded = self.policy.records_many(self.n_vehicles, len(positions))
+        self.n_vehicles += len(positions)
+        rows = np.full(len(positions), DISCARD_ROW, dtype=np.int64)
+        n_recorded = int(np.count_nonzero(recorded))
+        rows[recorded] = np.arange(self.n_rows, self.n_rows + n_recorded)
+        self.reserve(n_rows=self.n_rows + n_recorded)
+        new = rows[recorded]
+        self.positions[new, :column] = padding(new)[:, None]
+        self.positions[new, column] = positions[recorded]
+        if self.velocities is not None:
+            self.velocities[new, :column] = 0
+            self.velocities[new, column] = np.broadcast_to(velocities, positions.shape)[recorded]
+        self.first_column[new] = self.column_offset + column
+        self.n_rows += n_recorded
+        return rows
+
+    def add_row(self, positions, column=None, row=None, velocity=0.):
+        ''' Give a row to a car joining the road, or ``DISCARD_ROW`` if the
+        policy does not record it.
+
+        Args:
+            positions: The positions of the car so far, the last one at `column`
+            column: Time point of the last position, defaults to the current one
+            row: Row of a car that left the road to reuse, a new row if None
+            velocity: Velocity of the car at `column`
+
+        Returns:
+            The row given to the car.
+        '''
+        if column is None:
+            column = self.column
+        if self.policy.stride > 1:
+            positions = positions[-1:] # the earlier time steps do not line up with the columns
+        start = column - len(positions) + 1
+        if row is None:
+            row = self.add_rows([positions[0]], start)[0]
+            if row == DISCARD_ROW:
+                return row
+        else:
+            if not self.policy.records(self.n_vehicles):
+                self.n_vehicles += 1
+                return DISCARD_ROW
+            self.n_vehicles += 1
+            self.first_column[row] = self.column_offset + start
+        self.positions[row, start:column + 1] = positions
+        if self.velocities is not None:
+            self.velocities[row, start:column] = 0
+            self.velocities[row, column] = velocity
+        return row
+
+    def pad_rows(self, rows, first_column=None):
+        ''' Keep the rows of cars that left the road off the road at this time
+        point, and the ones since `first_column` if given. '''
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = slice(self.column if first_column is None else first_column, self.column + 1)
+        self.positions[rows, columns] = padding(rows)[:, None]
+        if self.velocities is not None:
+            self.velocities[rows, columns] = 0
+
+    def advance(self):
+        ''' Move on to the next time step. A new time point is started, growing
+        the arrays if needed, once the policy has had `stride` time steps go into
+        the current one; until then the current one is written over. '''
+        self.tick += 1
+        self._new_column = self._ticks_left == 0 and bool(self.policy.fields)
+        if not self._new_column:
+            self._ticks_left = max(self._ticks_left - 1, 0)
+            return
+        self._ticks_left = self.policy.stride - 1
+        if self.n_columns == self.positions.shape[1]:
+            self.reserve(n_columns=self.n_columns + self.chunk_size)
+        self.column += 1
+        self.crashes[self.column] = self.crashes[self.column - 1]
+
+    def get_positions(self):
+        ''' View of the positions of all cars at all time points so far. '''
+        return self.positions[:self.n_rows, :self.n_columns]
+
+    def get_velocities(self):
+        ''' View of the velocities of all cars at all time points so far.
+
+        Raises:
+            ValueError: when the policy does not record the velocities.
+        '''
+        if self.velocities is None:
+            raise ValueError('The velocities are not recorded, see RecordingPolicy')
+        return self.velocities[:self.n_rows, :self.n_columns]
+
+    def get_row(self, row):
+        ''' View of the positions of one car since it joined the road, empty
+        for a car that is not recorded. '''
+        if row < 0:
+            return self.positions[row, :0]
+        first_column = max(self.first_column[row] - self.column_offset, 0)
+        return self.positions[row, first_column:self.n_columns]
+
+    def get_crashes(self):
+        ''' View of the total potential crashes at each time point so far.
+
+        Raises:
+            ValueError: when the policy does not record the crashes.
+        '''
+        if 'crashes' not in self.policy.fields:
+            raise ValueError('The crashes are not recorded, see RecordingPolicy')
+        return self.crashes[:self.n_columns]
+
+    def flush(self, sink, include_current=False):
+        ''' Write the time points not written yet to `sink` and forget all but
+        the current one, so memory does not grow with the simulation.
+
+        Args:
+            sink: `HistorySink` to write to
+            include_current: also write the current time point, which is then
+                kept in memory but not written again
+        '''
+        end = self.n_columns if include_current else self.column
+        if end > self._unwritten_column:
+            sink.write(self.positions[:self.n_rows, self._unwritten_column:end],
+                       self.crashes[self._unwritten_column:end])
+        self.positions[:self.n_rows, 0] = self.positions[:self.n_rows, self.column]
+        self.crashes[0] = self.crashes[self.column]
+        self.column_offset += self.column
+        self.column = 0
+        self._unwritten_column = 1 if include_current else 0
+
+
+class HistorySink:
+    '''Append-only binary file the history is streamed to while the
+    simulation runs, see `Road.run_simulation`.
+
+    The file is a sequence of ``.npy`` arrays: a header
+    ``[SINK_FORMAT_VERSION, time_precision]``, then for every flush the
+    (time points x cars) positions and the crash totals of those time points.
+    Cars that joined later have more columns in the later chunks.
+
+    Args:
+        path: File to write
+        time_precision (`float`): Seconds between two time points
+        flush_interval (`int`): Number of time steps kept in memory between flushes
+        dtype: Type the positions are stored as
+
+    Attributes:
+        n_columns (`int`): Number of time points written so far
+    '''
+
+    def __init__(self, path, time_precision, flush_interval=1000, dtype=np.float32):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.dtype = dtype
+        self.n_columns = 0
+        self.file = open(path, 'wb')
+        np.save(self.file, np.array([SINK_FORMAT_VERSION, time_precision]))
+
+    def write(self, positions, crashes):
+        ''' Append the positions (cars x time points) and crash totals of some time points. '''
+        np.save(self.file, np.ascontiguousarray(positions.T, dtype=self.dtype))
+        np.save(self.file, np.asarray(crashes, dtype=np.int64))
+        self.n_columns += len(crashes)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_history(path):
+    ''' Read back a history written by a `HistorySink`.
+
+    Returns:
+        The (cars x time points) positions, padded like
+        `HistoryBuffer.get_positions`, the crash totals and the time precision.
+    '''
+    positions, crashes = [], []
+    with open(path, 'rb') as history_file:
+        version, time_precision = np.load(history_file)
+        if version != SINK_FORMAT_VERSION:
+            raise ValueError('Unknown history format version ' + str(version))
+        while history_file.peek(1):
+            positions.append(np.load(history_file))
+            crashes.append(np.load(history_file))
+
+    n_rows = max((chunk.shape[1] for chunk in positions), default=0)
+    crashes = np.concatenate(crashes) if crashes else np.zeros(0, dtype=np.int64)
+    position_array = np.empty((n_rows, len(crashes)), dtype=positions[0].dtype if positions else float)
+    position_array[:] = padding(np.arange(n_rows))[:, None]
+    column = 0
+    for chunk in positions:
+        position_array[:chunk.shape[1], column:column + len(chunk)] = chunk.T
+        column += len(chunk)
+    return position_array, crashes, time_precision
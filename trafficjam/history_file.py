@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+import json
+import sys
+import numpy as np
+import pandas as pd
+from history import padding
+
+''' Binary history files that can be memory mapped for plotting. '''
+
+MAGIC = b'TJHIST\x00'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+class HistoryFile:
+    '''A history file opened with `open_history`. The arrays are memory maps,
+    so opening is instant and only the time points that are used are read
+    from disk.
+
+    The file starts with ``MAGIC``, a format version byte and the length of a
+    JSON header holding the metadata and where each array starts. The
+    positions and velocities are stored time point by time point, so one
+    frame of an animation is one contiguous block.
+
+    Attributes:
+        positions (`np.ndarray`): (cars x time points) positions
+        velocities (`np.ndarray`): (cars x time points) velocities
+        crashes (`np.ndarray`): Total potential crashes at each time point
+        car_classes (`list`): Class name of each car
+        time_precision (`float`): Seconds between two time points
+        min_position (`float`): Smallest position in the file
+        max_position (`float`): Largest position in the file
+    '''
+
+    def __init__(self, path, header, offset):
+        shape = (header['n_time'], header['n_cars'])
+        dtype = np.dtype(header['dtype'])
+        arrays = header['arrays']
+        self.path = path
+        self.time_precision = header['time_precision']
+        self.min_position = header['min_position']
+        self.max_position = header['max_position']
+        self.positions = np.memmap(path, dtype, 'r', offset + arrays['positions'], shape).T
+        self.velocities = np.memmap(path, dtype, 'r', offset + arrays['velocities'], shape).T
+        self.crashes = np.memmap(path, np.int64, 'r', offset + arrays['crashes'], shape[:1])
+        codes = np.fromfile(path, np.uint8, shape[1], offset=offset + arrays['car_classes'])
+        self.car_classes = [header['class_names'][code] for code in codes]
+
+    @property
+    def n_cars(self):
+        return self.positions.shape[0]
+
+    @property
+    def n_time(self):
+        return self.positions.shape[1]
+
+
+def _aligned(n_bytes):
+    return -(-n_bytes // ALIGNMENT) * ALIGNMENT
+
+def _header_bytes(header):
+    ''' The start of the file for this header, padded so the arrays are aligned. '''
+    text = json.dumps(header).encode()
+    prefix_length = len(MAGIC) + 1 + 4
+    text += b' ' * (_aligned(prefix_length + len(text)) - prefix_length - len(text))
+    return MAGIC + bytes([FORMAT_VERSION]) + np.uint32(len(text)).tobytes() + text
+
+def write_history_file(path, positions, crashes, time_precision, car_classes=None,
+                       velocities=None, dtype=np.float32, chunk_size=1024, circumference=None):
+    ''' Write a history to a binary history file.
+
+    Args:
+        path: File to write
+        positions: (cars x time points) positions, may itself be a memory map
+        crashes: Total potential crashes at each time point
+        time_precision (`float`): Seconds between two time points
+        car_classes: Class name of each car, ``'Car'`` if not given
+        velocities: (cars x time points) velocities, worked out from the
+            positions if not given: 0 at the first time point and wherever a
+            row is padded (see `history.HistoryBuffer`) at that time point or
+            the one before
+        dtype: Type the positions and velocities are stored as
+        chunk_size (`int`): Time points converted at once, which bounds the memory used
+        circumference (`float`): Length of the ring road the positions wrap
+            around, so working the velocities out does not jump at the wrap
+    '''
+    n_cars, n_time = positions.shape
+    if car_classes is None:
+        car_classes = ['Car'] * n_cars
+    class_names = sorted(set(car_classes))
+    codes = np.array([class_names.index(name) for name in car_classes], dtype=np.uint8)
+
+    block = _aligned(n_cars * n_time * np.dtype(dtype).itemsize)
+    arrays = {'positions': 0, 'velocities': block, 'crashes': 2 * block}
+    arrays['car_classes'] = arrays['crashes'] + _aligned(n_time * 8)
+
+    min_position, max_position = np.inf, -np.inf
+    for start in range(0, n_time, chunk_size):
+        chunk = np.asarray(positions[:, start:start + chunk_size])
+        if chunk.size:
+            min_position = min(min_position, float(chunk.min()))
+            max_position = max(max_position, float(chunk.max()))
+
+    header = {'version': FORMAT_VERSION, 'dtype': np.dtype(dtype).str, 'n_cars': n_cars,
+              'n_time': n_time, 'time_precision': time_precision,
+              'min_position': min_position, 'max_position': max_position,
+              'class_names': class_names, 'arrays': arrays}
+    start_bytes = _header_bytes(header)
+    offset = len(start_bytes)
+    with open(path, 'wb') as history_file:
+        history_file.write(start_bytes)
+        history_file.truncate(offset + arrays['car_classes'] + n_cars)
+
+    shape = (n_time, n_cars)
+    out_positions = np.memmap(path, dtype, 'r+', offset + arrays['positions'], shape)
+    out_velocities = np.memmap(path, dtype, 'r+', offset + arrays['velocities'], shape)
+    for start in range(0, n_time, chunk_size):
+        end = min(start + chunk_size, n_time)
+        chunk = np.asarray(positions[:, start:end], dtype=float)
+        out_positions[start:end] = chunk.T
+        if velocities is not None:
+            out_velocities[start:end] = np.asarray(velocities[:, start:end]).T
+        else:
+            previous = np.asarray(positions[:, max(start - 1, 0):end - 1], dtype=float)
+            if start == 0:
+                previous = np.concatenate([chunk[:, :1], previous], axis=1)
+            distance = chunk - previous
+            if circumference is not None:
+                distance -= np.round(distance / circumference) * circumference
+            padded = padding(np.arange(n_cars))[:, None]
+            distance[(chunk == padded) | (previous == padded)] = 0
+            out_velocities[start:end] = (distance / time_precision).T
+    out_positions.flush()
+    out_velocities.flush()
+    del out_positions, out_velocities
+
+    out_crashes = np.memmap(path, np.int64, 'r+', offset + arrays['crashes'], (n_time,))
+    out_crashes[:] = np.asarray(crashes).reshape(-1)
+    out_crashes.flush()
+    del out_crashes
+    out_classes = np.memmap(path, np.uint8, 'r+', offset + arrays['car_classes'], (n_cars,))
+    out_classes[:] = codes
+    out_classes.flush()
+
+def write_road_history(path, road, **kwargs):
+    ''' Write the history of a `road.Road` to a binary history file, with
+    the velocities it recorded if its `history.RecordingPolicy` keeps them. '''
+    positions = road.get_history_position_array()
+    if road.history.velocities is not None:
+        kwargs.setdefault('velocities', road.get_history_velocity_array())
+    kwargs.setdefault('circumference', road.circumference)
+    write_history_file(path, positions, road.get_history_potential_crashes(),
+                       road.history_time_precision, car_classes=road.get_history_car_classes(),
+                       **kwargs)
+
+def open_history(path):
+    ''' Open a binary history file as a `HistoryFile` of memory maps. '''
+    with open(path, 'rb') as history_file:
+        start = history_file.read(len(MAGIC) + 1 + 4)
+        if start[:len(MAGIC)] != MAGIC:
+            raise ValueError(str(path) + ' is not a history file')
+        if start[len(MAGIC)] != FORMAT_VERSION:
+            raise ValueError('Unknown history file version ' + str(start[len(MAGIC)]))
+        header_length = int(np.frombuffer(start[len(MAGIC) + 1:], np.uint32)[0])
+        header = json.loads(history_file.read(header_length))
+    return HistoryFile(path, header, len(start) + header_length)
+
+def convert_csv(positions_csv, crashes_csv, path, time_precision=0.2, **kwargs):
+    ''' Convert the ``history_positions_*.csv`` and ``history_crashes_*.csv``
+    written by ``traffic_jam.save_dataframe`` into a binary history file. '''
+    positions = pd.read_csv(positions_csv, header=0, index_col=0).values
+    crashes = pd.read_csv(crashes_csv, header=0, index_col=0).values
+    write_history_file(path, positions, crashes, time_precision, **kwargs)
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4:
+        exit('Usage: history_file.py history_positions.csv history_crashes.csv output.tjh')
+    convert_csv(*sys.argv[1:])
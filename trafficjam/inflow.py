@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+import numpy as np
+from car import AutonomousVehicle, HumanVehicle
+
+''' Arrival processes feeding cars into the entrance of an open road. '''
+
+class Arrivals:
+    '''Base of the arrival processes, see `Road.set_inflow`.
+
+    Every time step `arrivals` gives the classes of the cars reaching the
+    entrance; a fraction `AV_percentage` of them (picked at random) are
+    autonomous, the rest human driven.
+
+    Args:
+        AV_percentage (`float`): Fraction of the arriving cars that are autonomous
+        seed: Seed of the generator picking the arrivals, random if None
+    '''
+
+    def __init__(self, AV_percentage=0, seed=None):
+        assert AV_percentage >= 0 and AV_percentage <= 1
+        self.AV_percentage = AV_percentage
+        self.rng = np.random.default_rng(seed)
+
+    def count(self, time_precision):
+        ''' Number of cars reaching the entrance during the next time step. '''
+        raise NotImplementedError
+
+    def arrivals(self, time_precision):
+        ''' Classes of the cars reaching the entrance during the next time step. '''
+        return [AutonomousVehicle if self.rng.random() < self.AV_percentage else HumanVehicle
+                for _ in range(self.count(time_precision))]
+
+
+class PoissonArrivals(Arrivals):
+    '''Cars arriving at random, `rate` cars per second on average.
+
+    Args:
+        rate (`float`): Mean number of cars arriving per second
+        AV_percentage (`float`): Fraction of the arriving cars that are autonomous
+        seed: Seed of the generator picking the arrivals, random if None
+    '''
+
+    def __init__(self, rate, AV_percentage=0, seed=None):
+        super().__init__(AV_percentage, seed)
+        self.rate = rate
+
+    def count(self, time_precision):
+        return int(self.rng.poisson(self.rate * time_precision))
+
+
+class FixedHeadway(Arrivals):
+    '''One car arriving every `headway` seconds, the first one straight away.
+
+    Args:
+        headway (`float`): Seconds between two cars
+        AV_percentage (`float`): Fraction of the arriving cars that are autonomous
+        seed: Seed of the generator picking the arrivals, random if None
+    '''
+
+    def __init__(self, headway, AV_percentage=0, seed=None):
+        super().__init__(AV_percentage, seed)
+        self.headway = headway
+        self.n_steps = 0
+        self.n_arrived = 0
+
+    def count(self, time_precision):
+        # Count time steps rather than add up seconds, so the headway does not drift.
+        self.n_steps += 1
+        due = int(self.n_steps * time_precision / self.headway + 1e-9) + 1
+        count = due - self.n_arrived
+        self.n_arrived += count
+        return count
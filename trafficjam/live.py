@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+import multiprocessing
+import queue
+import threading
+from collections import namedtuple
+from history import RecordingPolicy
+
+''' Watching a simulation while it runs, see `plotting.plot_live`. '''
+
+Snapshot = namedtuple('Snapshot', ['time_index', 'positions', 'velocities',
+                                   'crash_count', 'dropped'])
+Snapshot.__doc__ = ''' The cars on the road after time step ``time_index``, front
+to back, the potential crashes so far and the snapshots the producer dropped
+so far because the queue was full. '''
+
+class LiveFeed:
+    '''Bounded queue of `Snapshot` from a running simulation to whatever draws it,
+    given to `Road.run_simulation` as ``live_feed``.
+
+    The simulation never waits on the drawing: a snapshot that finds the
+    queue full is dropped, and the drawing side skips to the newest snapshot
+    waiting. At most `maxsize` snapshots are ever held, so watching a long run
+    takes the same memory as watching a short one.
+
+    Args:
+        maxsize (`int`): Snapshots the queue holds at most
+        every (`int`): Publish a snapshot every this many time steps
+        process (`bool`): Make a queue that works between processes, for a
+            simulation in a `multiprocessing.Process`, rather than threads
+
+    Attributes:
+        published (`int`): Snapshots put in the queue, on the simulation side
+        dropped (`int`): Snapshots dropped as the queue was full, on the
+            simulation side
+        skipped (`int`): Snapshots taken out but not drawn, on the drawing side
+        finished (`bool`): Whether the end of the run came through, on the
+            drawing side
+    '''
+
+    def __init__(self, maxsize=8, every=1, process=False):
+        if maxsize < 1:
+            raise ValueError('The queue must hold at least one snapshot, not ' + str(maxsize))
+        self.queue = multiprocessing.Queue(maxsize) if process else queue.Queue(maxsize)
+        self.every = every
+        self.published = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.finished = False
+        self._ticks = 0
+
+    def publish(self, road):
+        ''' Put the cars on `road` in the queue, or drop them if it is full. '''
+        self._ticks += 1
+        if self._ticks % self.every:
+            return
+        positions, velocities = road.get_car_state()
+        snapshot = Snapshot(road.history.time_index, positions, velocities,
+                            road.potential_crash_count, self.dropped)
+        try:
+            self.queue.put_nowait(snapshot)
+            self.published += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        ''' Tell the drawing side the run is over, dropping the oldest snapshot
+        if there is no room, so this does not wait either. '''
+        while True:
+            try:
+                self.queue.put_nowait(None)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def latest(self, timeout=None):
+        ''' The newest snapshot waiting, skipping the older ones.
+
+        Args:
+            timeout: Seconds to wait for a snapshot if none is waiting, None to
+                wait as long as it takes, 0 not to wait
+
+        Returns:
+            The `Snapshot`, or None if none came or the run is over.
+        '''
+        snapshot = None
+        if not self.finished:
+            try:
+                snapshot = self.queue.get(timeout=timeout) if timeout != 0 else self.queue.get_nowait()
+            except queue.Empty:
+                return None
+        while snapshot is not None:
+            try:
+                newer = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if newer is None:
+                self.finished = True
+                break
+            self.skipped += 1
+            snapshot = newer
+        if snapshot is None:
+            self.finished = True
+        return snapshot
+
+    def __iter__(self):
+        ''' The newest snapshot each time one is asked for, until the run is over. '''
+        while True:
+            snapshot = self.latest()
+            if snapshot is None:
+                return
+            yield snapshot
+
+
+def run_live(road, feed, total_timesteps, **kwargs):
+    ''' `Road.run_simulation` publishing to `feed`, which is closed at the end. '''
+    try:
+        road.run_simulation(total_timesteps, live_feed=feed, **kwargs)
+    finally:
+        feed.close()
+    return road
+
+def start_live(road, total_timesteps, maxsize=8, every=1, process=False,
+               recording=None, **kwargs):
+    ''' Run `road` in the background, publishing to a new `LiveFeed`.
+
+    With a thread the simulation shares the interpreter with the drawing but
+    still never waits on it, and `road` is the road being simulated. With a
+    process the simulation gets a core of its own, and runs on a copy of
+    `road`: the road given is left as it is.
+
+    Args:
+        road: The `road.Road` to simulate
+        total_timesteps: Seconds to simulate
+        maxsize (`int`): Snapshots the queue holds at most
+        every (`int`): Publish a snapshot every this many time steps
+        process (`bool`): Run in a process rather than a thread
+        recording: `history.RecordingPolicy` of the run, by default
+            `RecordingPolicy.off`, since the snapshots are what is watched
+        kwargs: Passed on to `Road.run_simulation`
+
+    Returns:
+        The `LiveFeed` and the started `threading.Thread` or `multiprocessing.Process`.
+    '''
+    feed = LiveFeed(maxsize, every, process)
+    kwargs['recording'] = RecordingPolicy.off() if recording is None else recording
+    worker_class = multiprocessing.Process if process else threading.Thread
+    worker = worker_class(target=run_live, args=(road, feed, total_timesteps), kwargs=kwargs,
+                          daemon=True)
+    worker.start()
+    return feed, worker
@@ -0,0 +1,988 @@
+#!/usr/bin/env python
+import numpy as np
+from car import Car, AV_POLICY, HV_POLICY
+from profiling import NO_STATS
+
+''' Structure-of-arrays stepping engine for the cars on a road. '''
+
+# Following rules the vectorized engine knows how to evaluate.
+KIND_CAR = 0 # keeps `safe_dist` to the car in front
+KIND_AV = 1  # AutonomousVehicle rule
+KIND_HV = 2  # HumanVehicle rule
+KIND_NAMES = {KIND_CAR: 'Car', KIND_AV: 'AutonomousVehicle', KIND_HV: 'HumanVehicle'}
+
+AV_D0 = AV_POLICY.d0
+HV_D0 = HV_POLICY.d0
+AV_FOLLOWING_FACTOR = AV_POLICY.autonomous_factor # an AV may follow another AV this much closer
+NO_LEADER_POSITION = 1e6 # where the lead car believes the next car is
+QUIET_HORIZON = 64 # most time steps a quiet car is skipped for
+PROOF_INTERVAL = 8 # time steps between two searches for quiet cars
+
+
+def car_kind(car):
+    ''' Work out which following rule a car object uses.
+
+    Raises:
+        ValueError: when the car uses a rule the vectorized engine cannot evaluate.
+    '''
+    if car.policy is AV_POLICY:
+        return KIND_AV
+    if car.policy is HV_POLICY:
+        return KIND_HV
+    if type(car).update_position is Car.update_position and car.can_speed_up_func is None:
+        return KIND_CAR
+    raise ValueError('The vectorized engine cannot run ' + type(car).__name__ +
+                     ', it has a custom update rule')
+
+
+class Platoon:
+    '''All the cars on a road held as NumPy arrays. Every time step the gaps,
+    speed-up decisions and integration are done for the whole platoon at
+    once, reproducing `Car.update_position` exactly.
+
+    Each car sits in a slot of the arrays for as long as it is on the road.
+    The order of the lane is kept as a doubly linked list: ``leader[s]`` is
+    the slot of the car in front of the car in slot ``s`` (-1 for the lead
+    car) and ``follower[s]`` the slot of the car behind it (-1 for the last
+    car). A car merging in or leaving only relinks its neighbours, so it
+    costs the same however long the road is. The slots of cars that left
+    are reused by the next cars to join.
+
+    Every car also has a ``vehicle_id`` which never changes, and a
+    ``history_row`` once it records into a `history.HistoryBuffer` (-1 before,
+    ``history.DISCARD_ROW`` if the history does not record it).
+
+    With a ``circumference`` the lane is a ring: the lead car follows the
+    last car, as it was before the step, a lap ahead.
+
+    Cars cruising at their maximum velocity far behind the car in front are
+    quiet: it can be proven that they keep going at that velocity for the
+    next few time steps, whatever the cars in front do, so `step` skips
+    working out their decisions. See `_prove_quiet`.
+
+    Args:
+        time_precision (`float`): Seconds advanced every time step
+        capacity (`int`): Number of cars to reserve room for
+
+    Attributes:
+        size (`int`): Number of slots in use, including free ones
+        head (`int`): Slot of the lead car, -1 for an empty road
+        tail (`int`): Slot of the last car, -1 for an empty road
+        circumference (`float`): Length of the ring, None for an open road
+        quiet_horizon (`int`): Most time steps a quiet car is skipped for,
+            0 to work out every car every time step
+        tick (`int`): Number of time steps taken
+        history (`history.HistoryBuffer`): Where the positions are recorded
+        stats (`profiling.RunStats`): Where `step` puts down the time of its
+            phases, ``profiling.NO_STATS`` when not profiling
+        last_crashes (`tuple`): Distance to the car in front, velocity and
+            velocity of the car in front of each car that crashed in the
+            last `step`, as in `Car.last_crash`
+    '''
+
+    _float_fields = ('position', 'velocity', 'braking_rate', 'acceleration_rate',
+                     'max_velocity', 'length', 'safe_dist', 'reaction_time',
+                     'launch_acceleration', 'acceleration_falloff', 'gap_factor')
+    _fields = _float_fields + ('kind', 'vehicle_id', 'history_row', 'is_reacting',
+                               'dist_head', 'dist_count')
+    _link_fields = ('leader', 'follower', 'active', 'quiet_until', 'quiet_root')
+
+    def __init__(self, time_precision, capacity=16):
+        self.time_precision = time_precision
+        self.size = 0
+        capacity = max(int(capacity), 1)
+        for field in self._float_fields:
+            setattr(self, field, np.zeros(capacity))
+        self.kind = np.zeros(capacity, dtype=np.int8)
+        self.vehicle_id = np.zeros(capacity, dtype=np.int64)
+        self.history_row = np.full(capacity, -1, dtype=np.int64)
+        self.is_reacting = np.zeros(capacity, dtype=bool)
+
+        # Reaction delay: a ring buffer of the distances each car has seen.
+        self.dist_buffer = np.zeros((capacity, 1))
+        self.dist_head = np.zeros(capacity, dtype=np.int64)
+        self.dist_count = np.zeros(capacity, dtype=np.int64)
+
+        # Order of the lane.
+        self.leader = np.full(capacity, -1, dtype=np.int64)
+        self.follower = np.full(capacity, -1, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.quiet_until = np.zeros(capacity, dtype=np.int64) # tick a car is quiet until
+        self.quiet_root = np.zeros(capacity, dtype=np.int64) # first quiet car its proof leans on
+        self.head = -1
+        self.tail = -1
+        self._free = []
+        self.circumference = None
+        self.quiet_horizon = QUIET_HORIZON
+        self.tick = 0
+        self._next_proof = 0
+
+        self.history = None
+        self.stats = NO_STATS
+        self.last_crashes = (np.zeros(0), np.zeros(0), np.zeros(0))
+        self._n_vehicles = 0
+        self._slot_of = {}
+        self._blocks = [] # first vehicle_id, first slot and number of the cars of each add_cars
+        self._order = None
+        self._rank = None
+
+    def __len__(self):
+        ''' Number of cars on the road. '''
+        return self.size - len(self._free)
+
+    def _reserve(self, capacity):
+        ''' Make room for at least `capacity` cars. '''
+        old_capacity = len(self.position)
+        if capacity <= old_capacity:
+            return
+        new_capacity = max(capacity, 2 * old_capacity)
+        for field in self._fields + self._link_fields:
+            old = getattr(self, field)
+            new = np.zeros(new_capacity, dtype=old.dtype)
+            new[:old_capacity] = old
+            setattr(self, field, new)
+        dist_buffer = np.zeros((new_capacity, self.dist_buffer.shape[1]))
+        dist_buffer[:old_capacity] = self.dist_buffer
+        self.dist_buffer = dist_buffer
+
+    def _reserve_reaction(self, reaction_time):
+        ''' Widen the distance ring buffer to hold a car with this reaction time. '''
+        width = int(reaction_time / self.time_precision) + 1
+        old_width = self.dist_buffer.shape[1]
+        if width <= old_width:
+            return
+        # Unroll the rings so every queue starts at column 0 again.
+        dist_buffer = np.zeros((len(self.dist_buffer), width))
+        columns = (self.dist_head[:, None] + np.arange(old_width)) % old_width
+        dist_buffer[:, :old_width] = np.take_along_axis(self.dist_buffer, columns, axis=1)
+        self.dist_buffer = dist_buffer
+        self.dist_head[:] = 0
+
+    def _new_slot(self):
+        ''' A free slot, reusing the slot of a car that left if there is one. '''
+        if self._free:
+            return self._free.pop()
+        self._reserve(self.size + 1)
+        self.size += 1
+        return self.size - 1
+
+    def insert_car(self, follower, car):
+        ''' Put a car object into the lane in front of the car in slot `follower`,
+        or at the back of the lane if `follower` is -1.
+
+        The car's parameters, state and reaction-delay queue are copied over.
+
+        Returns:
+            The ``vehicle_id`` given to the car.
+        '''
+        kind = car_kind(car)
+        self._reserve_reaction(car.reaction_time)
+        slot = self._new_slot()
+
+        for field in self._float_fields:
+            getattr(self, field)[slot] = getattr(car, field)
+        self.kind[slot] = kind
+        self.is_reacting[slot] = car.is_reacting
+        queued = list(car.dist_history or ())
+        self.dist_buffer[slot, :len(queued)] = queued
+        self.dist_head[slot] = 0
+        self.dist_count[slot] = len(queued)
+        self.history_row[slot] = -1 if car.history_row is None else car.history_row
+
+        vehicle_id = self._n_vehicles
+        self._n_vehicles += 1
+        self.vehicle_id[slot] = vehicle_id
+        self._slot_of[vehicle_id] = slot
+
+        leader = self.tail if follower < 0 else self.leader[follower]
+        self.leader[slot] = leader
+        self.follower[slot] = follower
+        if leader < 0:
+            self.head = slot
+        else:
+            self.follower[leader] = slot
+        if follower < 0:
+            self.tail = slot
+        else:
+            self.leader[follower] = slot
+        self.active[slot] = True
+        self.quiet_until[slot] = 0
+        if follower >= 0:
+            self._wake_slots([follower]) # it follows a different car now
+        self._order = None
+        return vehicle_id
+
+    def add_car(self, car):
+        ''' Put a car object at the back of the lane. '''
+        return self.insert_car(-1, car)
+
+    def add_cars(self, kind, **fields):
+        ''' Put many cars at the back of the lane at once, in the given order,
+        without going through car objects.
+
+        Args:
+            kind: Kind of each car
+            fields: Each of the ``_float_fields``, an array with a value per car
+
+        Returns:
+            The ``vehicle_id`` given to each car.
+        '''
+        kind = np.asarray(kind)
+        n = len(kind)
+        if not n:
+            return np.zeros(0, dtype=np.int64)
+        self._reserve_reaction(np.max(fields['reaction_time']))
+        self._reserve(self.size + n)
+        slots = np.arange(self.size, self.size + n)
+        self.size += n
+
+        for field in self._float_fields:
+            getattr(self, field)[slots] = fields[field]
+        self.kind[slots] = kind
+        self.is_reacting[slots] = False
+        self.dist_head[slots] = 0
+        self.dist_count[slots] = 0
+        self.history_row[slots] = -1
+        vehicle_ids = np.arange(self._n_vehicles, self._n_vehicles + n)
+        self._n_vehicles += n
+        self.vehicle_id[slots] = vehicle_ids
+        self._blocks.append((int(vehicle_ids[0]), int(slots[0]), n))
+
+        self.leader[slots[1:]] = slots[:-1]
+        self.leader[slots[0]] = self.tail
+        self.follower[slots[:-1]] = slots[1:]
+        self.follower[slots[-1]] = -1
+        if self.tail < 0:
+            self.head = int(slots[0])
+        else:
+            self.follower[self.tail] = slots[0]
+        self.tail = int(slots[-1])
+        self.active[slots] = True
+        self.quiet_until[slots] = 0
+        self._order = None
+        return vehicle_ids
+
+    def remove_car(self, slot):
+        ''' Take the car in slot `slot` off the road; its slot is reused later. '''
+        leader = self.leader[slot]
+        follower = self.follower[slot]
+        if leader < 0:
+            self.head = follower
+        else:
+            self.follower[leader] = follower
+        if follower < 0:
+            self.tail = leader
+        else:
+            self.leader[follower] = leader
+            if leader >= 0 or self.circumference is not None:
+                self._wake_slots([follower]) # it follows a different car now
+        self.leader[slot] = self.follower[slot] = -1
+        self.active[slot] = False
+        self.velocity[slot] = 0
+        self._slot_of.pop(self.vehicle_id[slot], None)
+        self._free.append(slot)
+        self._order = None
+
+    def slot_of(self, vehicle_id):
+        ''' Slot of a vehicle, -1 once it has left the road. '''
+        slot = self._slot_of.get(vehicle_id)
+        if slot is not None:
+            return slot
+        for first_id, first_slot, n in self._blocks:
+            if first_id <= vehicle_id < first_id + n:
+                # The slot may have gone to another car since.
+                slot = first_slot + vehicle_id - first_id
+                if self.active[slot] and self.vehicle_id[slot] == vehicle_id:
+                    return slot
+                return -1
+        return -1
+
+    def active_slots(self):
+        ''' Slots holding a car. '''
+        if not self._free:
+            return np.arange(self.size)
+        return np.flatnonzero(self.active[:self.size])
+
+    def lane_order(self):
+        ''' Slots of the cars front to back.
+
+        The ranks are worked out from the links by pointer jumping, which takes
+        a logarithmic number of array operations. The order is kept until a
+        car joins or leaves.
+        '''
+        if self._order is None:
+            slots = self.active_slots()
+            link = self.leader[:self.size].copy()
+            rank = np.zeros(self.size, dtype=np.int64)
+            rank[slots] = link[slots] >= 0
+            jumping = slots[link[slots] >= 0]
+            while jumping.size:
+                ahead = link[jumping]
+                rank[jumping] = rank[jumping] + rank[ahead]
+                link[jumping] = link[ahead]
+                jumping = jumping[link[jumping] >= 0]
+            self._order = np.empty(len(slots), dtype=np.int64)
+            self._order[rank[slots]] = slots
+            self._rank = rank
+        return self._order
+
+    def lane_index(self, slot):
+        ''' Place in the queue (0 for the lead car) of the car in slot `slot`. '''
+        self.lane_order()
+        return self._rank[slot]
+
+    def _link(self, order):
+        ''' Relink the lane so the cars in the slots `order` follow each other. '''
+        if not len(order):
+            return
+        self.leader[order[0]] = -1
+        self.leader[order[1:]] = order[:-1]
+        self.follower[order[:-1]] = order[1:]
+        self.follower[order[-1]] = -1
+        self.head = int(order[0])
+        self.tail = int(order[-1])
+        self._order = None
+        self.wake()
+
+    def wake(self):
+        ''' Forget which cars are quiet, after the cars were changed from outside. '''
+        self.quiet_until[:] = 0
+        self._next_proof = self.tick
+
+    def _wake_slots(self, slots):
+        ''' Stop the cars in `slots` being quiet, along with the quiet cars behind
+        them whose proofs lean on them (see `_prove_quiet`).
+
+        Returns:
+            The slots of the cars behind that were woken.
+        '''
+        slots = np.asarray(slots)
+        n = self.size
+        quiet_until = self.quiet_until[:n]
+        slots = slots[quiet_until[slots] > self.tick]
+        quiet_until[slots] = 0
+        if not slots.size:
+            return slots
+        # Along a chain the cars behind are the ones further back.
+        roots, chain = np.unique(self.quiet_root[slots], return_inverse=True)
+        front = np.full(len(roots), -np.inf)
+        np.maximum.at(front, chain, self.position[slots])
+        chain = np.minimum(np.searchsorted(roots, self.quiet_root[:n]), len(roots) - 1)
+        woken = np.flatnonzero((quiet_until > self.tick) & (roots[chain] == self.quiet_root[:n]) &
+                               (self.position[:n] < front[chain]))
+        quiet_until[woken] = 0
+        return woken
+
+    def sort(self):
+        ''' Order the cars front to back, keeping the order of equal positions. '''
+        order = self.lane_order()
+        self._link(order[np.argsort(-self.position[order], kind='stable')])
+
+    def _following_distance(self, index, velocity, lead_velocity, lead_braking_rate,
+                            lead_reaction_time, lead_kind):
+        ''' Distance the AutonomousVehicle and HumanVehicle rules want to the car in front. '''
+        kind = self.kind[index]
+        relative_velocity = velocity - lead_velocity + lead_braking_rate * lead_reaction_time
+        d0 = np.where(kind == KIND_AV, AV_D0, HV_D0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            following_distance = (d0 + relative_velocity * self.reaction_time[index] + \
+                relative_velocity / 2 * (relative_velocity / self.braking_rate[index])) * \
+                self.gap_factor[index]
+        return np.where((kind == KIND_AV) & (lead_kind == KIND_AV),
+                        following_distance * AV_FOLLOWING_FACTOR, following_distance)
+
+    def _can_speed_up(self, index, dist, velocity, lead_velocity, lead_braking_rate,
+                      lead_reaction_time, lead_kind, has_leader):
+        ''' Vectorized `can_speed_up_func` of Car, AutonomousVehicle and HumanVehicle. '''
+        following_distance = self._following_distance(index, velocity, lead_velocity,
+                                                      lead_braking_rate, lead_reaction_time,
+                                                      lead_kind)
+        follows = (dist > 0) & (~has_leader | (dist > following_distance))
+        return np.where(self.kind[index] == KIND_CAR, dist > self.safe_dist[index], follows)
+
+    def _prove_quiet(self, slots):
+        ''' Find which of the cars in `slots` will keep going at their maximum
+        velocity for the next time steps.
+
+        No car ever ends up behind where it is now: it either moves forward or,
+        after a crash, stops right behind the car in front. `step` wakes the
+        car behind any car that does go back, so as long as a car is quiet the
+        car in front of it only goes forward, and its gap, at maximum velocity,
+        shrinks by at most its own ``velocity * time_precision`` each time step.
+        While that gap, and every distance still waiting in its reaction queue,
+        stays above the largest distance its rule could ask for (the car in
+        front going at any velocity), the car keeps speeding up, which keeps it
+        at its maximum velocity. `step` then only has to move it forward.
+
+        Behind a quiet car the proof can lean on that car instead: for as long
+        as it stays quiet it goes at its own steady velocity, so the gap only
+        shrinks by the difference of the two velocities and the rule asks for
+        the distance at that velocity, which is far shorter. A car quiet this
+        way is quiet for no longer than the car in front, and ``quiet_root``
+        keeps the first car of each such chain, so `_wake_slots` can wake the
+        whole chain when a car in it is woken. The chains are worked out for
+        every car at once with running maxima down the lane, and never wrap
+        around a ring.
+
+        Nothing is found quiet while a car overlaps the car in front, as
+        cars then crash into each other and go back.
+
+        The quiet time steps are rounded down to whole ``PROOF_INTERVAL``, so
+        every car stops being quiet on a time step where it is proven again.
+
+        A car merging in between two cars breaks the argument, so `wake` has to
+        be called when the cars are changed from outside.
+        '''
+        dt = self.time_precision
+        tick = self.tick
+        self.quiet_until[slots] = 0
+        if self._overlapping():
+            return
+        slots = slots[self.velocity[slots] == self.max_velocity[slots]] # the only ones that can be
+        position = self.position[slots]
+        velocity = self.velocity[slots]
+        lead = self.leader[slots]
+        has_leader = lead >= 0
+        lead_position = np.where(has_leader, self.position[lead], NO_LEADER_POSITION)
+        leans = has_leader.copy()
+        if self.circumference is not None:
+            at_head = slots == self.head
+            has_leader |= at_head
+            lead = np.where(at_head, self.tail, lead)
+            lead_position = np.where(at_head, self.position[self.tail] + self.circumference,
+                                     lead_position)
+        gap = lead_position - position - self.length[slots]
+
+        # Largest distance the rule could ask for, with the car in front at its
+        # lowest or highest possible velocity, or at its velocity while quiet.
+        lead_velocity = self.velocity[lead]
+        lead_braking_rate = self.braking_rate[lead]
+        lead_reaction_time = self.reaction_time[lead]
+        lead_kind = self.kind[lead]
+        highest_lead_velocity = np.maximum(lead_velocity, self.max_velocity[lead])
+        threshold = np.maximum(
+            self._following_distance(slots, velocity, 0., lead_braking_rate,
+                                     lead_reaction_time, lead_kind),
+            self._following_distance(slots, velocity, highest_lead_velocity,
+                                     lead_braking_rate, lead_reaction_time, lead_kind))
+        leaning_threshold = self._following_distance(slots, velocity, lead_velocity,
+                                                     lead_braking_rate, lead_reaction_time,
+                                                     lead_kind)
+        is_car = self.kind[slots] == KIND_CAR
+        thresholds = []
+        for threshold in (threshold, leaning_threshold):
+            threshold = np.where(has_leader, threshold, 0.)
+            threshold = np.where(is_car, self.safe_dist[slots], threshold)
+            threshold = np.maximum(threshold, 0.)
+            thresholds.append(threshold + 1e-6 + 1e-9 * threshold) # room for rounding
+
+        # Shortest distance waiting in each reaction queue.
+        width = self.dist_buffer.shape[1]
+        count = self.dist_count[slots]
+        queued = np.full(len(slots), np.inf)
+        rows = np.flatnonzero(count)
+        waiting = (np.arange(width) - self.dist_head[slots[rows], None]) % width < count[rows, None]
+        queued[rows] = np.where(waiting, self.dist_buffer[slots[rows]], np.inf).min(axis=1)
+
+        max_velocity = self.max_velocity[slots]
+        faster = velocity + (velocity / -self.acceleration_falloff[slots] +
+                             self.launch_acceleration[slots]) * dt
+        steady = (faster >= max_velocity) & self.is_reacting[slots]
+        # Quiet until, on its own and leaning on the car in front.
+        until = []
+        for threshold, closing in ((thresholds[0], velocity),
+                                   (thresholds[1], velocity - lead_velocity)):
+            distance_per_tick = closing * dt
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ticks = np.where(distance_per_tick > 0,
+                                 np.floor((gap - threshold) / distance_per_tick),
+                                 self.quiet_horizon)
+            ticks = np.where(steady & (queued > threshold) & (gap > threshold),
+                             np.clip(ticks, 0, self.quiet_horizon), 0).astype(np.int64)
+            ticks -= ticks % PROOF_INTERVAL
+            until.append(np.where(ticks > 0, tick + ticks, 0))
+        alone, leaning = until
+
+        # Quiet until = max(alone, min(leaning, quiet until of the car in front)),
+        # down the lane. The times all fall on whole PROOF_INTERVAL from now, so
+        # for each of them a car is quiet that long if it is on its own, or if
+        # it leans on a car that is: the last car quiet on its own is no further
+        # back than the last car that cannot lean.
+        n = self.size
+        order = self.lane_order()
+        low = np.where(self.quiet_until[:n] > tick, self.quiet_until[:n], 0)
+        low[slots] = alone
+        high = np.zeros(n, dtype=np.int64)
+        high[slots] = np.where(leans, leaning, 0)
+        levels = tick + np.arange(PROOF_INTERVAL, self.quiet_horizon + 1, PROOF_INTERVAL)
+        place = np.arange(len(order), dtype=np.int32)
+        on_its_own = low[order] >= levels[:, None]
+        last_on_its_own = np.maximum.accumulate(np.where(on_its_own, place, -1), axis=1)
+        last_alone = np.maximum.accumulate(np.where(high[order] >= levels[:, None], -1, place),
+                                           axis=1)
+        quiet = (last_on_its_own >= last_alone) & (last_on_its_own >= 0)
+        quiet_until = np.zeros(n, dtype=np.int64)
+        n_levels = quiet.sum(axis=0) # a car quiet that long is quiet any shorter too
+        quiet_until[order] = np.where(n_levels > 0, tick + n_levels * PROOF_INTERVAL, 0)
+        self.quiet_until[slots] = quiet_until[slots]
+
+        # Every car leaning on the one in front shares the root of its chain.
+        leaning = np.zeros(n, dtype=bool)
+        leaning[slots] = quiet_until[slots] > alone
+        root = self.quiet_root[:n].copy()
+        root[slots] = slots
+        root_place = np.maximum.accumulate(np.where(leaning[order], -1, place))
+        self.quiet_root[order] = root[order[root_place]]
+
+    def _overlapping(self):
+        ''' Whether any car overlaps the car in front of it. '''
+        slots = self.active_slots()
+        lead = self.leader[slots]
+        has_leader = lead >= 0
+        lead_position = self.position[np.where(has_leader, lead, slots)]
+        if self.circumference is not None and self.head >= 0:
+            at_head = slots == self.head
+            has_leader |= at_head
+            lead_position = np.where(at_head, self.position[self.tail] + self.circumference,
+                                     lead_position)
+        gap = lead_position - self.position[slots] - self.length[slots]
+        return bool((gap[has_leader] < 0).any())
+
+    def _advance(self, index, lead_position, lead_velocity, lead_braking_rate,
+                 lead_reaction_time, lead_kind, has_leader, ghost):
+        ''' New state of the cars at `index` given the new state of the cars ahead.
+
+        Nothing is written, so this can be called again if the cars ahead change.
+        '''
+        dt = self.time_precision
+        position = self.position[index]
+        velocity = self.velocity[index]
+        length = self.length[index]
+
+        dist = lead_position - position - length
+        count = self.dist_count[index]
+        is_reacting = self.is_reacting[index] | (count + 1 > self.reaction_time[index] / dt)
+        delayed_dist = np.where(count == 0, dist,
+                                self.dist_buffer[index, self.dist_head[index]])
+
+        blocked = dist < 0
+        crashed = blocked & ~ghost & (velocity != 0)
+        decides = ~blocked & is_reacting
+        speed_up = self._can_speed_up(index, delayed_dist, velocity, lead_velocity,
+                                      lead_braking_rate, lead_reaction_time,
+                                      lead_kind, has_leader)
+
+        faster = velocity + (velocity / -self.acceleration_falloff[index] +
+                             self.launch_acceleration[index]) * dt
+        faster = np.where(faster > self.max_velocity[index], self.max_velocity[index], faster)
+        slower = velocity - self.braking_rate[index] * dt
+        slower = np.where(slower < 0, 0.0, slower)
+
+        new_velocity = np.where(decides, np.where(speed_up, faster, slower), velocity)
+        new_velocity = np.where(crashed, 0.0, new_velocity)
+        new_position = np.where(crashed, lead_position - length, position)
+        new_position = new_position + new_velocity * dt
+        return new_position, new_velocity, dist, is_reacting, blocked | decides, crashed
+
+    def _prove_if_due(self):
+        ''' Look for quiet cars once every ``PROOF_INTERVAL`` time steps: all of
+        them again once some ran out of quiet time steps, so that they keep
+        running out together, otherwise only the ones that are not quiet. '''
+        if self.quiet_horizon and self.tick >= self._next_proof:
+            slots = self.active_slots()
+            quiet_until = self.quiet_until[slots]
+            if not (quiet_until > 0).any() or ((quiet_until > 0) & (quiet_until <= self.tick)).any():
+                self._prove_quiet(slots)
+            else:
+                self._prove_quiet(slots[quiet_until <= self.tick])
+            self._next_proof = self.tick + PROOF_INTERVAL
+            self.stats.lap('quiet')
+
+    def _follow(self, index, tick, position, velocity, new_position, new_velocity, ghost=None):
+        ''' Work out the cars at `index`, then again the ones behind a car whose
+        outcome differed from the guess, until nothing changes.
+
+        Args:
+            index: Slots of the cars to work out first
+            tick (`int`): Time step being taken, the cars quiet then are skipped
+            position: Position of every car before the time step
+            velocity: Velocity of every car before the time step
+            new_position: Guess of the position of every car after the time
+                step, the outcomes are written into it
+            new_velocity: Same for the velocities
+            ghost: For the cars following a ghost, see `step`: whether each car
+                does, and the braking rate, reaction time and kind of its ghost
+
+        Returns:
+            For every car the distance it saw, the velocity of the car in front
+            it saw, whether it reacts, whether it pops its reaction queue and
+            whether it crashed.
+        '''
+        n = self.size
+        stats = self.stats
+        quiet_until = self.quiet_until[:n]
+        leader = self.leader[:n]
+        follower = self.follower[:n]
+        ring = self.circumference is not None and self.head >= 0
+        if ring:
+            ring_head, ring_tail = self.head, self.tail
+            ring_position = position[ring_tail] + self.circumference
+            ring_velocity = velocity[ring_tail]
+        dist = np.zeros(n)
+        seen_lead_velocity = np.zeros(n)
+        is_reacting = np.zeros(n, dtype=bool)
+        pops = np.zeros(n, dtype=bool)
+        crashed = np.zeros(n, dtype=bool)
+        went_back = []
+
+        while index.size:
+            lead = leader[index]
+            has_leader = lead >= 0
+            lead_braking_rate = self.braking_rate[lead]
+            lead_reaction_time = self.reaction_time[lead]
+            lead_kind = self.kind[lead]
+            lead_position = np.where(has_leader, new_position[lead], NO_LEADER_POSITION)
+            lead_velocity = np.where(has_leader, new_velocity[lead], 0.0)
+            if ring:
+                at_head = index == ring_head
+                has_leader = has_leader | at_head
+                lead_braking_rate = np.where(at_head, self.braking_rate[ring_tail],
+                                             lead_braking_rate)
+                lead_reaction_time = np.where(at_head, self.reaction_time[ring_tail],
+                                              lead_reaction_time)
+                lead_kind = np.where(at_head, self.kind[ring_tail], lead_kind)
+                lead_position = np.where(at_head, ring_position, lead_position)
+                lead_velocity = np.where(at_head, ring_velocity, lead_velocity)
+            is_ghost = False
+            if ghost is not None:
+                is_ghost, ghost_braking_rate, ghost_reaction_time, ghost_kind = ghost
+                is_ghost = is_ghost[index]
+                lead_braking_rate = np.where(is_ghost, ghost_braking_rate[index], lead_braking_rate)
+                lead_reaction_time = np.where(is_ghost, ghost_reaction_time[index],
+                                              lead_reaction_time)
+                lead_kind = np.where(is_ghost, ghost_kind[index], lead_kind)
+                lead_position = np.where(is_ghost, position[index] +
+                                         (lead_position - position[index]) * 0.5,
+                                         lead_position)
+                lead_velocity = np.where(is_ghost, lead_velocity * 0.9, lead_velocity)
+            stats.lap('gap')
+
+            car_position, car_velocity, dist[index], is_reacting[index], pops[index], \
+                crashed[index] = self._advance(index, lead_position, lead_velocity,
+                                               lead_braking_rate, lead_reaction_time,
+                                               lead_kind, has_leader, is_ghost)
+            stats.lap('advance')
+            stats.count('policy_evaluations', index.size)
+            changed = (car_position != new_position[index]) | (car_velocity != new_velocity[index])
+            went_back.append(index[car_position < position[index]])
+            new_position[index] = car_position
+            new_velocity[index] = car_velocity
+            seen_lead_velocity[index] = lead_velocity
+            index = follower[index[changed]]
+            index = index[index >= 0]
+            index = index[quiet_until[index] <= tick]
+            if not index.size:
+                # Only where a car ends up counts: the proof of a quiet car
+                # behind a car that went back no longer holds.
+                went_back = np.concatenate(went_back)
+                went_back = went_back[new_position[went_back] < position[went_back]]
+                woken = follower[went_back]
+                if ring:
+                    woken = np.where(went_back == ring_tail, ring_head, woken)
+                woken = woken[(woken >= 0) & (quiet_until[np.maximum(woken, 0)] > tick)]
+                went_back = []
+                if woken.size:
+                    index = np.union1d(woken, self._wake_slots(woken))
+        stats.lap('gap')
+        return dist, seen_lead_velocity, is_reacting, pops, crashed
+
+    def _push_queues(self, moving, dist, pops, is_reacting):
+        ''' Push the distances the cars at `moving` saw into their reaction
+        queues and pop the ones they used. '''
+        width = self.dist_buffer.shape[1]
+        head = self.dist_head[moving]
+        count = self.dist_count[moving]
+        self.dist_buffer[moving, (head + count) % width] = dist[moving]
+        self.dist_head[moving] = np.where(pops[moving], (head + 1) % width, head)
+        self.dist_count[moving] = count + 1 - pops[moving]
+        self.is_reacting[moving] = is_reacting[moving]
+
+    def step(self, ghost_index=None, ghost_car=None):
+        ''' Move every car by one time step.
+
+        Each car reacts to the already moved car in front of it, exactly like
+        the front-to-back loop of `Road.update_car_positions`. The whole
+        platoon is first moved assuming nobody changes speed; then only the
+        cars behind a car whose outcome differed are worked out again, until
+        nothing changes. The result is the same as the sequential loop.
+
+        Args:
+            ghost_index: slot (or array of slots) of cars that follow a car
+                about to merge in front of them instead of the real car
+                ahead. The merging car sits halfway between the two; where it
+                ends up is left in ``ghost_position`` and ``ghost_velocity``.
+            ghost_car: the merging car object, or a list of them (one per
+                ghost), only their parameters are used.
+
+        Returns:
+            Slots of the cars that crashed.
+        '''
+        n = self.size
+        dt = self.time_precision
+        stats = self.stats
+        tick = self.tick
+        slots = self.active_slots()
+        quiet_until = self.quiet_until[:n]
+        self._prove_if_due()
+        ghost = None
+        if ghost_index is not None:
+            # Only the cars following a ghost see something else in front.
+            ghost_index = np.atleast_1d(ghost_index)
+            self._wake_slots(ghost_index)
+            ghost_cars = ghost_car if isinstance(ghost_car, (list, tuple)) \
+                else [ghost_car] * len(ghost_index)
+            ghost = (np.zeros(n, dtype=bool), np.zeros(n), np.zeros(n), np.zeros(n, dtype=np.int8))
+            ghost[0][ghost_index] = True
+            ghost[1][ghost_index] = [car.braking_rate for car in ghost_cars]
+            ghost[2][ghost_index] = [car.reaction_time for car in ghost_cars]
+            ghost[3][ghost_index] = [car_kind(car) for car in ghost_cars]
+
+        # First guess: every car keeps its velocity.
+        position = self.position[:n]
+        velocity = self.velocity[:n]
+        new_position = position + velocity * dt
+        new_velocity = velocity.copy()
+        dist, seen_lead_velocity, is_reacting, pops, crashed = self._follow(
+            slots[quiet_until[slots] <= tick], tick, position, velocity, new_position,
+            new_velocity, ghost)
+
+        quiet = quiet_until > tick
+        self._push_queues(slots[~quiet[slots]], dist, pops, is_reacting)
+
+        # Quiet cars always pop; only the ones with a queue need the distance.
+        queued = slots[quiet[slots]]
+        queued = queued[self.dist_count[queued] > 0]
+        if queued.size:
+            width = self.dist_buffer.shape[1]
+            lead = self.leader[queued]
+            lead_position = np.where(lead >= 0, new_position[lead], NO_LEADER_POSITION)
+            if self.circumference is not None:
+                lead_position = np.where(queued == self.head,
+                                         position[self.tail] + self.circumference, lead_position)
+            head = self.dist_head[queued]
+            self.dist_buffer[queued, (head + self.dist_count[queued]) % width] = \
+                lead_position - position[queued] - self.length[queued]
+            self.dist_head[queued] = (head + 1) % width
+
+        if ghost_index is not None:
+            lead = self.leader[ghost_index]
+            self.ghost_velocity = new_velocity[lead] * 0.9
+            self.ghost_position = position[ghost_index] + \
+                (new_position[lead] - position[ghost_index]) * 0.5
+
+        crashed = np.flatnonzero(crashed)
+        self.last_crashes = (dist[crashed], velocity[crashed], seen_lead_velocity[crashed])
+        position[:] = new_position
+        velocity[:] = new_velocity
+        stats.lap('queue')
+        if self.history is not None:
+            self.history.positions[self.history_row[slots], self.history.column] = new_position[slots]
+            if self.history.velocities is not None:
+                self.history.velocities[self.history_row[slots], self.history.column] = new_velocity[slots]
+            self.history.crashes[self.history.column] += len(crashed)
+            stats.lap('history')
+        self.tick += 1
+        return crashed
+
+    def quiet_ticks(self):
+        ''' Time steps the quiet cars are all sure to stay quiet for, 0 if no
+        car is quiet, see `cruise`. '''
+        self._prove_if_due()
+        slots = self.active_slots()
+        if not slots.size:
+            return self.quiet_horizon
+        quiet_until = self.quiet_until[slots]
+        quiet = quiet_until > self.tick
+        if not quiet.any():
+            return 0
+        n_ticks = int(quiet_until[quiet].min()) - self.tick
+        if not quiet.all():
+            # The others may be found quiet on the next proof.
+            n_ticks = min(n_ticks, self._next_proof - self.tick)
+        return n_ticks
+
+    def ticks_to_reach(self, position, n_ticks):
+        ''' Time steps out of the next `n_ticks` `cruise` can take before the
+        lead car reaches `position`, counting the one that may get it there. '''
+        if self.head < 0:
+            return n_ticks
+        # It never goes faster than now or than its maximum velocity.
+        velocity = max(self.velocity[self.head], self.max_velocity[self.head])
+        steps = np.full(n_ticks + 1, velocity * self.time_precision)
+        steps[0] = self.position[self.head]
+        reached = np.flatnonzero(np.add.accumulate(steps)[1:] >= position)
+        return int(reached[0]) + 1 if reached.size else n_ticks
+
+    def cruise(self, n_ticks):
+        ''' Take up to `n_ticks` time steps at once, when the quiet cars stay
+        quiet for that long (see `quiet_ticks`).
+
+        Only the cars that are not quiet are worked out, one time step after
+        another as in `step`; the quiet ones just keep going, their positions
+        being added up time step after time step exactly like `step` does,
+        only for every car at once, so the trajectories stay the same to the
+        last bit. Their reaction queues get the distances of the last time
+        steps only, the earlier ones being popped anyway, and the history of
+        every car is written at the end. A crash ends the cruise before its
+        time step, which is then left to `step`. The history is moved on by
+        the time steps taken.
+
+        Returns:
+            The number of time steps taken.
+        '''
+        n = self.size
+        dt = self.time_precision
+        tick = self.tick
+        slots = self.active_slots()
+        quiet_until = self.quiet_until[:n]
+        quiet = slots[quiet_until[slots] > tick]
+        moving = slots[quiet_until[slots] <= tick]
+
+        # One row per time step, each added to the one before like `step` does.
+        trajectory = np.empty((n_ticks + 1, n))
+        trajectory[0] = self.position[:n]
+        distance = self.velocity[:n] * dt
+        for step in range(n_ticks):
+            np.add(trajectory[step], distance, out=trajectory[step + 1])
+
+        # The others one time step after another, only among themselves.
+        velocities = np.empty((n_ticks + 1, len(moving)))
+        velocities[0] = self.velocity[moving]
+        for step in range(n_ticks if moving.size else 0):
+            velocity = self.velocity[:n]
+            new_velocity = velocity.copy()
+            dist, _, is_reacting, pops, crashed = self._follow(
+                moving, tick + step, trajectory[step], velocity, trajectory[step + 1],
+                new_velocity)
+            if crashed.any():
+                n_ticks = step
+                break
+            self.position[moving] = trajectory[step + 1, moving]
+            velocity[moving] = velocities[step + 1] = new_velocity[moving]
+            self._push_queues(moving, dist, pops, is_reacting)
+
+        queued = quiet[self.dist_count[quiet] > 0]
+        if queued.size and n_ticks:
+            ring = self.circumference is not None and self.head >= 0
+            width = self.dist_buffer.shape[1]
+            lead = self.leader[queued]
+            head = self.dist_head[queued]
+            count = self.dist_count[queued]
+            length = self.length[queued]
+            for step in range(max(n_ticks - width, 0), n_ticks):
+                lead_position = np.where(lead >= 0, trajectory[step + 1, lead], NO_LEADER_POSITION)
+                if ring:
+                    lead_position = np.where(queued == self.head, trajectory[step, self.tail] +
+                                             self.circumference, lead_position)
+                self.dist_buffer[queued, (head + step + count) % width] = \
+                    lead_position - trajectory[step, queued] - length
+            self.dist_head[queued] = (head + n_ticks) % width
+
+        if self.history is not None and n_ticks:
+            # Every column keeps the last time step going into it.
+            columns = []
+            for _ in range(n_ticks):
+                self.history.advance()
+                columns.append(self.history.column)
+            columns = np.array(columns)
+            last = np.flatnonzero(np.append(columns[1:] != columns[:-1], True))
+            recorded = slice(columns[0], columns[-1] + 1)
+            rows = self.history_row[slots]
+            if len(slots) == n:
+                slots = slice(0, n) # every slot holds a car
+            self.history.positions[rows, recorded] = trajectory[last + 1][:, slots].T
+            if self.history.velocities is not None:
+                velocity = np.empty((len(last), n))
+                velocity[:] = self.velocity[:n]
+                velocity[:, moving] = velocities[last + 1]
+                self.history.velocities[rows, recorded] = velocity[:, slots].T
+
+        self.position[quiet] = trajectory[n_ticks, quiet]
+        self.last_crashes = (np.zeros(0), np.zeros(0), np.zeros(0))
+        self.tick += n_ticks
+        if self._next_proof < self.tick:
+            # Keep to the time steps the quiet cars stop being quiet on.
+            late = self.tick - self._next_proof
+            self._next_proof += -(-late // PROOF_INTERVAL) * PROOF_INTERVAL
+        return n_ticks
+
+    def attach_history(self, history):
+        ''' Record the positions of the cars into `history`.
+
+        Cars without a row yet are given one, in queue order.
+        '''
+        self.history = history
+        order = self.lane_order()
+        new = order[self.history_row[order] == -1]
+        if new.size:
+            self.history_row[new] = history.add_rows(self.position[new], velocities=self.velocity[new])
+
+    def handle(self, slot):
+        ''' A `VehicleHandle` for the car in slot `slot`. '''
+        return VehicleHandle(self, int(self.vehicle_id[slot]))
+
+
+class VehicleHandle:
+    '''Car-like view of one car in a `Platoon`, so code that pokes at
+    ``road.car_list[i]`` keeps working with the vectorized engine.
+
+    Args:
+        platoon (`Platoon`): The platoon holding the car
+        vehicle_id (`int`): Which car
+    '''
+    __slots__ = ('platoon', 'vehicle_id')
+
+    def __init__(self, platoon, vehicle_id):
+        self.platoon = platoon
+        self.vehicle_id = vehicle_id
+
+    @property
+    def slot(self):
+        ''' Slot of the car in the platoon, -1 once it has left the road. '''
+        return self.platoon.slot_of(self.vehicle_id)
+
+    def __eq__(self, other):
+        return isinstance(other, VehicleHandle) and other.platoon is self.platoon \
+            and other.vehicle_id == self.vehicle_id
+
+    def __hash__(self):
+        return hash((id(self.platoon), self.vehicle_id))
+
+    def _field(name):
+        def get(self):
+            return getattr(self.platoon, name)[self.slot].item()
+
+        def set(self, value):
+            getattr(self.platoon, name)[self.slot] = value
+            self.platoon.wake()
+
+        return property(get, set)
+
+    position = _field('position')
+    velocity = _field('velocity')
+    braking_rate = _field('braking_rate')
+    acceleration_rate = _field('acceleration_rate')
+    max_velocity = _field('max_velocity')
+    length = _field('length')
+    safe_dist = _field('safe_dist')
+    reaction_time = _field('reaction_time')
+    launch_acceleration = _field('launch_acceleration')
+    acceleration_falloff = _field('acceleration_falloff')
+    gap_factor = _field('gap_factor')
+    is_reacting = _field('is_reacting')
+    del _field
+
+    def return_position_array(self):
+        ''' History of the positions of this car. '''
+        row = self.platoon.history_row[self.slot]
+        return self.platoon.history.get_row(row)
@@ -1,56 +1,105 @@
 #!/usr/bin/env python
 
 import sys
+from collections import deque
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 import matplotlib.animation as animation
+from matplotlib.collections import LineCollection, PolyCollection
 from road import Road
+from history_file import open_history
 
-def plot(positions_data, crashes_data):
+# Most points of each trajectory drawn in the time-space panel; longer runs
+# are thinned out, as the panel has fewer pixel rows than that anyway.
+MAX_TRAJECTORY_POINTS = 2000
+
+def plot(positions_data, crashes_data, velocities_data=None, x_range=None, time_precision=None):
     '''Given the position-history table, plot the time evolution of the car positions.
-    
-    Args:
-        data: A pandas data table of the distance (x) positions of the cars. Each row
-             represents a different car, and each column is a time point in the simulation.
+
+    The trajectories are drawn once, in full, and covered up to the current
+    frame; the cars and velocity bars are one collection each, moved with
+    array operations. Every frame then only redraws these few artists
+    (blitting), so it costs the same however far into the run it is.
+
+    Takes the arguments of `plot_frames`.
 
     Returns:
         position_plot: A plot of the car positions (y-axis) with time (x-axis)
             with each car on a new line
     '''
+    fig, draw_frame = plot_frames(positions_data, crashes_data, velocities_data, x_range,
+                                  time_precision)
+    nTime = np.shape(positions_data)[1]
+
+    # Call the animator.  blit=True means only re-draw the parts that have changed.
+    anim = animation.FuncAnimation(fig, draw_frame, init_func=lambda: draw_frame(0),
+                                   frames=range(nTime), interval=1, blit=True, repeat=True)
+
+    return anim
+
+def plot_frames(positions_data, crashes_data, velocities_data=None, x_range=None,
+                time_precision=None):
+    '''The figure of `plot` and the function drawing each of its frames,
+    without animating them, see `FrameRenderer`.
+
+    Args:
+        data: A pandas data table (or array, which may be memory mapped) of the distance
+             (x) positions of the cars. Each row represents a different car, and each
+             column is a time point in the simulation.
+        crashes_data: The total number of crashes at each time point.
+        velocities_data: Velocities of the cars in the same layout as the positions,
+             worked out from the positions of each frame and the one before if
+             not given (0 at the first frame).
+        x_range: (min, max) distance to show, found from the positions if not given.
+        time_precision: Seconds between two time points, to work out the
+             velocities, that of a `Road` if not given.
+
+    Returns:
+        The figure, and the function drawing frame ``i`` that returns the
+        artists it changed.
+    '''
+
+    # Convert data to np.array
+    positions_data = np.asarray(positions_data)
+    crashes_data = np.asarray(crashes_data).reshape(-1)
 
     # Number of cars and time points
     nCars, nTime = positions_data.shape
 
     # Max and min distances in table
-    max_x = max(positions_data.max())
-    min_x = min(positions_data.min())
+    if x_range is None:
+        x_range = (positions_data.min(), positions_data.max())
+    min_x, max_x = x_range
 
-    # Convert data to np.array
-    positions_data = positions_data.values
-    crashes_data = crashes_data.values
+    if velocities_data is None and time_precision is None:
+        time_precision = Road().time_precision
 
     # Colours for cars
     colours = cm.rainbow(np.linspace(0, 1, nCars))
 
     # Colors the merging car differently.
-    for i in range(nCars):
-        if positions_data[i][0] < 0:
-            colours[i] = [1.00000000e+00, 1.22464680e-16, 6.12323400e-17, 1.00000000e+00]
+    colours[positions_data[:, 0] < 0] = cm.rainbow(1.)
         
     # Set up the figure
     fig = plt.figure()
     
-    # Subplot axes1: distance/time lines
+    # Subplot axes1: distance/time lines, drawn once and uncovered frame by frame
     axes1 = fig.add_subplot(311, ylim=(0, nTime), xlim=(min_x, max_x))
     axes1.set_xlabel("Distance (m)")
     axes1.set_ylabel("Time (per 0.2 second)")
-    # Lines list
-    lines = []
-    for index in range(nCars):
-        lobj = axes1.plot([], [], lw=2, color=colours[index])[0]
-        lines.append(lobj)
+    stride = -(-nTime // MAX_TRAJECTORY_POINTS)
+    times = np.arange(0, nTime, stride)
+    if times[-1] != nTime - 1:
+        times = np.append(times, nTime - 1)
+    segments = np.empty((nCars, len(times), 2))
+    segments[:, :, 0] = positions_data[:, times]
+    segments[:, :, 1] = times
+    axes1.add_collection(LineCollection(segments, lw=2, colors=colours))
+    curtain = axes1.add_patch(plt.Rectangle((min_x, 0), max_x - min_x, nTime, lw=0,
+                                            color=axes1.get_facecolor(), zorder=3,
+                                            animated=True))
 
     # Subplot axes2: car symbols
     axes2 = fig.add_subplot(313, ylim=(-0.2, 2.2), xlim=(min_x, max_x))
@@ -60,13 +109,14 @@ def plot(positions_data, crashes_data):
     axes2.plot([min_x, max_x], [0, 0], lw=2, color="grey")
     axes2.plot([min_x, max_x], [1, 1], lw=2, color="grey")
     
-    crash_count_text = axes2.text(0, 0, 'Crashes: -1')
+    crash_count_text = axes2.text(0, 0, 'Crashes: -1', animated=True)
     
-    # Cars list
-    cars = []
-    for index in range(nCars):
-        cobj = axes2.add_patch(plt.Rectangle((0, 0.2), width=max_x/200, height = 0.6, color=colours[index]))
-        cars.append(cobj)
+    # Cars, as one collection of rectangles
+    car_width = max_x/200
+    car_verts = np.empty((nCars, 4, 2))
+    car_verts[:, :, 1] = [0.2, 0.2, 0.8, 0.8]
+    cars = axes2.add_collection(PolyCollection([], facecolors=colours, edgecolors=colours,
+                                               animated=True))
     # Car shape
     carShapes = []
     obj = axes2.add_patch(plt.Rectangle((0, 1.2), width=max_x/20, height = 0.2, color="red"))
@@ -79,78 +129,307 @@ def plot(positions_data, crashes_data):
     carShapes.append(obj)
     obj = axes2.add_patch(plt.Rectangle((max_x/35, 1.4), width=max_x/125, height = 0.18, color="white"))
     carShapes.append(obj)
+    shape_starts = [shape.get_x() for shape in carShapes]
+    for shape in carShapes:
+        shape.set_animated(True)
 
-    # Subplot axes3: velocity change lines
+    # Subplot axes3: velocity change lines, as one collection of bars
     axes3 = fig.add_subplot(312, ylim=(-10, 30), xlim=(0, nCars))
     axes3.set_xlabel("Car Number (each color represents a different car)")
     axes3.set_ylabel("Velocity (m/s)")
     axes3.plot([0, nCars], [0, 0], lw=1, color="black")
-    # VLines list
-    vlines = []
-    for index in range(nCars):
-        vobj = axes3.add_patch(plt.Rectangle((0, -10), width=1, height = 10, color=colours[index]))
-        vlines.append(vobj)
-    # vlines = []
-    # for index in range(nCars):
-    #     vobj = axes3.plot([], [], lw=2, color=colours[index])[0]
-    #     vlines.append(vobj)
-
-    # Initialization function: plot the background of each frame
-    # def init():
-    #     for line in lines:
-    #         line.set_data([],[])    
-
-    #     for car in cars:
-    #         car.set_x(0)
-
-    #     for vline in vlines:
-    #         vline.set_height(10)
-
-    #     for shape in carShapes:
-    #         shape.get_bbox()
-        
-    #     return lines, cars, vlines, carShapes
+    bar_verts = np.empty((nCars, 4, 2))
+    bar_verts[:, :, 0] = np.arange(nCars)[:, None] + [0, 1, 1, 0]
+    bar_verts[:, :2, 1] = -10
+    vlines = axes3.add_collection(PolyCollection([], facecolors=colours, edgecolors=colours,
+                                                 animated=True))
+
+    artists = [curtain, cars, vlines, crash_count_text] + carShapes
 
     # Animation function: This is called sequentially
     def animate(i):
-        for lnum,line in enumerate(lines):
-            x = positions_data[lnum, :i]
-            y = range(i)
-            line.set_data(x, y)
-            
-        for lnum,car in enumerate(cars):
-            x = positions_data[lnum, i]
-            car.set_x(x)
-
-        for lnum,vline in enumerate(vlines):
-            a = np.append([0], positions_data[lnum, ])
-            h = (a[i+1] - a[i]) / Road().time_precision
-            if (h < 10):
-                h = 10
-            x = lnum
-            vline.set_x(x)
-            vline.set_height(h)
-        
-        for lnum,shape in enumerate(carShapes):
-            x = shape.get_x() + max_x/nTime
-            shape.set_x(x)
+        curtain.set_y(i)
+        curtain.set_height(nTime - i)
+
+        x = np.asarray(positions_data[:, i], dtype=float)
+        car_verts[:, :, 0] = x[:, None] + [0, car_width, car_width, 0]
+        cars.set_verts(car_verts)
+
+        if velocities_data is not None:
+            v = np.asarray(velocities_data[:, i], dtype=float)
+        elif i > 0:
+            # Only the two time points drawn are read, even from a memory map.
+            v = (x - np.asarray(positions_data[:, i - 1], dtype=float)) / time_precision
+        else:
+            v = np.zeros(nCars)
+        h = np.maximum(v, 10)
+        bar_verts[:, 2:, 1] = (h - 10)[:, None]
+        vlines.set_verts(bar_verts)
+
+        for shape, start in zip(carShapes, shape_starts):
+            shape.set_x(start + (i + 1) * max_x/nTime)
         
-        crash_count_text.set_text('Crashes: ' + str(crashes_data[i, 0]))
+        crash_count_text.set_text('Crashes: ' + str(crashes_data[i]))
 
-        return lines, cars, vlines, carShapes, crash_count_text
+        return artists
 
-    # Call the animator.  blit=True means only re-draw the parts that have changed.
-    anim = animation.FuncAnimation(fig, animate, #init_func=init,
-                                   frames=range(nTime), interval=1, blit=False, repeat=True)
+    return fig, animate
+
+class FrameRenderer:
+    '''Draws the frames of an animation made by `plot` into memory, for
+    writing videos without a screen.
+
+    Everything that does not move is drawn once; each frame then restores
+    that background and draws the moving artists over it, as blitting does
+    on screen.
+
+    Args:
+        figure: The figure returned by `plot_frames`, with the Agg backend
+        draw_frame: The function drawing each frame returned with it
+
+    Attributes:
+        size (`tuple`): Width and height of the frames in pixels
+    '''
+
+    def __init__(self, figure, draw_frame):
+        self.figure = figure
+        self.draw_frame = draw_frame
+        canvas = self.figure.canvas
+        canvas.draw() # leaves out the animated artists
+        self.background = canvas.copy_from_bbox(self.figure.bbox)
+        self.size = canvas.get_width_height()
+
+    def render(self, i):
+        ''' The RGBA pixels of frame `i`, as bytes. '''
+        canvas = self.figure.canvas
+        canvas.restore_region(self.background)
+        for artist in self.draw_frame(i):
+            self.figure.draw_artist(artist)
+        return bytes(canvas.buffer_rgba())
+
+def plot_history_file(history):
+    ''' Plot a `history_file.HistoryFile`, reading only the frames that are drawn. '''
+    return plot(history.positions, history.crashes, history.velocities,
+                x_range=(history.min_position, history.max_position))
+
+def history_file_frames(history):
+    ''' `plot_frames` of a `history_file.HistoryFile`, for a `FrameRenderer`. '''
+    return plot_frames(history.positions, history.crashes, history.velocities,
+                       x_range=(history.min_position, history.max_position))
 
+def plot_live(feed, x_range, n_cars=None, window=300, interval=40):
+    '''`plot` of a simulation while it runs, drawing the snapshots of a `live.LiveFeed`.
+
+    Every frame takes the newest snapshot waiting and skips the older ones,
+    so the drawing keeps up with the simulation however slow it is. Only the
+    last `window` snapshots drawn are kept, for the time-space panel, which
+    shows them by how many time steps ago they were.
+
+    Args:
+        feed: `live.LiveFeed` of the run, see `live.start_live`
+        x_range: (min, max) distance to show
+        n_cars: Number of velocity bars, the number of cars in the first
+            snapshot if not given
+        window (`int`): Snapshots shown in the time-space panel
+        interval: Milliseconds between two frames
+
+    Returns:
+        The animation, which stops once the run is over.
+    '''
+    first = feed.latest()
+    if first is None:
+        raise ValueError('The run ended before a snapshot came through')
+    if n_cars is None:
+        n_cars = max(len(first.positions), 1)
+    min_x, max_x = x_range
+    colours = cm.rainbow(np.linspace(0, 1, n_cars))
+    trail = deque(maxlen=window) # time index and positions of the snapshots drawn
+
+    fig = plt.figure()
+
+    # Subplot axes1: the last snapshots, newest at the top
+    axes1 = fig.add_subplot(311, ylim=(-window, 1), xlim=(min_x, max_x))
+    axes1.set_xlabel("Distance (m)")
+    axes1.set_ylabel("Time steps ago")
+    points = axes1.scatter([], [], s=1, animated=True)
+
+    # Subplot axes2: cars
+    axes2 = fig.add_subplot(313, ylim=(-0.2, 2.2), xlim=(min_x, max_x))
+    axes2.set_axis_off()
+    axes2.plot([min_x, max_x], [0, 0], lw=2, color="grey")
+    axes2.plot([min_x, max_x], [1, 1], lw=2, color="grey")
+    crash_count_text = axes2.text(min_x, 1.5, 'Crashes: -1', animated=True)
+    car_width = max_x/200
+    cars = axes2.add_collection(PolyCollection([], animated=True))
+
+    # Subplot axes3: velocities of the first n_cars cars
+    axes3 = fig.add_subplot(312, ylim=(-10, 30), xlim=(0, n_cars))
+    axes3.set_xlabel("Car Number (front to back)")
+    axes3.set_ylabel("Velocity (m/s)")
+    axes3.plot([0, n_cars], [0, 0], lw=1, color="black")
+    vlines = axes3.add_collection(PolyCollection([], animated=True))
+
+    artists = [points, cars, vlines, crash_count_text]
+
+    def car_colours(n):
+        return colours[np.minimum(np.arange(n), n_cars - 1)]
+
+    def animate(snapshot):
+        if not trail or trail[-1][0] != snapshot.time_index:
+            trail.append((snapshot.time_index, snapshot.positions))
+        x = np.concatenate([positions for _, positions in trail])
+        ago = np.concatenate([np.full(len(positions), time_index - snapshot.time_index)
+                              for time_index, positions in trail])
+        points.set_offsets(np.column_stack([x, ago]))
+        points.set_color(np.concatenate([car_colours(len(positions)) for _, positions in trail]))
+
+        n = len(snapshot.positions)
+        car_verts = np.empty((n, 4, 2))
+        car_verts[:, :, 0] = snapshot.positions[:, None] + [0, car_width, car_width, 0]
+        car_verts[:, :, 1] = [0.2, 0.2, 0.8, 0.8]
+        cars.set_verts(car_verts)
+        cars.set_color(car_colours(n))
+
+        shown = min(n, n_cars)
+        bar_verts = np.empty((shown, 4, 2))
+        bar_verts[:, :, 0] = np.arange(shown)[:, None] + [0, 1, 1, 0]
+        bar_verts[:, :2, 1] = -10
+        bar_verts[:, 2:, 1] = (np.maximum(snapshot.velocities[:shown], 10) - 10)[:, None]
+        vlines.set_verts(bar_verts)
+        vlines.set_color(colours[:shown])
+
+        crash_count_text.set_text('Crashes: {}  Dropped: {}  Skipped: {}'.format(
+            snapshot.crash_count, snapshot.dropped, feed.skipped))
+        return artists
+
+    def snapshots():
+        # The newest snapshot at every frame, the last one again while none came.
+        snapshot = first
+        while True:
+            yield snapshot
+            if feed.finished:
+                return
+            snapshot = feed.latest(timeout=0) or snapshot
+
+    anim = animation.FuncAnimation(fig, animate, init_func=lambda: animate(first),
+                                   frames=snapshots, interval=interval, blit=True,
+                                   repeat=False, cache_frame_data=False)
     return anim
 
+def space_time_grid(positions_data, velocities_data=None, time_precision=None,
+                    shape=(400, 600), x_range=None, chunk_size=512):
+    '''Bin a position history into a (time x space) grid of the density and
+    mean velocity of the cars.
+
+    The history is read a chunk of time points at a time, so a memory mapped
+    history (see `history_file.HistoryFile`) is streamed from disk, and the
+    cost grows with the size of the history and of the grid, never with the
+    number of cars drawn.
+
+    Args:
+        positions_data: (cars x time points) positions, may be memory mapped
+        velocities_data: Velocities in the same layout, worked out from the
+            positions if not given
+        time_precision: Seconds between two time points, that of a `Road` if not given
+        shape: Number of (time, space) cells of the grid
+        x_range: (min, max) distance covered by the grid, from 0 to the
+            furthest position if not given; positions outside are left out,
+            which leaves out the cars not on the road yet
+        chunk_size (`int`): Time points read at once
+
+    Returns:
+        density: Cars per km in each cell, averaged over its time points
+        velocity: Mean velocity of the cars in each cell, NaN where there are none
+        time_edges: Edges of the time cells in seconds
+        space_edges: Edges of the space cells in metres
+    '''
+    n_cars, n_time = positions_data.shape
+    n_time_bins, n_space_bins = shape
+    if time_precision is None:
+        time_precision = Road().time_precision
+    if x_range is None:
+        max_x = -np.inf
+        for start in range(0, n_time, chunk_size):
+            max_x = max(max_x, np.nanmax(positions_data[:, start:start + chunk_size]))
+        x_range = (0., max_x)
+    min_x, max_x = x_range
+    cell_width = (max_x - min_x) / n_space_bins
+
+    counts = np.zeros(n_time_bins * n_space_bins)
+    moving_counts = np.zeros(n_time_bins * n_space_bins)
+    velocity_sums = np.zeros(n_time_bins * n_space_bins)
+    previous = np.full((n_cars, 1), np.nan) # no velocity at the first time point
+    for start in range(0, n_time, chunk_size):
+        end = min(start + chunk_size, n_time)
+        chunk = np.asarray(positions_data[:, start:end], dtype=float)
+        before = np.concatenate([previous, chunk[:, :-1]], axis=1)
+        previous = chunk[:, -1:]
+        if velocities_data is not None:
+            velocities = np.asarray(velocities_data[:, start:end], dtype=float)
+        else:
+            velocities = (chunk - before) / time_precision
+
+        on_road = (chunk >= min_x) & (chunk <= max_x)
+        # A car that was not on the road a time point before jumped there.
+        moving = on_road & (before >= min_x) & (before <= max_x)
+        time_bins = np.arange(start, end) * n_time_bins // n_time
+        space_bins = ((chunk - min_x) / cell_width).astype(np.int64, copy=False) \
+            if cell_width > 0 else np.zeros(chunk.shape, dtype=np.int64)
+        cells = time_bins[None, :] * n_space_bins + np.minimum(space_bins, n_space_bins - 1)
+        counts += np.bincount(cells[on_road], minlength=counts.size)
+        moving_counts += np.bincount(cells[moving], minlength=counts.size)
+        velocity_sums += np.bincount(cells[moving], weights=velocities[moving],
+                                     minlength=counts.size)
+
+    time_points = np.bincount(np.arange(n_time) * n_time_bins // n_time, minlength=n_time_bins)
+    time_edges = np.arange(n_time_bins + 1) * n_time / n_time_bins
+    density = counts.reshape(shape) / (np.maximum(time_points, 1)[:, None] * cell_width) * 1000
+    with np.errstate(divide='ignore', invalid='ignore'):
+        velocity = (velocity_sums / moving_counts).reshape(shape)
+    return density, velocity, time_edges * time_precision, \
+        min_x + np.arange(n_space_bins + 1) * cell_width
+
+def plot_space_time(positions_data, velocities_data=None, time_precision=None,
+                    shape=(400, 600), x_range=None, max_velocity=26.8):
+    '''Plot the density and velocity of the cars against time and distance,
+    from `space_time_grid`. Stop-and-go waves show up as stripes of slow
+    traffic running back along the road, however many cars there are.
+
+    Returns:
+        The figure.
+    '''
+    density, velocity, time_edges, space_edges = space_time_grid(
+        positions_data, velocities_data, time_precision, shape, x_range)
+    extent = (space_edges[0], space_edges[-1], time_edges[0], time_edges[-1])
+
+    fig, (density_axes, velocity_axes) = plt.subplots(1, 2, sharey=True, figsize=(12, 5))
+    image = density_axes.imshow(density, origin='lower', aspect='auto', extent=extent,
+                                cmap='viridis', interpolation='nearest')
+    fig.colorbar(image, ax=density_axes, label='Density (cars/km)')
+    density_axes.set_xlabel("Distance (m)")
+    density_axes.set_ylabel("Time (s)")
+    image = velocity_axes.imshow(velocity, origin='lower', aspect='auto', extent=extent,
+                                 cmap='RdYlGn', vmin=0, vmax=max_velocity, interpolation='nearest')
+    fig.colorbar(image, ax=velocity_axes, label='Velocity (m/s)')
+    velocity_axes.set_xlabel("Distance (m)")
+    return fig
+
+def plot_history_file_space_time(history, shape=(400, 600)):
+    ''' `plot_space_time` of a `history_file.HistoryFile`, streamed from disk. '''
+    return plot_space_time(history.positions, history.velocities, history.time_precision,
+                           shape, x_range=(max(history.min_position, 0.), history.max_position))
+
 ## Main code
 if __name__ == "__main__":
+    # A space-time heatmap rather than the animation, for runs with many cars
+    heatmap = "--heatmap" in sys.argv
+    if heatmap:
+        sys.argv.remove("--heatmap")
+
     if len(sys.argv) <= 1 :
         exit("No input file given to arguments")
 
-    # Data file name from args
+    # Data file name from args: a binary history file (.tjh) or the name of a pair of csv files
     starting_space = sys.argv[1]
     history_positions_file = "../data/mix/history_positions_" + starting_space + ".csv"
     history_crashes_file = "../data/mix/history_crashes_" + starting_space + ".csv"
@@ -161,12 +440,26 @@ if __name__ == "__main__":
     if len(sys.argv) >= 3:
         save_file = sys.argv[2]
 
-    # Read in data from given cvs file
-    positions_data = pd.read_csv(history_positions_file, header=0, index_col=0)
-    crashes_data = pd.read_csv(history_crashes_file, header=0, index_col=0)
+    if heatmap:
+        if starting_space.endswith('.tjh'):
+            fig = plot_history_file_space_time(open_history(starting_space))
+        else:
+            fig = plot_space_time(pd.read_csv(history_positions_file, header=0, index_col=0).values)
+        if (len(save_file) > 0):
+            fig.savefig(save_file)
+        else:
+            plt.show()
+        exit()
+
+    if starting_space.endswith('.tjh'):
+        anim = plot_history_file(open_history(starting_space))
+    else:
+        # Read in data from given cvs file
+        positions_data = pd.read_csv(history_positions_file, header=0, index_col=0)
+        crashes_data = pd.read_csv(history_crashes_file, header=0, index_col=0)
 
-    # Create animation with data table values
-    anim = plot(positions_data, crashes_data)
+        # Create animation with data table values
+        anim = plot(positions_data, crashes_data)
     
     # Show animation plot
     # anim.save('../media/animation.gif', writer='imagemagick', fps=60)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+import functools
+import time
+
+''' Where the time of a simulation run goes, see `Road.profile`. '''
+
+COUNTERS = ('ticks', 'car_updates', 'policy_evaluations', 'merges', 'crashes')
+
+class RunStats:
+    '''Wall time per phase and event counts of one `Road.run_simulation`.
+
+    The run is cut into consecutive phases with `lap`, so the phases add up
+    to the time of the run. With the object engine they are
+
+    - ``cars``: moving the cars, `Car.update_position` without the rule
+      deciding whether to speed up; the gaps, the reaction-delay queues and
+      the merging car waiting in front of its follower
+    - ``policy``: the `car.Car.policy` or ``can_speed_up_func`` of the cars
+
+    and with the vectorized engine
+
+    - ``merge``: the ramp schedules, merging cars in and picking the next car
+      to make room
+    - ``quiet``: finding the quiet cars, see `platoon.Platoon._prove_quiet`
+    - ``cruise``: taking many time steps at once while cars are quiet, see
+      `platoon.Platoon.cruise`
+    - ``gap``: gathering the state of the car in front of each car
+    - ``advance``: deciding and moving, `platoon.Platoon._advance`
+    - ``queue``: the reaction-delay queues
+
+    and for both
+
+    - ``history``: starting a new time point and writing the positions
+    - ``detectors``: the loop detectors
+    - ``ends``: cars leaving and entering an open road
+    - ``live``: publishing the cars to a `live.LiveFeed`
+
+    Attributes:
+        seconds (`dict`): Wall time of each phase
+        calls (`dict`): Number of times each phase ran
+        total_seconds (`float`): Wall time of the run
+        ticks (`int`): Time steps taken
+        car_updates (`int`): Cars moved, added up over the time steps
+        policy_evaluations (`int`): Speed-up decisions worked out. The object
+            engine counts the calls of the rules of the cars; the vectorized
+            engine counts every car it evaluates, which skips quiet cars but
+            includes cars evaluated again within a time step.
+        merges (`int`): Cars merged in
+        crashes (`int`): Potential crashes
+    '''
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self.total_seconds = 0.
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self._watched = []
+        self._start = self._last = time.perf_counter()
+
+    def lap(self, phase):
+        ''' Put the time since the last lap down to `phase`. '''
+        now = time.perf_counter()
+        self.seconds[phase] = self.seconds.get(phase, 0.) + now - self._last
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        self._last = now
+
+    def count(self, counter, n=1):
+        ''' Add `n` to one of the ``COUNTERS``. '''
+        setattr(self, counter, getattr(self, counter) + n)
+
+    def watch(self, car):
+        ''' Time and count the ``can_speed_up_func`` or `car.Car.policy` of a
+        car object under ``policy`` until `finish`. '''
+        own_rule = rule = car.can_speed_up_func
+        if getattr(rule, 'stats', None) is self:
+            return
+        if rule is None:
+            if car.policy is None:
+                return
+            rule = functools.partial(car.policy.can_speed_up, car)
+
+        def timed_rule(dist, next_car):
+            start = time.perf_counter()
+            speed_up = rule(dist, next_car)
+            seconds = time.perf_counter() - start
+            self.seconds['policy'] = self.seconds.get('policy', 0.) + seconds
+            self.calls['policy'] = self.calls.get('policy', 0) + 1
+            self.policy_evaluations += 1
+            self._last += seconds # not part of the phase around it
+            return speed_up
+
+        timed_rule.stats = self
+        car.can_speed_up_func = timed_rule
+        self._watched.append((car, own_rule))
+
+    def finish(self):
+        ''' Stop the clock and give the cars back their own rule. '''
+        self.total_seconds = time.perf_counter() - self._start
+        for car, rule in self._watched:
+            car.can_speed_up_func = rule
+        self._watched = []
+
+    def as_dict(self):
+        ''' The counters and times as one flat dictionary, to log next to the results. '''
+        stats = {name: getattr(self, name) for name in COUNTERS}
+        stats['total_seconds'] = self.total_seconds
+        for phase, seconds in self.seconds.items():
+            stats[phase + '_seconds'] = seconds
+            stats[phase + '_calls'] = self.calls[phase]
+        return stats
+
+    def report(self):
+        ''' The phases from the slowest, and the counters, as text. '''
+        total = self.total_seconds or 1.
+        lines = ['{:<10} {:>9.4f} s {:>6.1%} {:>10} calls'.format(
+                     phase, seconds, seconds / total, self.calls[phase])
+                 for phase, seconds in sorted(self.seconds.items(), key=lambda item: -item[1])]
+        lines.append('{:<10} {:>9.4f} s'.format('total', self.total_seconds))
+        lines += ['{}: {}'.format(name, getattr(self, name)) for name in COUNTERS]
+        return '\n'.join(lines)
+
+
+class NullStats:
+    ''' Stands in for `RunStats` when the run is not profiled, doing nothing. '''
+
+    def lap(self, phase):
+        pass
+
+    def count(self, counter, n=1):
+        pass
+
+    def watch(self, car):
+        pass
+
+    def finish(self):
+        pass
+
+NO_STATS = NullStats()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+import numpy as np
+from car import AutonomousVehicle
+
+''' On-ramps where cars merge into the road on their own schedule. '''
+
+NO_COUNTDOWN = -999
+
+def to_ticks(seconds, time_precision):
+    ''' Number of time steps closest to `seconds`, comparing time steps as
+    integers rather than seconds as floats, which rarely divide exactly. '''
+    return int(round(seconds / time_precision))
+
+def interval_ticks(interval, time_precision):
+    ''' Time steps between two events `interval` seconds apart, 0 for none. '''
+    return max(to_ticks(interval, time_precision), 1) if interval > 0 else 0
+
+class OnRamp:
+    '''A merge point on the road, see `Road.add_on_ramp`.
+
+    Every `merge_interval` seconds (starting at `offset`) the ramp picks the
+    car about to pass `position`; a new car then sits halfway in front of it
+    for `preparation_time` seconds, so it can make room, before merging in.
+    Each ramp keeps its own schedule and its own pending merge, so any
+    number of ramps can run on the same road.
+
+    Args:
+        position (`float`): Where the cars merge in
+        merge_interval (`float`): Seconds between two merging cars, 0 for none
+        preparation_time (`float`): Time allowed for the car behind to prepare
+            for the merging car
+        offset (`float`): Seconds before the first merge
+        car_class: Class of the merging cars
+        time_precision (`float`): Seconds of a time step of the road; the
+            schedule is kept in whole time steps, the closest to the seconds given
+
+    Attributes:
+        car_getting_merged_in_front: The car making room, None if no merge is pending
+        merging_car: The car waiting to merge in front of it
+        merge_count (`int`): Number of cars merged in so far
+    '''
+
+    def __init__(self, position, merge_interval, preparation_time=0.4, offset=0,
+                 car_class=AutonomousVehicle, time_precision=0.2):
+        self.position = position
+        self.time_precision = time_precision
+        self.merge_interval = merge_interval
+        self.preparation_time = preparation_time
+        self.offset = offset
+        self.car_class = car_class
+        self.countdown = NO_COUNTDOWN
+        self.car_getting_merged_in_front = None
+        self.merging_car = None
+        self.merge_count = 0
+
+    @property
+    def merge_interval(self):
+        return self._merge_interval
+
+    @merge_interval.setter
+    def merge_interval(self, merge_interval):
+        self._merge_interval = merge_interval
+        self.merge_ticks = interval_ticks(merge_interval, self.time_precision)
+
+    @property
+    def offset(self):
+        return self._offset
+
+    @offset.setter
+    def offset(self, offset):
+        self._offset = offset
+        self.offset_ticks = to_ticks(offset, self.time_precision)
+
+    def ticks_to_prepare(self, time_index):
+        ''' Time steps from `time_index` until the next car gets ready for a merge. '''
+        if not self.merge_ticks:
+            return np.inf
+        if time_index <= self.offset_ticks:
+            return self.offset_ticks - time_index
+        return -(time_index - self.offset_ticks) % self.merge_ticks
+
+    def tick(self, time_index):
+        ''' Move the schedule on to `time_index`.
+
+        Returns:
+            ``'prepare'`` when a car should get ready for a merge,
+            ``'commence'`` when the pending car merges in, None otherwise.
+        '''
+        phase = None
+        if self.merge_ticks and time_index >= self.offset_ticks and \
+                (time_index - self.offset_ticks) % self.merge_ticks == 0:
+            self.countdown = to_ticks(self.preparation_time, self.time_precision)
+            phase = 'prepare'
+        elif self.countdown == 0:
+            self.countdown = NO_COUNTDOWN
+            phase = 'commence'
+        if self.countdown != NO_COUNTDOWN:
+            self.countdown -= 1
+        return phase
@@ -1,54 +1,372 @@
 #!/usr/bin/env python
+import copy
+from collections import deque
 from car import Car
 import numpy as np
-from car import AutonomousVehicle
+from car import AutonomousVehicle, HumanVehicle
+from platoon import Platoon, KIND_NAMES, car_kind
+from history import HistoryBuffer
+from ramp import OnRamp, NO_COUNTDOWN, interval_ticks
+from detector import LoopDetector
+from profiling import RunStats, NO_STATS
+from events import EventLog, CRASH, PREPARE_MERGE, COMMENCE_MERGE, ENTER, EXIT
 
 '''  '''
 
-class Road:
-    ''' Handler for the running of the code. '''
+CAR_PARAMETERS = ('braking_rate', 'acceleration_rate', 'max_velocity', 'length',
+                  'safe_dist', 'reaction_time', 'launch_acceleration', 'acceleration_falloff',
+                  'gap_factor')
+
+def sample_AV_types(n_cars, AV_percentage, seed=None):
+    ''' Pick ``int(AV_percentage * n_cars)`` of `n_cars` cars to be autonomous,
+    with a NumPy generator seeded with `seed`, in time linear in `n_cars`.
 
-    def __init__(self):
-        self.car_list = []
+    Returns:
+        The type of each car for `Road.from_arrays`: 1 for an
+        `AutonomousVehicle`, 0 for a `HumanVehicle`.
+    '''
+    if not 0 <= AV_percentage <= 1:
+        raise ValueError('The AV percentage must be between 0 and 1, not ' + str(AV_percentage))
+    types = np.zeros(n_cars, dtype=np.int8)
+    types[np.random.default_rng(seed).permutation(n_cars)[:int(AV_percentage * n_cars)]] = 1
+    return types
+
+class Road:
+    ''' Handler for the running of the code.
+
+    Args:
+        engine (`str`): ``'object'`` moves one `Car` object at a time,
+            ``'vectorized'`` keeps the cars in a `platoon.Platoon` and moves
+            them all at once with NumPy. Both give the same numbers.
+        circumference (`float`): Makes the road a ring of this length. The
+            lead car then follows the last car, a lap ahead, instead of an
+            empty road. The cars keep counting the distance they travelled,
+            but the positions in the history are wrapped to
+            ``[0, circumference)``. The cars must start within one lap.
+        length (`float`): Makes the road open at both ends. Cars past
+            `length` leave the road and new cars come in at position 0 from
+            the arrival process given to `set_inflow`. The cars that left
+            are kept in a pool and reused, and so are their history rows, so
+            the work and memory only depend on how many cars are on the road.
+
+    Attributes:
+        detectors (`list`): The `detector.LoopDetector` added with `add_detector`
+        potential_crash_count (`int`): Potential crashes so far, kept up to
+            date without going through the history
+        entered_count (`int`): Cars that came in at the entrance of an open road
+        exited_count (`int`): Cars that left at the end of an open road
+        profile (`bool`): Time the phases of every run and count the events,
+            off by default since it slows the object engine down
+        stats (`profiling.RunStats`): The times and counts of the last run
+            when profiling, None otherwise
+        events (`events.EventLog`): The crashes and merges so far, and the
+            cars entering and leaving an open road if its ``min_severity``
+            is lowered to ``events.DEBUG``
+    '''
+
+    engines = ('object', 'vectorized')
+
+    def __init__(self, engine='object', circumference=None, length=None):
+        if engine not in self.engines:
+            raise ValueError('Unknown engine ' + str(engine) + ', use one of ' + str(self.engines))
+        if circumference is not None and circumference <= 0:
+            raise ValueError('The circumference must be positive, not ' + str(circumference))
+        if length is not None and length <= 0:
+            raise ValueError('The length must be positive, not ' + str(length))
+        if circumference is not None and length is not None:
+            raise ValueError('A ring road has no ends, give either circumference or length')
+        self.engine = engine
+        self.circumference = circumference
+        self.length = length
+        self._car_list = []
         self.position_update_count = None
         self.car_getting_merged_in_front = None
         self.time_precision = 0.2 # cars and reactions are updated every this second amount.
         self.preparation_time = 0.4 # time allowed for the car behind to prepare for the merging car.
+        self.platoon = Platoon(self.time_precision) if engine == 'vectorized' else None
+        if self.platoon is not None:
+            self.platoon.circumference = circumference
+        self.history = HistoryBuffer()
+        self.on_ramps = []
+        self.merge_ramp = None # the ramp driven by the merge arguments of run_simulation
+
+        self.detectors = []
+        self.potential_crash_count = 0
+        self.events = EventLog()
+        self.profile = False
+        self.stats = None
+        self._stats = NO_STATS # where the phases are put down during a run
+        self._live_feed = None # where the cars are published during a run
+
+        # Open road.
+        self.inflow = None
+        self.entry_gap = None
+        self.entry_velocity = None
+        self.entrance_queue = deque() # classes of the cars waiting to get on the road
+        self.entered_count = 0
+        self.exited_count = 0
+        self._car_pool = {} # cars that left, by class
+        self._free_rows = [] # history rows of cars that left
+        self._row_classes = {} # class of the last car in each of those rows
+
+    @property
+    def car_list(self):
+        ''' The cars on the road, front to back once the simulation has started.
+
+        With the vectorized engine these are `platoon.VehicleHandle` views.
+        '''
+        if self.platoon is not None:
+            return [self.platoon.handle(slot) for slot in self.platoon.lane_order()]
+        return self._car_list
+
+    def run_simulation(self, total_timesteps, merge_position=None, merge_interval=0,
+                       history_sink=None, recording=None, live_feed=None):
+        ''' Run the simulation for `total_timesteps` seconds.
+
+        The ramps added with `add_on_ramp` merge cars in on their own
+        schedules, counted from the start of the run.
 
-    def run_simulation(self, total_timesteps, merge_position=None, merge_interval=0):
+        Args:
+            total_timesteps: seconds to simulate
+            merge_position: where a car merges in, if any
+            merge_interval: seconds between two merging cars, 0 for no merging
+            history_sink: `history.HistorySink` to stream the history to. Every
+                ``history_sink.flush_interval`` time steps the history is written
+                out and dropped from memory, so memory stays the same however
+                long the simulation runs. Everything is written when the run ends.
+                Its time precision should be `history_time_precision`.
+            recording: `history.RecordingPolicy` deciding which cars, time
+                steps and fields the history keeps from this run on; by default
+                the policy of the last run, at first every car at every time
+                step. The cars already in the history keep their rows.
+            live_feed: `live.LiveFeed` the cars on the road are published to
+                after every time step, to watch the run while it goes.
+        '''
+        if self.circumference is not None and (merge_interval > 0 or self.on_ramps):
+            raise ValueError('Cars cannot merge into a ring road')
+        if recording is not None:
+            if history_sink is not None and 'velocities' in recording.fields:
+                raise ValueError('The velocities cannot be streamed to a history sink')
+            self.history.set_policy(recording)
 
         # Sort the cars by position
-        getPosition = lambda x: x.position
-        self.car_list.sort(key=getPosition, reverse=True)
-        
+        if self.platoon is not None:
+            self.platoon.sort()
+        else:
+            getPosition = lambda x: x.position
+            self.car_list.sort(key=getPosition, reverse=True)
+        self.attach_history()
+        self._wrap_history()
+        if self.platoon is not None:
+            ramps = [self._get_merge_ramp(merge_position, merge_interval)] + self.on_ramps
+
         merge_preparation_countdown = -999
+        merge_ticks = interval_ticks(merge_interval, self.time_precision)
         self.position_update_count = int(total_timesteps / self.time_precision) + 1
-        for time_index in range(self.position_update_count - 1):
-            if merge_interval <= 0:
-                self.update_car_positions()
-                continue
-
-            # Prepares to merge.
-            if time_index * self.time_precision % merge_interval == 0:
-                merge_preparation_countdown = round(self.preparation_time / self.time_precision)
-                self.update_car_positions(merge_position_prepare_to_merge=merge_position, merging=False)
-                print('prepares to merge')
-
-            # Commences merging since preparation is over.
-            elif merge_preparation_countdown == 0:
-                self.update_car_positions(merge_position_prepare_to_merge=None, merging=True)
-                merge_preparation_countdown = -999
-                print('commence merging')
+        if history_sink is None:
+            self.history.reserve(n_columns=self.history.n_columns +
+                                 self.history.columns_for(self.position_update_count - 1))
+        else:
+            self.history.reserve(n_columns=history_sink.flush_interval + 1)
+        stats = RunStats() if self.profile else NO_STATS
+        self._start_stats(stats)
+        self._live_feed = live_feed
+        try:
+            cruise_until = 0
+            for time_index in range(self.position_update_count - 1):
+                if time_index < cruise_until:
+                    continue # taken by `cruise_platoon`
+                if history_sink is not None and self.history.column >= history_sink.flush_interval:
+                    self.history.flush(history_sink)
+                if self.platoon is not None:
+                    n_ticks = self._quiet_ticks(time_index, ramps, history_sink)
+                    if n_ticks > 1:
+                        n_ticks = self.cruise_platoon(n_ticks)
+                        if n_ticks:
+                            cruise_until = time_index + n_ticks
+                            continue
+                self.history.advance()
+                stats.lap('history')
+                if self.platoon is not None:
+                    phases = [(ramp, ramp.tick(time_index)) for ramp in ramps]
+                    stats.lap('merge')
+                    self.update_platoon_positions(
+                        prepare=[ramp for ramp, phase in phases if phase == 'prepare'],
+                        commence=[ramp for ramp, phase in phases if phase == 'commence'])
+                    continue
+
+                if merge_interval <= 0:
+                    self.update_car_positions()
+                    continue
+
+                # Prepares to merge.
+                if time_index % merge_ticks == 0:
+                    merge_preparation_countdown = round(self.preparation_time / self.time_precision)
+                    self.update_car_positions(merge_position_prepare_to_merge=merge_position, merging=False)
+
+                # Commences merging since preparation is over.
+                elif merge_preparation_countdown == 0:
+                    self.update_car_positions(merge_position_prepare_to_merge=None, merging=True)
+                    merge_preparation_countdown = -999
         
-            else:
-                self.update_car_positions()
+                else:
+                    self.update_car_positions()
+
+                # print('merge_preparation_countdown', merge_preparation_countdown)
+                assert merge_preparation_countdown == -999 or merge_preparation_countdown >= 0
+                if merge_preparation_countdown != -999:
+                    merge_preparation_countdown -= 1
+
+            if history_sink is not None:
+                self.history.flush(history_sink, include_current=True)
+                stats.lap('history')
+        finally:
+            self._finish_stats()
+            self._live_feed = None
+
+    def _start_stats(self, stats):
+        ''' Put down the phases of the run starting now into `stats`. '''
+        self._stats = stats
+        self._crash_count_before = self.potential_crash_count
+        if self.platoon is not None:
+            self.platoon.stats = stats
+        for car in self._car_list:
+            stats.watch(car)
+
+    def _finish_stats(self):
+        stats = self._stats
+        stats.count('crashes', self.potential_crash_count - self._crash_count_before)
+        stats.finish()
+        self.stats = stats if self.profile else None
+        self._stats = NO_STATS
+        if self.platoon is not None:
+            self.platoon.stats = NO_STATS
+
+    def _log_crash(self, car):
+        ''' Note down the crash a car object just had. '''
+        self.events.record(self.history.time_index, car.history_row, CRASH, *car.last_crash)
+        self.potential_crash_count += 1
+
+    def _get_merge_ramp(self, merge_position, merge_interval):
+        ''' The ramp following the merge arguments of `run_simulation`, whose
+        schedule starts again with every run. '''
+        if self.merge_ramp is None:
+            self.merge_ramp = OnRamp(merge_position, merge_interval, self.preparation_time,
+                                     time_precision=self.time_precision)
+        self.merge_ramp.position = merge_position
+        self.merge_ramp.merge_interval = merge_interval
+        self.merge_ramp.countdown = NO_COUNTDOWN
+        return self.merge_ramp
+
+    def add_on_ramp(self, position, merge_interval, offset=0, car_class=AutonomousVehicle):
+        ''' Add a ramp where a car merges in every `merge_interval` seconds.
+
+        Any number of ramps can be added, each merging on its own schedule.
+        Only the vectorized engine supports them.
 
-            # print('merge_preparation_countdown', merge_preparation_countdown)
-            assert merge_preparation_countdown == -999 or merge_preparation_countdown >= 0
-            if merge_preparation_countdown != -999:
-                merge_preparation_countdown -= 1
+        Args:
+            position: where the cars merge in
+            merge_interval: seconds between two merging cars
+            offset: seconds before the first merge
+            car_class: class of the merging cars
 
-                
+        Returns:
+            The new `ramp.OnRamp`.
+        '''
+        if self.platoon is None:
+            raise ValueError('On-ramps need the vectorized engine')
+        if self.circumference is not None:
+            raise ValueError('Cars cannot merge into a ring road')
+        ramp = OnRamp(position, merge_interval, self.preparation_time, offset, car_class,
+                      self.time_precision)
+        self.on_ramps.append(ramp)
+        return ramp
+
+
+    def add_detector(self, position, interval=60):
+        ''' Add a loop detector measuring flow, speed, occupancy and density
+        at `position` while the simulation runs.
+
+        Args:
+            position: where the detector is
+            interval: seconds aggregated into each point of its time series
+
+        Returns:
+            The new `detector.LoopDetector`.
+        '''
+        detector = LoopDetector(position, interval)
+        self.detectors.append(detector)
+        return detector
+
+    def _update_detectors(self, old_positions, positions, velocities, lengths):
+        for detector in self.detectors:
+            detector.update(old_positions, positions, velocities, lengths,
+                            self.time_precision, self.circumference)
+
+    @classmethod
+    def from_arrays(cls, positions, velocities=0., types=None,
+                    classes=(HumanVehicle, AutonomousVehicle), parameters=None, **road_kwargs):
+        ''' A road with many cars on it, built from arrays in one go rather
+        than one `add_car` at a time. The cars join in the order given, as
+        with `add_car`.
+
+        With the vectorized engine the arrays are copied straight into the
+        `platoon.Platoon`, without making a car object per car, so a million
+        cars take a fraction of a second.
+
+        Args:
+            positions: Starting position of each car
+            velocities: Starting velocity of each car, or one for all of them
+            types: Index into `classes` of the class of each car, the first
+                class for all of them if None; see `sample_AV_types`
+            classes: The car classes `types` refers to
+            parameters: Dictionary from some of ``CAR_PARAMETERS`` to a value
+                per car, or one for all of them, in place of the defaults of
+                their classes
+            road_kwargs: Passed on to `Road`, such as ``engine``
+
+        Returns:
+            The new `Road`.
+        '''
+        road = cls(**road_kwargs)
+        positions = np.asarray(positions, dtype=float).reshape(-1)
+        n = len(positions)
+        velocities = np.broadcast_to(np.asarray(velocities, dtype=float), (n,))
+        types = np.zeros(n, dtype=np.int64) if types is None else \
+            np.asarray(types).reshape(-1).astype(np.int64)
+        if len(types) != n:
+            raise ValueError('Got ' + str(len(types)) + ' types for ' + str(n) + ' cars')
+        if n and (types.min() < 0 or types.max() >= len(classes)):
+            raise ValueError('The types must index the ' + str(len(classes)) + ' classes')
+        parameters = dict(parameters or {})
+        unknown = set(parameters) - set(CAR_PARAMETERS)
+        if unknown:
+            raise ValueError('Unknown car parameters ' + str(sorted(unknown)) +
+                             ', use some of ' + str(CAR_PARAMETERS))
+
+        # The defaults of each class, from one car of the class.
+        prototypes = [car_class(0, 0, road.time_precision) for car_class in classes]
+        for name in CAR_PARAMETERS:
+            if name not in parameters:
+                defaults = np.array([getattr(car, name) for car in prototypes], dtype=float)
+                parameters[name] = defaults[types]
+            else:
+                parameters[name] = np.broadcast_to(np.asarray(parameters[name], dtype=float), (n,))
+
+        if road.platoon is not None:
+            kinds = np.array([car_kind(car) for car in prototypes], dtype=np.int8)
+            road.platoon.add_cars(kinds[types], position=positions, velocity=velocities,
+                                  **parameters)
+            return road
+
+        values = [parameters[name].tolist() for name in CAR_PARAMETERS]
+        for i, (car_class, position, velocity) in enumerate(zip(
+                [classes[t] for t in types.tolist()], positions.tolist(), velocities.tolist())):
+            car = car_class(position, velocity, road.time_precision)
+            for name, value in zip(CAR_PARAMETERS, values):
+                setattr(car, name, value[i])
+            road._car_list.append(car)
+        return road
 
     def add_multiple_cars(self, starting_positions, starting_velocity,
                           car_class=None, **car_kwargs):
@@ -89,12 +407,33 @@ class Road:
             car_class = Car
 
         newCar = car_class(starting_position, starting_velocity, self.time_precision, **car_kwargs)
-        self.car_list.append(newCar)
+        if self.platoon is not None:
+            self.platoon.add_car(newCar)
+        else:
+            self.car_list.append(newCar)
 
 
     def update_car_positions(self, merge_position_prepare_to_merge=None, merging=False):
         ''' Move all the cars at the given time step. '''
+        if self.platoon is not None:
+            ramp = self.merge_ramp
+            if merge_position_prepare_to_merge or ramp is None:
+                ramp = self._get_merge_ramp(merge_position_prepare_to_merge, 0)
+            return self.update_platoon_positions(
+                prepare=[ramp] if merge_position_prepare_to_merge else [],
+                commence=[ramp] if merging else [])
+
+        if self.detectors:
+            old_positions = {car: car.position for car in self.car_list}
+            if merging and self.car_getting_merged_in_front is not None:
+                old_positions[self.merging_car] = self.merging_car.position
+
+        stats = self._stats
         car_ahead = None
+        if self.circumference is not None and self.car_list:
+            # On a ring the lead car follows the last car, which has not moved yet, a lap ahead.
+            car_ahead = copy.copy(self.car_list[-1])
+            car_ahead.position += self.circumference
         num_car = 0
         l = len(self.car_list)
         while num_car < l:
@@ -106,10 +445,14 @@ class Road:
                     
                     self.car_getting_merged_in_front = None
                     # Merge a new autonomous vehicle in following the speed of the car ahead.
+                    self.merging_car.attach_history(self.history, self.history.previous_column)
                     self.car_list.insert(num_car, self.merging_car)
+                    self.events.record(self.history.time_index, self.merging_car.history_row,
+                                       COMMENCE_MERGE, velocity=self.merging_car.velocity)
+                    stats.count('merges')
                     l += 1
                     if self.merging_car.update_position(car_ahead):#      car m carahead
-                        print('crash at', num_car)
+                        self._log_crash(self.merging_car)
                     # print('merging---')
                     # print('merge ahead car', car_ahead.position, car_ahead.velocity)
                     car_ahead = self.car_list[num_car] # which is the newly merged car.
@@ -127,7 +470,7 @@ class Road:
                         (car_ahead.position - car.position) * 0.5 # self.merge_dist_ratio
                     
                     if car.update_position(self.merging_car, ghost=True):#, debug=True)
-                        print('crash at', num_car)
+                        self._log_crash(car)
 
 
                     # print('updating merge car as well---') 
@@ -147,6 +490,7 @@ class Road:
                 # TODO make the merging vehicle either AV or HV based on the AV_percentage.
                 self.merging_car = AutonomousVehicle(merge_position_prepare_to_merge, \
                     car_ahead.velocity * 0.9, self.time_precision)
+                stats.watch(self.merging_car)
                 self.car_getting_merged_in_front = car
                 # self.merge_dist_ratio = (merge_position_prepare_to_merge - car.position) / \
                 #     (car_ahead.position - car.position)
@@ -155,10 +499,286 @@ class Road:
 
 
             if car.update_position(car_ahead):
-                print('crash at', num_car)
+                self._log_crash(car)
 
             car_ahead = car
             num_car += 1
+        if merge_position_prepare_to_merge and self.car_getting_merged_in_front is not None:
+            # The last car picked is the one making room.
+            self.events.record(self.history.time_index, self.car_getting_merged_in_front.history_row,
+                               PREPARE_MERGE, velocity=self.merging_car.velocity)
+        stats.lap('cars')
+        stats.count('ticks')
+        stats.count('car_updates', l)
+        if self.detectors:
+            cars = self.car_list
+            self._update_detectors(np.array([old_positions[car] for car in cars]),
+                                   np.array([car.position for car in cars]),
+                                   np.array([car.velocity for car in cars]),
+                                   np.array([car.length for car in cars]))
+            stats.lap('detectors')
+        self._wrap_history()
+        stats.lap('history')
+        self._update_ends()
+        stats.lap('ends')
+        if self._live_feed is not None:
+            self._live_feed.publish(self)
+            stats.lap('live')
+
+    def update_platoon_positions(self, prepare=(), commence=()):
+        ''' Move all the cars at the given time step with the vectorized engine.
+
+        Follows the same merging steps as `update_car_positions`, for every
+        on-ramp at once. A merge only relinks the cars next to it in the lane.
+
+        Args:
+            prepare: ramps picking the car that will make room for their next car
+            commence: ramps whose pending car merges in now
+        '''
+        platoon = self.platoon
+        stats = self._stats
+        ramps = [self.merge_ramp] + self.on_ramps if self.merge_ramp else self.on_ramps
+
+        for ramp in commence:
+            if ramp.car_getting_merged_in_front is not None:
+                # Merge the new car in front of the car that made room.
+                follower = ramp.car_getting_merged_in_front.slot
+                ramp.car_getting_merged_in_front = None
+                ramp.merging_car.attach_history(self.history, self.history.previous_column)
+                platoon.insert_car(follower, ramp.merging_car)
+                self.events.record(self.history.time_index, ramp.merging_car.history_row,
+                                   COMMENCE_MERGE, velocity=ramp.merging_car.velocity)
+                ramp.merge_count += 1
+                stats.count('merges')
+
+        old_positions = platoon.position[:platoon.size].copy()
+        pending = [ramp for ramp in ramps if ramp.car_getting_merged_in_front is not None]
+        stats.lap('merge')
+        if pending:
+            ghost_index = np.array([ramp.car_getting_merged_in_front.slot for ramp in pending])
+            crashed = platoon.step(ghost_index=ghost_index,
+                                   ghost_car=[ramp.merging_car for ramp in pending])
+            for ramp, position, velocity in zip(pending, platoon.ghost_position,
+                                                platoon.ghost_velocity):
+                ramp.merging_car.position = float(position)
+                ramp.merging_car.velocity = float(velocity)
+        else:
+            ghost_index = None
+            crashed = platoon.step()
+        stats.lap('merge')
+        stats.count('ticks')
+        stats.count('car_updates', len(platoon))
+
+        self.events.record_many(self.history.time_index, platoon.history_row[crashed], CRASH,
+                                *platoon.last_crashes)
+        self.potential_crash_count += len(crashed)
+        if self.detectors:
+            slots = platoon.active_slots()
+            self._update_detectors(old_positions[slots], platoon.position[slots],
+                                   platoon.velocity[slots], platoon.length[slots])
+            stats.lap('detectors')
+        if ghost_index is not None:
+            old_positions[ghost_index] = np.inf # a car following a ghost cannot be merged into
+        self._wrap_history()
+        stats.lap('history')
+
+        # Tells the car to decelerate to prepare for the merging car in front.
+        for ramp in prepare:
+            self._prepare_platoon_merge(ramp, old_positions)
+        stats.lap('merge')
+        self._update_ends()
+        stats.lap('ends')
+        if self._live_feed is not None:
+            self._live_feed.publish(self)
+            stats.lap('live')
+
+    def _quiet_ticks(self, time_index, ramps, history_sink):
+        ''' Time steps from `time_index` on that `cruise_platoon` can take in one
+        go: the quiet cars stay quiet, no ramp is about to merge, nothing is
+        watching every time step and no car comes on or goes past the end of
+        the road before the last one. '''
+        platoon = self.platoon
+        if self.detectors or self._live_feed is not None or self.inflow is not None:
+            return 0
+        n_ticks = min(platoon.quiet_ticks(), self.position_update_count - 1 - time_index)
+        for ramp in ramps:
+            if ramp.car_getting_merged_in_front is not None or ramp.countdown != NO_COUNTDOWN:
+                return 0
+            n_ticks = min(n_ticks, ramp.ticks_to_prepare(time_index))
+        if history_sink is not None:
+            # The history is flushed before a time step starting on a full buffer.
+            room = history_sink.flush_interval - self.history.column - 1
+            n_ticks = min(n_ticks, self.history.ticks_for(room) + 1)
+        if self.length is not None and n_ticks > 1:
+            n_ticks = platoon.ticks_to_reach(self.length, n_ticks)
+        return n_ticks
+
+    def cruise_platoon(self, n_ticks):
+        ''' Take up to `n_ticks` time steps at once, see `platoon.Platoon.cruise`,
+        with the same result as taking them one by one.
+
+        Returns:
+            The number of time steps taken.
+        '''
+        platoon = self.platoon
+        history = self.history
+        first_column = history.column # wrapped and padded already, so again does no harm
+        n_ticks = platoon.cruise(n_ticks)
+        if not n_ticks:
+            return n_ticks
+        if self.circumference is not None:
+            recorded = slice(first_column, history.column + 1)
+            history.positions[:history.n_rows, recorded] %= self.circumference
+        if self._free_rows:
+            history.pad_rows(self._free_rows, first_column)
+        self._update_ends()
+        self._stats.count('ticks', n_ticks)
+        self._stats.count('car_updates', n_ticks * len(platoon))
+        self._stats.lap('cruise')
+        return n_ticks
+
+    def _prepare_platoon_merge(self, ramp, old_positions):
+        ''' Pick the last car that just got passed the ramp by the car in front. '''
+        merge_position = ramp.position
+        if not merge_position:
+            return
+        platoon = self.platoon
+        slots = platoon.active_slots()
+        leader = platoon.leader[slots]
+        straddles = slots[(leader >= 0) & (platoon.position[leader] > merge_position) &
+                          (old_positions[slots] <= merge_position)]
+        if not straddles.size:
+            return
+        follower = straddles[np.argmax(platoon.lane_index(straddles))]
+        ramp.merging_car = ramp.car_class(merge_position,
+            platoon.velocity[platoon.leader[follower]] * 0.9, self.time_precision)
+        ramp.car_getting_merged_in_front = platoon.handle(follower)
+        self.events.record(self.history.time_index, platoon.history_row[follower], PREPARE_MERGE,
+                           velocity=ramp.merging_car.velocity)
+        old_positions[follower] = np.inf # one merge at a time in front of a car
+
+    def _wrap_history(self):
+        ''' Wrap the positions just recorded onto the ring. '''
+        if self.circumference is not None:
+            history = self.history
+            history.positions[:history.n_rows, history.column] %= self.circumference
+
+    def set_inflow(self, arrivals, entry_gap=10, entry_velocity=None):
+        ''' Feed cars into the entrance of an open road.
+
+        The arriving cars queue at the entrance; one car gets on the road
+        each time step once the last car is `entry_gap` meters in.
+
+        Args:
+            arrivals: `inflow.Arrivals` process, such as `inflow.PoissonArrivals`
+                or `inflow.FixedHeadway`
+            entry_gap: meters the last car must be past the entrance
+            entry_velocity: velocity of the cars getting on the road; by default
+                the velocity of the last car, or the maximum velocity on an empty road
+        '''
+        if self.length is None:
+            raise ValueError('Only an open road, made with a length, has an entrance')
+        self.inflow = arrivals
+        self.entry_gap = entry_gap
+        self.entry_velocity = entry_velocity
+
+    def _update_ends(self):
+        ''' Take the cars past the end off an open road and let the next car on. '''
+        if self.length is None:
+            return
+        self._retire_cars()
+        if self.inflow is not None:
+            self.entrance_queue.extend(self.inflow.arrivals(self.time_precision))
+            if self.entrance_queue:
+                self._enter_car()
+        if self._free_rows:
+            self.history.pad_rows(self._free_rows)
+
+    def _retire_cars(self):
+        ''' Move the cars past the end of the road to the pool. '''
+        if self.platoon is not None:
+            platoon = self.platoon
+            slots = platoon.lane_order() # front to back, like the car list
+            for slot in slots[platoon.position[slots] >= self.length]:
+                self._retire_row(platoon.history_row[slot], KIND_NAMES[platoon.kind[slot]])
+                platoon.remove_car(slot)
+                self.exited_count += 1
+            for ramp in self.on_ramps + [self.merge_ramp]:
+                if ramp is not None and ramp.car_getting_merged_in_front is not None \
+                        and ramp.car_getting_merged_in_front.slot < 0:
+                    ramp.car_getting_merged_in_front = None
+            return
+
+        leaving = [car for car in self._car_list if car.position >= self.length]
+        if not leaving:
+            return
+        self._car_list[:] = [car for car in self._car_list if car.position < self.length]
+        for car in leaving:
+            self._retire_row(car.history_row, type(car).__name__)
+            self._car_pool.setdefault(type(car), []).append(car)
+            if self.car_getting_merged_in_front is car:
+                self.car_getting_merged_in_front = None
+        self.exited_count += len(leaving)
+
+    def _retire_row(self, row, car_class):
+        self.events.record(self.history.time_index, -1 if row is None else row, EXIT)
+        if row is not None and row >= 0:
+            self._free_rows.append(int(row))
+            self._row_classes[int(row)] = car_class
+
+    def _enter_car(self):
+        ''' Let the first car waiting at the entrance on the road, if there is room. '''
+        if self.platoon is not None:
+            last = self.platoon.handle(self.platoon.tail) if self.platoon.tail >= 0 else None
+        else:
+            last = self._car_list[-1] if self._car_list else None
+        if last is not None and last.position < self.entry_gap:
+            return
+
+        car_class = self.entrance_queue.popleft()
+        pool = self._car_pool.get(car_class)
+        if pool:
+            car = pool.pop()
+            car.__init__(0, 0, self.time_precision)
+        else:
+            car = car_class(0, 0, self.time_precision)
+        if self.entry_velocity is not None:
+            car.velocity = self.entry_velocity
+        else:
+            car.velocity = last.velocity if last is not None else car.max_velocity
+        row = self._free_rows.pop() if self._free_rows else None
+        car.attach_history(self.history, row=row)
+        if row is not None and car.history_row != row:
+            self._free_rows.append(row) # the car is not recorded
+        self.events.record(self.history.time_index, car.history_row, ENTER, velocity=car.velocity)
+
+        if self.platoon is not None:
+            # The platoon copies the car, so the object goes straight back to the pool.
+            self.platoon.add_car(car)
+            self._car_pool.setdefault(car_class, []).append(car)
+        else:
+            self._car_list.append(car)
+            self._stats.watch(car)
+        self.entered_count += 1
+
+    def attach_history(self):
+        ''' Give every car that does not record its positions yet a row in the history. '''
+        if self.platoon is not None:
+            self.platoon.attach_history(self.history)
+            return
+
+        for car in self.car_list:
+            if car.history is None:
+                car.attach_history(self.history)
+
+    def fork(self):
+        ''' An independent copy of the road in its current state.
+
+        The copy carries on exactly as the road would, so one warm-up can be
+        branched into several experiments. Only the used part of the history
+        is copied. See `checkpoint.save_checkpoint` to keep the state on disk.
+        '''
+        return copy.deepcopy(self)
 
     def get_distance_to_next_car(self, car, prev_position):
         ''' Get the distance to the car in front.
@@ -187,32 +807,67 @@ class Road:
         Returns:
             The value of x positions of the cars, each row
             represents a different car, each column is a time point in
-            the simulation.
+            the simulation. Rows follow the order the cars joined the road,
+            so merging vehicles come last; they are padded with
+            ``-100 - row * 10`` before they merged. Only the cars and time
+            points the `history.RecordingPolicy` keeps are there. This is a
+            view of the history, not a copy.
         '''
-        distance_array = []
-
-        for i, car in enumerate(self.car_list):
+        self.attach_history()
+        return self.history.get_positions()
 
-            # Pads the stats for the merging vehicles before they merged.
-            padded_arr = [-100 - i * 10] * (self.position_update_count - \
-                len(car.return_position_array())) + car.return_position_array()
-            distance_array.append(padded_arr)
-        distance_array = np.vstack(distance_array)
-        return distance_array
+    def get_history_velocity_array(self):
+        ''' Velocities of the cars in the layout of `get_history_position_array`,
+        when the `history.RecordingPolicy` records them, as a view of the history. '''
+        self.attach_history()
+        return self.history.get_velocities()
 
     def get_history_potential_crashes(self):
-
-        crashes_array = []
-        for car in self.car_list:
-
-            # Pads the stats for the merging vehicles before they merged.
-            padded_arr = [0] * (self.position_update_count - \
-                len(car.return_potential_crashes_history())) + car.return_potential_crashes_history()
-            crashes_array.append(padded_arr)
-
-        crashes_array = np.vstack(crashes_array)
-        crashes_array = crashes_array.sum(axis = 0)
-        return crashes_array
+        ''' Total number of potential crashes at each time point, as a view of the history. '''
+        return self.history.get_crashes()
+
+    @property
+    def history_time_precision(self):
+        ''' Seconds between two time points of the history. '''
+        return self.time_precision * self.history.policy.stride
+
+    def get_history_car_classes(self):
+        ''' Class name of the car in each row of the history, the last car
+        to use the row on an open road. '''
+        self.attach_history()
+        car_classes = [None] * self.history.n_rows
+        for row, car_class in self._row_classes.items():
+            car_classes[row] = car_class
+        if self.platoon is not None:
+            platoon = self.platoon
+            slots = platoon.active_slots()
+            for row, kind in zip(platoon.history_row[slots], platoon.kind[slots]):
+                if row >= 0:
+                    car_classes[row] = KIND_NAMES[kind]
+        else:
+            for car in self.car_list:
+                if car.history_row >= 0:
+                    car_classes[car.history_row] = type(car).__name__
+        return car_classes
+
+    def get_car_state(self):
+        ''' Positions and velocities of the cars on the road now, front to back,
+        the positions wrapped onto a ring road like in the history. '''
+        if self.platoon is not None:
+            order = self.platoon.lane_order()
+            positions, velocities = self.platoon.position[order], self.platoon.velocity[order]
+        else:
+            positions = np.array([car.position for car in self._car_list], dtype=float)
+            velocities = np.array([car.velocity for car in self._car_list], dtype=float)
+        if self.circumference is not None:
+            positions = positions % self.circumference
+        return positions, velocities
 
     def get_through_vehicle_count(self, distance):
-        return sum([car.position >= distance for car in self.car_list])
\ No newline at end of file
+        ''' Number of cars that got past `distance`, counting the cars that
+        left an open road without looking at them again. '''
+        exited = self.exited_count if self.length is not None and distance <= self.length else 0
+        if self.platoon is not None:
+            slots = self.platoon.active_slots()
+            return int(np.count_nonzero(self.platoon.position[slots] >= distance)) + exited
+        return sum([car.position >= distance for car in self.car_list]) + exited
\ No newline at end of file
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+''' Run the points of a parameter sweep on several processes. '''
+
+def spawn_seeds(seed, n_tasks):
+    ''' One independent random seed per task, all derived from `seed`.
+
+    The seed of a task only depends on `seed` and its place in the list, so a
+    sweep gives the same numbers however its tasks are spread over processes.
+    '''
+    return [int(child.generate_state(1)[0])
+            for child in np.random.SeedSequence(seed).spawn(n_tasks)]
+
+
+class SweepProgress:
+    '''Counts finished scenarios and reports how many are done per second.
+
+    Args:
+        total (`int`): Number of scenarios in the sweep
+        report_interval (`float`): Minimum seconds between two reports
+        stream: Where the reports are written
+    '''
+
+    def __init__(self, total, report_interval=5, stream=sys.stderr):
+        self.total = total
+        self.report_interval = report_interval
+        self.stream = stream
+        self.done = 0
+        self.start_time = time.perf_counter()
+        self._last_report = self.start_time
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    @property
+    def rate(self):
+        ''' Scenarios finished per second so far. '''
+        return self.done / self.elapsed if self.elapsed > 0 else 0.
+
+    def update(self, n=1):
+        ''' Note that `n` more scenarios finished, and report if it is time to. '''
+        self.done += n
+        now = time.perf_counter()
+        if self.done == self.total or now - self._last_report >= self.report_interval:
+            self._last_report = now
+            self.report()
+
+    def report(self):
+        print('sweep: {}/{} scenarios, {:.1f} s, {:.2f} scenarios/s'.format(
+            self.done, self.total, self.elapsed, self.rate), file=self.stream)
+
+
+def run_sweep(function, tasks, max_workers=None, progress=True, cache=None):
+    ''' Run ``function(**task)`` for every task, spread over a pool of processes.
+
+    The results come back as soon as each task finishes, so they can be saved
+    while the rest of the sweep is still running. Tasks should carry their own
+    random seed; then the results are the same as running them one by one.
+
+    Args:
+        function: Top level (picklable) function running one scenario
+        tasks: List of keyword-argument dictionaries, one per scenario
+        max_workers: Number of processes, defaults to the number of cores.
+            With 1 the tasks run one after another in this process.
+        progress: Report the number of scenarios done per second
+        cache: `cache.ResultCache` to load the tasks run before from, and
+            store the others in. Tasks with ``seed=None`` are random, so
+            they always run.
+
+    Yields:
+        ``(index, task, result)`` for each task, in the order they finish.
+        The tasks found in the cache come first.
+    '''
+    tasks = list(tasks)
+    tracker = SweepProgress(len(tasks)) if progress else None
+
+    keys = [None] * len(tasks)
+    pending = []
+    for index, task in enumerate(tasks):
+        if cache is not None and not ('seed' in task and task['seed'] is None):
+            keys[index] = cache.key(function, task)
+            try:
+                result = cache.get(keys[index])
+            except KeyError:
+                pass
+            else:
+                if tracker:
+                    tracker.update()
+                yield index, task, result
+                continue
+        pending.append(index)
+
+    def finished(index, result):
+        if keys[index] is not None:
+            cache.put(keys[index], result)
+        if tracker:
+            tracker.update()
+        return index, tasks[index], result
+
+    if max_workers == 1:
+        for index in pending:
+            yield finished(index, function(**tasks[index]))
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(function, **tasks[index]): index for index in pending}
+        for future in as_completed(futures):
+            yield finished(futures[future], future.result())
@@ -4,7 +4,11 @@ from road import Road
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
-from car import AutonomousVehicle, HumanVehicle, Car
+from car import AutonomousVehicle, HumanVehicle
+from ensemble import make_scenarios, merge_interval_for, run_ensemble
+from sweep import run_sweep, spawn_seeds
+from adaptive import run_adaptive_trials, trial_seed
+from history import RecordingPolicy
 import random
 
 ''' Main script to run the traffic jam simulation. '''
@@ -47,12 +51,31 @@ def peturb_traffic(starting_positions, time_breakdown, slow_car_num=3):
         An array containing the positions of all the cars with time.
     '''
 
-    n_timesteps_before, n_timesteps_slowed, n_timesteps_after = time_breakdown
+    return peturb_traffic_variants(starting_positions, time_breakdown, [slow_car_num])[0]
+
+def peturb_traffic_variants(starting_positions, time_breakdown, slow_car_nums):
+    '''`peturb_traffic` for several cars to slow, sharing one warm-up: the
+    road is run once for the steps before the car is slowed, then forked for
+    every variant.
+
+    Args:
+        starting_positions: List of starting_position to pass to ``road.add_multiple_cars``
+        time_breakdown: The steps before, while and after the car is slowed
+        slow_car_nums: The index of the car to slow in each variant
+
+    Returns:
+        The results of `peturb_traffic` for each car to slow.
+    '''
     road = Road()
 
     # Add the cars and allow them to run for a while
     road.add_multiple_cars(starting_positions, starting_velocity, car_class=AutonomousVehicle)
-    road.run_simulation(n_timesteps_before)
+    road.run_simulation(time_breakdown[0])
+    return [_slow_car(road.fork(), time_breakdown, slow_car_num) for slow_car_num in slow_car_nums]
+
+def _slow_car(road, time_breakdown, slow_car_num):
+    ''' The part of `peturb_traffic` after the warm-up. '''
+    n_timesteps_before, n_timesteps_slowed, n_timesteps_after = time_breakdown
 
     # Slow a car in the middle of pack
     slowed_car = road.car_list[slow_car_num]
@@ -74,13 +97,17 @@ def peturb_traffic(starting_positions, time_breakdown, slow_car_num=3):
     return history_position_array, history_potential_crashes
 
 
-def simulate_AV_HV_mix(starting_positions, AV_percentage):
+def simulate_AV_HV_mix(starting_positions, AV_percentage, seed=None):
     '''Simulate with what percentage of AV on the road and what throughput is.
+
+    The AV cars are picked with a generator seeded with `seed`, or with the
+    global ``random`` generator when no seed is given.
     '''
     
     assert AV_percentage >= 0 and AV_percentage <= 1
-    AV_car_indices = random.sample(range(len(starting_positions)),
-                                  int(AV_percentage * len(starting_positions)))
+    rng = random if seed is None else random.Random(seed)
+    AV_car_indices = set(rng.sample(range(len(starting_positions)),
+                                    int(AV_percentage * len(starting_positions))))
 
     road = Road()
 
@@ -99,13 +126,23 @@ def simulate_AV_HV_mix(starting_positions, AV_percentage):
     history_potential_crashes = road.get_history_potential_crashes()
     return history_position_array, history_potential_crashes
 
-def run_simulation_mix():
+def run_simulation_mix(max_workers=None, seed=0, cache=None):
+    ''' Sweep the AV percentage, one process per point.
 
-    for perc in range(0, 101, 10):
-        perc = perc / 100
-        starting_space = 5
-        starting_positions = np.arange(n_cars)*starting_space
-        history_position_array, history_potential_crashes = simulate_AV_HV_mix(starting_positions, perc)
+    Args:
+        max_workers: number of processes, 1 to run in this process
+        seed: seed the seeds of every point are derived from
+        cache: `cache.ResultCache` so the points run before are loaded instead
+    '''
+    starting_space = 5
+    starting_positions = np.arange(n_cars)*starting_space
+    percs = [perc / 100 for perc in range(0, 101, 10)]
+    tasks = [dict(starting_positions=starting_positions, AV_percentage=perc, seed=task_seed)
+             for perc, task_seed in zip(percs, spawn_seeds(seed, len(percs)))]
+
+    for _, task, result in run_sweep(simulate_AV_HV_mix, tasks, max_workers, cache=cache):
+        history_position_array, history_potential_crashes = result
+        perc = task['AV_percentage']
         save_name = '../data/mix/history_positions_' + str(perc) + '.csv'
         save_dataframe(history_position_array, save_name)
         save_name = '../data/mix/history_crashes_' + str(perc) + '.csv'
@@ -113,13 +150,37 @@ def run_simulation_mix():
 
 
 
-def simulate_AV_HV_mix_merging(starting_positions, AV_percentage, merging_car_count):
+def simulate_AV_HV_mix_merging(starting_positions, AV_percentage, merging_car_count, seed=None):
     '''Simulate with what percentage of AV on the road and what throughput is.
+
+    The AV cars are picked with a generator seeded with `seed`, or with the
+    global ``random`` generator when no seed is given.
     '''
-    
+    road = _run_mix_merging(starting_positions, AV_percentage, merging_car_count, seed, verbose=True)
+
+    history_position_array = road.get_history_position_array()
+    history_potential_crashes = road.get_history_potential_crashes()
+
+    # Measure throughput for the first 5000 meters.
+    # print('AV_percentage', AV_percentage, '\tThroughput', road.get_through_vehicle_count(1000), \
+    #     '\tTotal Crashes', history_potential_crashes[-1])
+    return history_position_array, history_potential_crashes, \
+        road.get_through_vehicle_count(1000), history_potential_crashes[-1]
+
+def measure_AV_HV_mix_merging(starting_positions, AV_percentage, merging_car_count, seed=None):
+    ''' The throughput and hard stops of `simulate_AV_HV_mix_merging`, without
+    recording the history, for running many trials. '''
+    road = _run_mix_merging(starting_positions, AV_percentage, merging_car_count, seed,
+                            recording=RecordingPolicy.off())
+    return road.get_through_vehicle_count(1000), road.potential_crash_count
+
+def _run_mix_merging(starting_positions, AV_percentage, merging_car_count, seed,
+                     recording=None, verbose=False):
+    ''' The road of `simulate_AV_HV_mix_merging`, run. '''
     assert AV_percentage >= 0 and AV_percentage <= 1
-    AV_car_indices = random.sample(range(len(starting_positions)),
-                                  int(AV_percentage * len(starting_positions)))
+    rng = random if seed is None else random.Random(seed)
+    AV_car_indices = set(rng.sample(range(len(starting_positions)),
+                                    int(AV_percentage * len(starting_positions))))
 
     road = Road()
 
@@ -132,71 +193,148 @@ def simulate_AV_HV_mix_merging(starting_positions, AV_percentage, merging_car_co
     merge_position = 200
     # FIXME This is still an estmiate
 
-    merge_interval = 0
-    if merging_car_count > 0:
-        merge_interval = (total_time - merge_position / Car(1,2,3).max_velocity) // merging_car_count
+    merge_interval = merge_interval_for(merging_car_count, total_time, merge_position)
+    if verbose and merging_car_count > 0:
         print('merge_interval', merge_interval)
-    road.run_simulation(total_time, merge_position = merge_position, merge_interval=merge_interval)
+    road.run_simulation(total_time, merge_position = merge_position, merge_interval=merge_interval,
+                        recording=recording)
+    return road
 
-    history_position_array = road.get_history_position_array()
-    history_potential_crashes = road.get_history_potential_crashes()
+def simulate_ring_road(n_cars, circumference, AV_percentage, total_time, seed=None,
+                       engine='vectorized', history_sink=None):
+    '''Simulate an AV/HV mix on a ring road, to watch stop-and-go waves settle
+    into their steady state. The cars start evenly spaced around the ring.
 
-    # Measure throughput for the first 5000 meters.
-    # print('AV_percentage', AV_percentage, '\tThroughput', road.get_through_vehicle_count(1000), \
-    #     '\tTotal Crashes', history_potential_crashes[-1])
-    return history_position_array, history_potential_crashes, \
-        road.get_through_vehicle_count(1000), history_potential_crashes[-1]
+    Args:
+        n_cars: number of cars on the ring
+        circumference: length of the ring in meters
+        AV_percentage: fraction of the cars that are autonomous
+        total_time: seconds to simulate
+        seed: seed picking the AV cars, the global ``random`` generator if None
+        engine: `Road` engine to use
+        history_sink: `history.HistorySink` to stream long runs to
+
+    Returns:
+        The (wrapped) history of the positions and the potential crashes.
+    '''
+    assert AV_percentage >= 0 and AV_percentage <= 1
+    rng = random if seed is None else random.Random(seed)
+    AV_car_indices = set(rng.sample(range(n_cars), int(AV_percentage * n_cars)))
+
+    road = Road(engine=engine, circumference=circumference)
+    for i, starting_position in enumerate(np.arange(n_cars) * circumference / n_cars):
+        car_class = AutonomousVehicle if i in AV_car_indices else HumanVehicle
+        road.add_car(starting_position, starting_velocity, car_class)
+    road.run_simulation(total_time, history_sink=history_sink)
+
+    return road.get_history_position_array(), road.get_history_potential_crashes()
+
+def run_simulation_mix_merging(target_widths=(2., 1.), min_trials=3, max_trials=100, budget=None,
+                               max_workers=None, seed=0, cache=None):
+    ''' Sweep the AV percentage and the number of merging cars, running
+    trials of every point on a pool of processes until the 95% confidence
+    intervals of its throughput and hard stops are narrow enough, see
+    `adaptive.run_adaptive_trials`.
 
-def run_simulation_mix_merging():
+    The history of the first trial of each point is saved once the trials
+    are done, followed by the summary.
 
+    Args:
+        target_widths: full width wanted of the confidence intervals of the
+            throughput and of the hard stops
+        min_trials: number of trials of each point before its intervals are looked at
+        max_trials: most trials of one point
+        budget: most trials of the whole sweep, no limit if None
+        max_workers: number of processes, 1 to run in this process
+        seed: seed the seeds of every trial are derived from
+        cache: `cache.ResultCache` so the trials run before are loaded instead
+    '''
     merging_car_counts = [5]#, 15, 10, 5, 1, 0]
+    percs = [perc / 100 for perc in range(0, 101, 10)]
+    starting_space = 5
+    starting_positions = np.arange(n_cars)*starting_space
+
+    points = [(merging_car_count, perc) for merging_car_count in merging_car_counts
+              for perc in percs]
+    tasks = [dict(starting_positions=starting_positions, AV_percentage=perc,
+                  merging_car_count=merging_car_count)
+             for merging_car_count, perc in points]
+    trials = run_adaptive_trials(measure_AV_HV_mix_merging, tasks, target_widths, min_trials,
+                                 max_trials, budget, max_workers=max_workers, seed=seed,
+                                 cache=cache)
+
+    first_trials = [dict(task, seed=trial_seed(seed, index, 0)) for index, task in enumerate(tasks)]
+    for index, _, result in run_sweep(simulate_AV_HV_mix_merging, first_trials, max_workers,
+                                      cache=cache):
+        history_position_array, history_potential_crashes, _, _ = result
+        perc = points[index][1]
+        save_name = '../data/mix/history_positions_' + str(perc) + '.csv'
+        save_dataframe(history_position_array, save_name)
+        save_name = '../data/mix/history_crashes_' + str(perc) + '.csv'
+        save_dataframe(history_potential_crashes, save_name)
+
     for merging_car_count in merging_car_counts:
         print()
         print('merging_car_count', merging_car_count)
-        for perc in range(0, 101, 10):
-            perc = perc / 100
-            starting_space = 5
-            starting_positions = np.arange(n_cars)*starting_space
-
-            throughputs, crashes = [], []
-            num_trials = 1
-            for _ in range(num_trials):
-                history_position_array, history_potential_crashes, throughput, crash = \
-                    simulate_AV_HV_mix_merging(starting_positions, perc, merging_car_count)
-
-                throughputs.append(throughput)
-                crashes.append(crash)
-
-            if num_trials >= 2:
-                throughputs.sort()
-                throughputs = throughputs[int(len(throughputs) * 0.1) : int(len(throughputs) * 0.9)]
-                crashes.sort()
-                crashes = crashes[int(len(crashes) * 0.1) : int(len(crashes) * 0.9)]
-            print('AV_percentage', perc, '\tThroughput', sum(throughputs) / len(throughputs), \
-                '\tHard Stops', sum(crashes) / len(crashes))
-            save_name = '../data/mix/history_positions_' + str(perc) + '.csv'
-            save_dataframe(history_position_array, save_name)
-            save_name = '../data/mix/history_crashes_' + str(perc) + '.csv'
-            save_dataframe(history_potential_crashes, save_name)
+        for (count, perc), point in zip(points, trials):
+            if count != merging_car_count:
+                continue
+            (throughput, hard_stops), (throughput_error, hard_stops_error) = point.interval()
+            print('AV_percentage', perc, '\tThroughput', throughput, '+-', throughput_error, \
+                '\tHard Stops', hard_stops, '+-', hard_stops_error, '\tTrials', point.n_trials)
 
 
 
+def run_ensemble_mix_merging(num_trials=100):
+    ''' The sweep of ``run_simulation_mix_merging`` with many trials per AV
+    percentage. All the trials of a merging car count run together as one
+    ensemble instead of one road at a time.
+
+    Args:
+        num_trials: number of trials (seeds) for each AV percentage
+    '''
+    merging_car_counts = [5]
+    AV_percentages = [perc / 100 for perc in range(0, 101, 10)]
+    starting_space = 5
+    for merging_car_count in merging_car_counts:
+        print()
+        print('merging_car_count', merging_car_count)
+        scenarios = make_scenarios(range(num_trials), AV_percentages,
+                                   [starting_space], [merging_car_count])
+        throughputs, crashes = run_ensemble(scenarios, n_cars=n_cars)
+        for perc in AV_percentages:
+            trials = [i for i, scenario in enumerate(scenarios) if scenario.AV_percentage == perc]
+            print('AV_percentage', perc, '\tThroughput', trimmed_mean(throughputs[trials]), \
+                '\tHard Stops', trimmed_mean(crashes[trials]))
+
+def trimmed_mean(values):
+    ''' Mean of the values without the lowest and highest 10% when there are several. '''
+    values = sorted(values)
+    if len(values) >= 2:
+        values = values[int(len(values) * 0.1) : int(len(values) * 0.9)]
+    return sum(values) / len(values)
+
 def save_dataframe(data, save_location='../data/simpleDistanceHistory.csv'):
     ''' Write the position array to file as a csv. '''
     distance_dataframe = pd.DataFrame(data)
     distance_dataframe.to_csv(save_location)
 
-def start_space_sweep(minimum_space, maximum_space, interval):
+def start_space_sweep(minimum_space, maximum_space, interval, max_workers=None, cache=None):
     ''' Run the simulation for several different starting positions.
 
     Args:
        minimum_space: The smallest starting distance between cars
        maximum_space: The largest starting distance between the cars
        interval: The size of the steps to take between these two extremes
+       max_workers: number of processes, 1 to run in this process
+       cache: `cache.ResultCache` so the spacings run before are loaded instead
     '''
-    for starting_space in [80, 200, 211, 212, 400]: # range(80, 81): # range(80, 240+1, 20):
-        starting_positions = np.arange(n_cars)*starting_space
-        history_position_array, history_potential_crashes = peturb_traffic(starting_positions, [50, 40, 250])
+    starting_spaces = [80, 200, 211, 212, 400] # range(80, 81): # range(80, 240+1, 20):
+    tasks = [dict(starting_positions=np.arange(n_cars)*starting_space, time_breakdown=[50, 40, 250])
+             for starting_space in starting_spaces]
+    for index, _, result in run_sweep(peturb_traffic, tasks, max_workers, cache=cache):
+        history_position_array, history_potential_crashes = result
+        starting_space = starting_spaces[index]
         save_name = '../data/history_positions_' + str(starting_space) + '.csv'
         save_dataframe(history_position_array, save_name)
         save_name = '../data/history_crashes_' + str(starting_space) + '.csv'
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+import numpy as np
+from car import HumanVehicle
+from road import CAR_PARAMETERS
+
+''' Mixes of vehicles whose parameters are drawn per vehicle, for `road.Road.from_arrays`. '''
+
+class Normal:
+    '''Normally distributed values, clipped to [`low`, `high`].
+
+    Args:
+        mean (`float`): Mean of the values
+        sd (`float`): Standard deviation of the values
+        low (`float`): Smallest value
+        high (`float`): Largest value
+    '''
+
+    def __init__(self, mean, sd, low=-np.inf, high=np.inf):
+        if low > high:
+            raise ValueError('Empty range [' + str(low) + ', ' + str(high) + ']')
+        self.mean = mean
+        self.sd = sd
+        self.low = low
+        self.high = high
+
+    def sample(self, rng, n):
+        ''' `n` values drawn with the NumPy generator `rng`. '''
+        return np.clip(rng.normal(self.mean, self.sd, n), self.low, self.high)
+
+
+class Uniform:
+    '''Values spread evenly over [`low`, `high`).
+
+    Args:
+        low (`float`): Smallest value
+        high (`float`): Largest value
+    '''
+
+    def __init__(self, low, high):
+        if low > high:
+            raise ValueError('Empty range [' + str(low) + ', ' + str(high) + ']')
+        self.low = low
+        self.high = high
+
+    def sample(self, rng, n):
+        ''' `n` values drawn with the NumPy generator `rng`. '''
+        return rng.uniform(self.low, self.high, n)
+
+
+class VehicleType:
+    '''One kind of vehicle in a mix, see `sample_vehicles`.
+
+    Args:
+        car_class: Car class of the vehicles, which picks their rule and the
+            defaults of the parameters not given
+        share (`float`): Share of the mix, relative to the shares of the other types
+        parameters: Some of ``road.CAR_PARAMETERS``, each a number or a
+            distribution such as `Normal` to draw a value per vehicle from
+    '''
+
+    def __init__(self, car_class=HumanVehicle, share=1., **parameters):
+        unknown = set(parameters) - set(CAR_PARAMETERS)
+        if unknown:
+            raise ValueError('Unknown car parameters ' + str(sorted(unknown)) +
+                             ', use some of ' + str(CAR_PARAMETERS))
+        if share < 0:
+            raise ValueError('The share of a vehicle type cannot be negative, got ' + str(share))
+        self.car_class = car_class
+        self.share = share
+        self.parameters = parameters
+
+# Roughly a loaded articulated lorry: long, slow to pick up speed and to
+# stop, and keeping more room to the vehicle in front.
+TRUCK = dict(length=Normal(16.5, 1.5, 12., 18.75), braking_rate=3., max_velocity=25.,
+             launch_acceleration=1.2, acceleration_falloff=25., gap_factor=1.5)
+
+
+def sample_vehicles(n_cars, vehicle_types, seed=None):
+    ''' Draw a mix of `n_cars` vehicles, ready for `road.Road.from_arrays`::
+
+        Road.from_arrays(positions, velocities, *sample_vehicles(n_cars, vehicle_types))
+
+    Each type gets its share of the vehicles, rounded so the counts add up to
+    `n_cars`, and the types are shuffled along the road. The parameters of
+    every vehicle are drawn from the distributions of its type, so each
+    vehicle can have a length, braking rate, acceleration curve, reaction
+    time and gap factor of its own, all kept in the arrays the engines step
+    with. Everything is drawn with one NumPy generator seeded with `seed`,
+    in time linear in `n_cars`.
+
+    Args:
+        n_cars (`int`): Number of vehicles
+        vehicle_types: List of `VehicleType`
+        seed: Seed of the generator, random if None
+
+    Returns:
+        The type of each vehicle as an index into the classes, the car class
+        of each type, and a dictionary from each of ``road.CAR_PARAMETERS`` to
+        its value for each vehicle.
+    '''
+    if not vehicle_types:
+        raise ValueError('A mix needs at least one vehicle type')
+    shares = np.array([vehicle_type.share for vehicle_type in vehicle_types], dtype=float)
+    if shares.sum() <= 0:
+        raise ValueError('The shares of the vehicle types add up to ' + str(shares.sum()))
+    rng = np.random.default_rng(seed)
+    bounds = np.rint(np.cumsum(shares) / shares.sum() * n_cars).astype(np.int64)
+    counts = np.diff(bounds, prepend=0)
+    types = rng.permutation(np.repeat(np.arange(len(vehicle_types)), counts))
+    classes = tuple(vehicle_type.car_class for vehicle_type in vehicle_types)
+
+    parameters = {name: np.zeros(n_cars) for name in CAR_PARAMETERS}
+    for index, vehicle_type in enumerate(vehicle_types):
+        is_type = types == index
+        prototype = vehicle_type.car_class(0, 0, 1.)
+        for name in CAR_PARAMETERS:
+            value = vehicle_type.parameters.get(name, getattr(prototype, name))
+            if hasattr(value, 'sample'):
+                value = value.sample(rng, counts[index])
+            parameters[name][is_type] = value
+    return types, classes, parameters
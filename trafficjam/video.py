@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import matplotlib
+matplotlib.use('Agg')
+from history_file import open_history, convert_csv
+import plotting
+
+''' Headless export of histories to MP4 videos, spread over all the cores. '''
+
+FPS = 12
+BITRATE = 1800 # kbit/s
+DEFAULT_CHUNK_SIZE = 300
+
+def frame_chunks(n_frames, chunk_size=DEFAULT_CHUNK_SIZE):
+    ''' Split the frames ``0 .. n_frames - 1`` into ``(start, end)`` chunks. '''
+    return [(start, min(start + chunk_size, n_frames))
+            for start in range(0, n_frames, chunk_size)]
+
+def _encoder_command(ffmpeg, size, fps, bitrate, path):
+    ''' ffmpeg reading raw RGBA frames from its standard input into `path`. '''
+    return [ffmpeg, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', '{}x{}'.format(*size),
+            '-r', str(fps), '-i', '-',
+            '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-b:v', '{}k'.format(bitrate), path]
+
+_renderer = (None, None) # history path and its `plotting.FrameRenderer`, kept by each worker
+
+def _get_renderer(history_path):
+    ''' The renderer of a history, set up once per worker rather than once per chunk. '''
+    global _renderer
+    if _renderer[0] != history_path:
+        figure, draw_frame = plotting.history_file_frames(open_history(history_path))
+        _renderer = (history_path, plotting.FrameRenderer(figure, draw_frame))
+    return _renderer[1]
+
+def render_segment(history_path, start, end, path, fps=FPS, bitrate=BITRATE, ffmpeg='ffmpeg'):
+    ''' Encode frames ``start .. end - 1`` of a history file into the video `path`,
+    piping the frames into ffmpeg as they are drawn. '''
+    renderer = _get_renderer(history_path)
+    encoder = subprocess.Popen(_encoder_command(ffmpeg, renderer.size, fps, bitrate, path),
+                               stdin=subprocess.PIPE)
+    try:
+        for i in range(start, end):
+            encoder.stdin.write(renderer.render(i))
+    finally:
+        encoder.stdin.close()
+        if encoder.wait() != 0:
+            raise ValueError('ffmpeg failed to encode ' + str(path))
+    return path
+
+def _render_segment_task(task):
+    return task, render_segment(**task)
+
+def concatenate(segments, path, ffmpeg='ffmpeg'):
+    ''' Join video segments encoded alike into `path`, without encoding them again. '''
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as segment_list:
+        for segment in segments:
+            segment_list.write("file '{}'\n".format(os.path.abspath(segment).replace("'", r"'\''")))
+    try:
+        subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                        '-i', segment_list.name, '-c', 'copy', path], check=True)
+    finally:
+        os.remove(segment_list.name)
+
+def _csv_to_history(positions_csv, directory):
+    ''' Convert a ``history_positions_*.csv`` and its ``history_crashes_*.csv``
+    into a history file in `directory`. '''
+    name = os.path.basename(positions_csv)
+    crashes_csv = os.path.join(os.path.dirname(positions_csv),
+                               name.replace('history_positions_', 'history_crashes_'))
+    path = os.path.join(directory, os.path.splitext(name)[0] + '.tjh')
+    convert_csv(positions_csv, crashes_csv, path)
+    return path
+
+def export_videos(histories, outputs=None, processes=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                  fps=FPS, bitrate=BITRATE, ffmpeg='ffmpeg'):
+    ''' Turn histories into MP4 videos of `plotting.plot`, without a screen.
+
+    The frames of every history are split into chunks of `chunk_size`, and
+    the chunks of all the histories are drawn and encoded side by side in a
+    pool of processes, each into a segment of its own. The segments of a
+    history are joined once they are all done, so a sweep of many histories
+    and one long history both keep every core busy.
+
+    Args:
+        histories: Binary history files (``.tjh``), or ``history_positions_*.csv``
+            files next to their ``history_crashes_*.csv``
+        outputs: Video file of each history, the history with ``.mp4`` if not given
+        processes (`int`): Number of processes, one per core if not given
+        chunk_size (`int`): Frames encoded into one segment
+        fps (`int`): Frames per second of the videos
+        bitrate (`int`): Bit rate of the videos in kbit/s
+        ffmpeg: The ffmpeg program
+
+    Returns:
+        The video files written.
+    '''
+    if shutil.which(ffmpeg) is None:
+        raise ValueError(ffmpeg + ' was not found, it is needed to encode the videos')
+    histories = [str(history) for history in histories]
+    if outputs is None:
+        outputs = [os.path.splitext(history)[0] + '.mp4' for history in histories]
+    outputs = [str(output) for output in outputs]
+    if len(outputs) != len(histories):
+        raise ValueError('Got ' + str(len(outputs)) + ' outputs for ' +
+                         str(len(histories)) + ' histories')
+
+    with tempfile.TemporaryDirectory() as directory, \
+            multiprocessing.Pool(processes) as pool:
+        csvs = [i for i, history in enumerate(histories) if history.endswith('.csv')]
+        converted = pool.starmap(_csv_to_history, [(histories[i], directory) for i in csvs])
+        for i, path in zip(csvs, converted):
+            histories[i] = path
+
+        # All the chunks in one queue, a history after the other, so each
+        # worker mostly draws chunks of the history it set up last.
+        tasks = []
+        segments = []
+        owner = {}
+        for n, history in enumerate(histories):
+            chunks = frame_chunks(open_history(history).n_time, chunk_size)
+            segments.append([os.path.join(directory, '{}_{}.mp4'.format(n, k))
+                             for k in range(len(chunks))])
+            tasks += [dict(history_path=history, start=start, end=end, path=segment,
+                           fps=fps, bitrate=bitrate, ffmpeg=ffmpeg)
+                      for (start, end), segment in zip(chunks, segments[n])]
+            owner.update((segment, n) for segment in segments[n])
+        remaining = [len(history_segments) for history_segments in segments]
+        for task, _ in pool.imap_unordered(_render_segment_task, tasks):
+            n = owner[task['path']]
+            remaining[n] -= 1
+            if remaining[n] == 0:
+                concatenate(segments[n], outputs[n], ffmpeg)
+                for segment in segments[n]:
+                    os.remove(segment)
+    return outputs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export histories to MP4 videos.')
+    parser.add_argument('histories', nargs='+',
+                        help='.tjh history files, history_positions_*.csv files or directories of them')
+    parser.add_argument('--processes', type=int, help='processes to use, one per core by default')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='frames encoded into one segment (default %(default)s)')
+    parser.add_argument('--fps', type=int, default=FPS, help='frames per second (default %(default)s)')
+    args = parser.parse_args(argv)
+
+    histories = []
+    for path in args.histories:
+        if os.path.isdir(path):
+            histories += sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.endswith('.tjh') or name.startswith('history_positions_'))
+        else:
+            histories.append(path)
+    for output in export_videos(histories, processes=args.processes,
+                                chunk_size=args.chunk_size, fps=args.fps):
+        print(output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())